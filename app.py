@@ -1,10 +1,9 @@
 import os
 import sys
-import paramiko
-import dotenv
+import time
 from pathlib import Path
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QIcon, QPixmap
+from PyQt5.QtCore import Qt, QByteArray, QTimer, QTime, pyqtSignal
+from PyQt5.QtGui import QIcon, QPixmap, QColor, QTextCharFormat, QTextCursor
 from PyQt5.QtWidgets import (
     QApplication, 
     QMainWindow, 
@@ -21,8 +20,48 @@ from PyQt5.QtWidgets import (
     QStatusBar,
     QHBoxLayout,
     QLabel,
-    QComboBox
+    QComboBox,
+    QProgressBar,
+    QStackedWidget,
+    QTableView,
+    QHeaderView,
+    QAbstractItemView,
+    QInputDialog,
+    QCheckBox,
+    QListWidget,
+    QListWidgetItem,
+    QSpinBox,
+    QFileDialog,
+    QSystemTrayIcon
     )
+from models import TableModel, TableFilterProxyModel, HighlightDelegate
+from parsers import (
+    COLUMN_PRESETS, SCANCEL_STATES, SQUEUE_FIELDS, JobStore, job_detail_command, match_jobs,
+    parse_job_detail, sinfo_command
+    )
+from core import (
+    connect, split_outputs, squeue_commands, store_jobs, parse_partitions,
+    scancel_commands, history_commands, store_history, job_columns, partition_columns,
+    node_columns, node_group_columns, submit_sweep, parse_priorities, priority_columns
+    )
+from history import REPORTS, HistoryDB
+from metrics import MetricStore, metrics_path, parse_sample, sample_command
+from dashboard import DashboardWidget
+from nodes import NODES_COMMAND, NodeStore, parse_nodes
+from priority import priority_command
+from job_detail import JobDetailPanel
+from log_viewer import LogViewer
+from stats_panel import StatsPanel
+from cache import DetailCache
+from sweeps import Sweep, parse_params
+from profiles import (
+    DEFAULT_PORT, load_column_presets, load_env, load_profiles, save_column_preset, save_profile
+    )
+from session import (
+    SESSION_PATH, Snapshot, decode_data, encode_data, read_snapshot, remove_snapshot, write_snapshot
+    )
+from workers import CommandRunner
+from watcher import JobWatcher
 
 def get_icon(icon_name):
     '''Retrieve the icon file path'''
@@ -30,8 +69,6 @@ def get_icon(icon_name):
     icon_path = script_dir / icon_name
     return QIcon(str(icon_path))
 
-dotenv.load_dotenv()
-
 class SSHConnectionDialog(QDialog):
     """Dialog to connect to an SSH server"""
     def __init__(self, parent=None):
@@ -39,12 +76,20 @@ class SSHConnectionDialog(QDialog):
         self.setWindowTitle("Connect to SSH Server")
         self.setMinimumWidth(400)
 
+        self.profiles = load_profiles()
+
         # Create widgets
-        self.host_edit = QLineEdit(os.getenv('SSH_HOST', ''))
-        self.port_edit = QLineEdit(os.getenv('SSH_PORT', ''))
-        self.username_edit = QLineEdit(os.getenv('SSH_USER', ''))
-        self.password_edit = QLineEdit(os.getenv('SSH_PASSWORD', ''))
+        self.profile_edit = QComboBox()
+        self.profile_edit.setEditable(True)
+        self.profile_edit.addItems(list(self.profiles))
+        self.profile_edit.currentTextChanged.connect(self.load_profile)
+        self.host_edit = QLineEdit()
+        self.port_edit = QLineEdit()
+        self.username_edit = QLineEdit()
+        self.password_edit = QLineEdit()
         self.password_edit.setEchoMode(QLineEdit.Password)
+        self.save_check = QCheckBox("Save profile (without password)")
+        self.load_profile(self.profile_edit.currentText())
         
         # Create buttons
         self.connect_button = QPushButton("Connect")
@@ -54,52 +99,568 @@ class SSHConnectionDialog(QDialog):
         
         # Layout
         layout = QFormLayout(self)
+        layout.addRow("Profile:", self.profile_edit)
         layout.addRow("Host:", self.host_edit)
         layout.addRow("Port:", self.port_edit)
         layout.addRow("Username:", self.username_edit)
         layout.addRow("Password:", self.password_edit)
+        layout.addRow("", self.save_check)
         
         button_layout = QVBoxLayout()
         button_layout.addWidget(self.connect_button)
         button_layout.addWidget(self.cancel_button)
         layout.addRow("", button_layout)
+
+    def load_profile(self, name):
+        """Fill the fields from a saved profile"""
+        profile = self.profiles.get(name)
+        if profile is None:
+            return
+        self.host_edit.setText(profile['host'])
+        self.port_edit.setText(profile['port'])
+        self.username_edit.setText(profile['username'])
+        self.password_edit.setText(profile['password'])
         
     def get_connection_info(self):
         """Returns the connection data"""
+        host = self.host_edit.text()
         return {
-            'host': self.host_edit.text(),
-            'port': int(self.port_edit.text()),
+            'name': self.profile_edit.currentText() or host,
+            'host': host,
+            'port': int(self.port_edit.text() or DEFAULT_PORT),
             'username': self.username_edit.text(),
             'password': self.password_edit.text()
         }
 
 class ScancelDialog(QDialog):
-    def __init__(self, parent=None):
+    """Dialog to select the jobs to cancel, one by one or by filters"""
+
+    ANY = "Any"
+
+    def __init__(self, jobs, show_cluster=False, server_filters=True, parent=None):
         super().__init__(parent)
-        self.setWindowTitle("Cancel Job")
-        self.setMinimumWidth(400)
+        self.setWindowTitle("Cancel Jobs")
+        self.setMinimumWidth(500)
+        self.jobs = jobs
+        self.show_cluster = show_cluster
+        self.matched = []
 
         # Create widgets
-        self.job_id = QComboBox()
+        self.state_filter = self.filter_combo(job.state for job in jobs)
+        self.partition_filter = self.filter_combo(job.partition for job in jobs)
+        self.array_filter = self.filter_combo(job.array_job_id for job in jobs if '_' in job.job_id)
+        self.name_filter = QLineEdit()
+        self.name_filter.setPlaceholderText("Glob pattern, e.g. sweep_*")
+        self.name_filter.textChanged.connect(self.update_matches)
+
+        self.job_list = QListWidget()
+        self.job_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.job_list.itemSelectionChanged.connect(self.update_count)
+        self.count_label = QLabel()
+
+        self.server_check = QCheckBox("Cancel on the server by filter when every matching job is selected")
+        self.server_check.setToolTip("Runs a single scancel --state/--name/--partition, which also "
+                                     "catches jobs submitted since the last refresh")
+        if not server_filters:
+            # The listed jobs passed filters scancel would not apply
+            self.server_check.setEnabled(False)
+            self.server_check.setToolTip("Unavailable while the job filter bar limits the listed jobs")
 
         # Create buttons
-        self.cancel_button = QPushButton("Cancel")
+        self.select_all_button = QPushButton("Select All")
+        self.select_all_button.clicked.connect(self.job_list.selectAll)
+        self.cancel_button = QPushButton("Cancel Selected")
         self.cancel_button.clicked.connect(self.accept)
         self.discard_button = QPushButton("Discard")
         self.discard_button.clicked.connect(self.reject)
 
         layout = QFormLayout(self)
-        layout.addRow("Select the JOBID to cancel:", self.job_id)
+        layout.addRow("State:", self.state_filter)
+        layout.addRow("Partition:", self.partition_filter)
+        layout.addRow("Array job:", self.array_filter)
+        layout.addRow("Name:", self.name_filter)
+        layout.addRow(self.job_list)
+        layout.addRow(self.count_label)
+        layout.addRow(self.server_check)
         
         button_layout = QHBoxLayout()
+        button_layout.addWidget(self.select_all_button)
         button_layout.addWidget(self.cancel_button)
         button_layout.addWidget(self.discard_button)
         layout.addRow("", button_layout)
 
+        self.update_matches()
+
+    def filter_combo(self, values):
+        """Create a combo box with ANY and the distinct values"""
+        combo = QComboBox()
+        combo.addItem(self.ANY)
+        combo.addItems(sorted(set(values)))
+        combo.currentIndexChanged.connect(self.update_matches)
+        return combo
+
+    def filters(self):
+        """Return the current filters as match_jobs keyword arguments"""
+        def value(combo):
+            text = combo.currentText()
+            return None if text == self.ANY else text
+
+        return {
+            'state': value(self.state_filter),
+            'partition': value(self.partition_filter),
+            'array_job_id': value(self.array_filter),
+            'name_pattern': self.name_filter.text().strip() or None,
+        }
+
+    def update_matches(self):
+        """List the jobs matching the filters"""
+        self.matched = match_jobs(self.jobs, **self.filters())
+        self.job_list.clear()
+        for job in self.matched:
+            text = f"{job.job_id}  {job.state}  {job.partition}  {job.name}"
+            if self.show_cluster:
+                text = f"{job.cluster}  {text}"
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, job.key)
+            self.job_list.addItem(item)
+        self.update_count()
+
+    def update_count(self):
+        selected = len(self.job_list.selectedItems())
+        self.count_label.setText(f"{selected} of {len(self.matched)} matching jobs selected")
+        self.cancel_button.setEnabled(selected > 0)
+
+    def selected_keys(self):
+        """Return the (cluster, job id) keys of the selected jobs"""
+        return [item.data(Qt.UserRole) for item in self.job_list.selectedItems()]
+
+    def server_filters(self):
+        """Return scancel filters equivalent to the selection, or None.
+
+        Only when server filters are allowed, every matching job is
+        selected, no array job is chosen and the name has no glob characters.
+        """
+        if not self.server_check.isEnabled() or not self.server_check.isChecked():
+            return None
+        if len(self.job_list.selectedItems()) != len(self.matched):
+            return None
+        filters = self.filters()
+        name = filters['name_pattern']
+        if filters['array_job_id'] is not None or (name and any(c in name for c in '*?[')):
+            return None
+        if not any((filters['state'], filters['partition'], name)):
+            return None
+        if filters['state'] is not None and filters['state'] not in SCANCEL_STATES:
+            return None
+        return {'state': filters['state'], 'name': name, 'partition': filters['partition']}
+
+class HistoryDialog(QDialog):
+    """Dialog to choose a report over the local job history"""
+
+    ALL = "All"
+
+    def __init__(self, clusters, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Job History Report")
+        self.setMinimumWidth(400)
+
+        # Create widgets
+        self.report_combo = QComboBox()
+        self.report_combo.addItems(REPORTS)
+        self.days_spin = QSpinBox()
+        self.days_spin.setRange(0, 3650)
+        self.days_spin.setValue(30)
+        self.days_spin.setSpecialValueText(self.ALL)
+        self.days_spin.setSuffix(" days")
+        self.cluster_combo = QComboBox()
+        self.cluster_combo.addItem(self.ALL)
+        self.cluster_combo.addItems(clusters)
+
+        # Create buttons
+        self.show_button = QPushButton("Show")
+        self.show_button.clicked.connect(self.accept)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.reject)
+
+        layout = QFormLayout(self)
+        layout.addRow("Report:", self.report_combo)
+        layout.addRow("Last:", self.days_spin)
+        if len(clusters) > 1:
+            layout.addRow("Cluster:", self.cluster_combo)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.show_button)
+        button_layout.addWidget(self.cancel_button)
+        layout.addRow("", button_layout)
+
+    def get_report(self):
+        """Return the HistoryDB.report arguments"""
+        cluster = self.cluster_combo.currentText()
+        return {
+            'name': self.report_combo.currentText(),
+            'days': self.days_spin.value() or None,
+            'cluster': None if cluster == self.ALL else cluster,
+        }
+
+class SubmitDialog(QDialog):
+    """Dialog to submit a batch script, or a template over a parameter grid"""
+
+    def __init__(self, clusters, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Submit Jobs")
+        self.setMinimumWidth(600)
+
+        # Create widgets
+        self.cluster_combo = QComboBox()
+        self.cluster_combo.addItems(clusters)
+        self.name_input = QLineEdit("sweep")
+        self.template_edit = QTextEdit()
+        self.template_edit.setAcceptRichText(False)
+        self.template_edit.setPlaceholderText(
+            "#!/bin/bash\n#SBATCH --time=01:00:00\npython train.py --lr {{lr}} --seed {{seed}}")
+        self.template_edit.textChanged.connect(self.update_summary)
+        self.params_edit = QTextEdit()
+        self.params_edit.setAcceptRichText(False)
+        self.params_edit.setPlaceholderText("lr = 0.1, 0.01, 0.001\nseed = 1..5")
+        self.params_edit.setMaximumHeight(100)
+        self.params_edit.textChanged.connect(self.update_summary)
+        self.array_check = QCheckBox("Submit as a job array when no #SBATCH line uses a parameter")
+        self.array_check.setChecked(True)
+        self.array_check.toggled.connect(self.update_summary)
+        self.max_running_spin = QSpinBox()
+        self.max_running_spin.setRange(0, 10000)
+        self.max_running_spin.setSpecialValueText("No limit")
+        self.max_running_spin.setToolTip("Job array task limit (--array=...%N)")
+        self.summary_label = QLabel()
+
+        # Create buttons
+        self.load_button = QPushButton("Load Script...")
+        self.load_button.clicked.connect(self.load_script)
+        self.submit_button = QPushButton("Submit")
+        self.submit_button.clicked.connect(self.accept)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.reject)
+
+        layout = QFormLayout(self)
+        if len(clusters) > 1:
+            layout.addRow("Cluster:", self.cluster_combo)
+        layout.addRow("Name:", self.name_input)
+        layout.addRow("Script:", self.template_edit)
+        layout.addRow("Parameters:", self.params_edit)
+        layout.addRow(self.array_check)
+        layout.addRow("Running tasks:", self.max_running_spin)
+        layout.addRow(self.summary_label)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.load_button)
+        button_layout.addWidget(self.submit_button)
+        button_layout.addWidget(self.cancel_button)
+        layout.addRow("", button_layout)
+
+        self.update_summary()
+
+    def load_script(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load Batch Script")
+        if path:
+            self.template_edit.setPlainText(Path(path).read_text())
+            self.name_input.setText(Path(path).stem)
+
+    def sweep(self):
+        """Return the Sweep to submit, raising ValueError when the input is invalid"""
+        return Sweep(self.template_edit.toPlainText(), parse_params(self.params_edit.toPlainText()),
+                     self.name_input.text().strip(), self.array_check.isChecked(),
+                     self.max_running_spin.value())
+
+    def update_summary(self):
+        try:
+            sweep = self.sweep()
+        except ValueError as e:
+            self.summary_label.setText(str(e))
+            self.submit_button.setEnabled(False)
+            return
+        if not self.template_edit.toPlainText().strip():
+            self.summary_label.setText("")
+            self.submit_button.setEnabled(False)
+            return
+        if sweep.array:
+            summary = f"{len(sweep)} jobs, submitted as one job array"
+        elif len(sweep) > 1:
+            summary = f"{len(sweep)} jobs, submitted with {len(sweep)} sbatch calls in one shell"
+        else:
+            summary = "1 job"
+        self.summary_label.setText(summary)
+        self.submit_button.setEnabled(True)
+
+    def cluster(self):
+        return self.cluster_combo.currentText()
+
+class JobFilterBar(QWidget):
+    """Filters and column preset of the job view, applied by squeue on the controller"""
+
+    # Emitted when the filters or the columns to fetch change
+    changed = pyqtSignal()
+
+    FILTERS = {'user': "User", 'account': "Account", 'partition': "Partition",
+               'state': "State", 'name': "Name", 'qos': "QOS"}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.presets = dict(COLUMN_PRESETS, **load_column_presets())
+        # Filters of the last change, so unchanged edits do not refetch
+        self.applied = {}
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.edits = {}
+        for name, label in self.FILTERS.items():
+            edit = QLineEdit()
+            edit.setPlaceholderText(label)
+            edit.setToolTip(f"{label}s to show, comma separated; squeue filters them on the controller")
+            edit.setClearButtonEnabled(True)
+            edit.editingFinished.connect(self.apply)
+            layout.addWidget(edit)
+            self.edits[name] = edit
+
+        self.preset_combo = QComboBox()
+        self.preset_combo.addItems(self.presets)
+        self.preset_combo.currentIndexChanged.connect(self.changed)
+        self.columns_button = QPushButton("Columns...")
+        self.columns_button.clicked.connect(self.edit_columns)
+        layout.addWidget(self.preset_combo)
+        layout.addWidget(self.columns_button)
+
+    def filters(self):
+        """Return the filters as squeue_command filters.
+
+        Only the spaces around the commas are dropped: job names may
+        contain spaces.
+        """
+        return {name: ','.join(part.strip() for part in edit.text().split(',') if part.strip())
+                for name, edit in self.edits.items()}
+
+    def columns(self):
+        return self.presets[self.preset_combo.currentText()]
+
+    def apply(self):
+        filters = self.filters()
+        if filters != self.applied:
+            self.applied = filters
+            self.changed.emit()
+
+    def edit_columns(self):
+        """Choose the columns of a new or existing preset and save it"""
+        diag = ColumnsDialog(self.preset_combo.currentText(), self.columns(), self)
+        if not diag.exec_():
+            return
+        name, columns = diag.preset()
+        save_column_preset(name, columns)
+        self.presets[name] = columns
+        if self.preset_combo.findText(name) < 0:
+            self.preset_combo.addItem(name)
+        if self.preset_combo.currentText() == name:
+            self.changed.emit()
+        else:
+            self.preset_combo.setCurrentText(name)
+
+class ColumnsDialog(QDialog):
+    """Dialog to choose the squeue columns of a preset"""
+
+    def __init__(self, name, columns, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Job Columns")
+
+        # Create widgets
+        self.name_input = QLineEdit(name)
+        self.column_list = QListWidget()
+        # Checked columns first, in their order, then the others
+        for column in list(columns) + [c for c in SQUEUE_FIELDS if c not in columns]:
+            item = QListWidgetItem(f"{SQUEUE_FIELDS[column][0]} ({column})")
+            item.setData(Qt.UserRole, column)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if column in columns else Qt.Unchecked)
+            self.column_list.addItem(item)
+        self.column_list.setDragDropMode(QAbstractItemView.InternalMove)
+
+        # Create buttons
+        self.save_button = QPushButton("Save")
+        self.save_button.clicked.connect(self.accept)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.reject)
+
+        layout = QFormLayout(self)
+        layout.addRow("Preset:", self.name_input)
+        layout.addRow(QLabel("Checked columns are fetched and shown; drag to reorder"))
+        layout.addRow(self.column_list)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.save_button)
+        button_layout.addWidget(self.cancel_button)
+        layout.addRow("", button_layout)
+
+    def preset(self):
+        """Return the preset name and its checked columns, in order"""
+        items = [self.column_list.item(i) for i in range(self.column_list.count())]
+        columns = tuple(item.data(Qt.UserRole) for item in items if item.checkState() == Qt.Checked)
+        return self.name_input.text().strip() or "Custom", columns or ('job_id',)
+
+class NodeFilterBar(QWidget):
+    """Filters and grouping of the node view, applied to the local NodeStore"""
+
+    # Emitted whenever a filter or the grouping changes
+    changed = pyqtSignal()
+
+    ANY = "Any"
+    GROUPS = {"No grouping": None, "Group by partition": 'partition',
+              "Group by state": 'state', "Group by feature": 'feature'}
+
+    # Milliseconds without typing before the hostlist filter applies
+    HOSTLIST_DELAY = 300
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cluster_filter = self.filter_combo()
+        self.partition_filter = self.filter_combo()
+        self.state_filter = self.filter_combo()
+        self.feature_filter = self.filter_combo()
+        self.hostlist_edit = QLineEdit()
+        self.hostlist_edit.setPlaceholderText("Hostlist, e.g. node[001-064]")
+        self.hostlist_edit.setClearButtonEnabled(True)
+        # Filter once typing pauses or the edit is left, not on every key
+        self.hostlist_timer = QTimer(self)
+        self.hostlist_timer.setSingleShot(True)
+        self.hostlist_timer.setInterval(self.HOSTLIST_DELAY)
+        self.hostlist_timer.timeout.connect(self.changed)
+        self.hostlist_edit.textChanged.connect(lambda _text: self.hostlist_timer.start())
+        self.hostlist_edit.editingFinished.connect(self.apply_hostlist)
+        self.group_combo = QComboBox()
+        self.group_combo.addItems(self.GROUPS)
+        self.group_combo.currentIndexChanged.connect(self.changed)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.cluster_filter)
+        layout.addWidget(QLabel("Partition:"))
+        layout.addWidget(self.partition_filter)
+        layout.addWidget(QLabel("State:"))
+        layout.addWidget(self.state_filter)
+        layout.addWidget(QLabel("Feature:"))
+        layout.addWidget(self.feature_filter)
+        layout.addWidget(self.hostlist_edit, 1)
+        layout.addWidget(self.group_combo)
+
+    def apply_hostlist(self):
+        if self.hostlist_timer.isActive():
+            self.hostlist_timer.stop()
+            self.changed.emit()
+
+    def filter_combo(self):
+        combo = QComboBox()
+        combo.addItem(self.ANY)
+        combo.currentIndexChanged.connect(self.changed)
+        return combo
+
+    def set_values(self, store, clusters):
+        """List the clusters, partitions, states and features of store, keeping the selection"""
+        for combo, values in ((self.cluster_filter, clusters),
+                              (self.partition_filter, store.values('partition')),
+                              (self.state_filter, store.values('state')),
+                              (self.feature_filter, store.values('feature'))):
+            current = combo.currentText()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(self.ANY)
+            combo.addItems(sorted(set(values)))
+            combo.setCurrentText(current)
+            combo.blockSignals(False)
+        self.cluster_filter.setVisible(len(clusters) > 1)
+
+    def filters(self):
+        """Return the filters as NodeStore.select keyword arguments"""
+        def value(combo):
+            text = combo.currentText()
+            return None if text == self.ANY else text
+
+        return {
+            'cluster': value(self.cluster_filter),
+            'partition': value(self.partition_filter),
+            'state': value(self.state_filter),
+            'feature': value(self.feature_filter),
+            'hostlist': self.hostlist_edit.text().strip() or None,
+        }
+
+    def group_by(self):
+        return self.GROUPS[self.group_combo.currentText()]
+
 class MainWindow(QMainWindow):
+    # Connection status messages, emitted from worker threads
+    connection_state_changed = pyqtSignal(str)
+    # Slow operation messages in debug mode, emitted from any thread
+    slow_operation = pyqtSignal(str)
+
+    # Lines kept in the console while a command streams its output
+    SCROLLBACK_LINES = 10000
+
+    # Job rows below the selected one whose details are fetched in advance
+    PREFETCH_ROWS = 3
+
+    # Seconds job details stay cached, for active and finished jobs
+    DETAIL_TTL = 30
+    FINISHED_DETAIL_TTL = 600
+
     def __init__(self):
         super().__init__()
+        # Jobs from the last squeue of every cluster; jobs_scope is 'all'
+        # (every user), 'mine' (only the connected users), 'filtered' (the
+        # jobs matching the job filter bar) or None
+        self.jobs = JobStore()
+        self.jobs_scope = None
+        # Nodes from the last scontrol show node of every cluster
+        self.nodes = NodeStore()
+        # What the table shows: 'jobs' (only mine if view_mine), 'sinfo', 'nodes', 'priority'
+        # or 'history'
+        self.view_kind = None
+        self.view_mine = False
+        # Session snapshot, saved on exit unless None; while the restored
+        # data is shown, stale_since is the time it was saved
+        self.session_path = SESSION_PATH
+        self.stale_since = None
+        # User names of the restored clusters, until they reconnect
+        self.session_users = {}
+        self.runner = CommandRunner(self)
+        # Local sacct history, opened on first use
+        self.history = None
+        self.runner.inflight_changed.connect(self.update_inflight_status)
+        # Parsed job details by (cluster, job id), and the ones being fetched
+        self.job_details = DetailCache(self.DETAIL_TTL)
+        self.detail_requests = {}
+        self.runner.invalidated.connect(self.job_details.invalidate)
+        # Command timings, completed here with parse and render times
+        self.instrument = self.runner.instrument
+        self.instrument.on_slow = lambda operation, metric, seconds, cluster: self.slow_operation.emit(
+            f"Slow {operation} {metric}{f' on {cluster}' if cluster else ''}: {seconds * 1000:.0f} ms")
+        self.slow_operation.connect(lambda message: self.status.showMessage(message, 10000))
+        self.connection_state_changed.connect(self.show_connection_state)
         self.init_ui()
+
+        # Live monitor
+        self.monitor_interval = 30
+        self.monitor_fetching = False
+        self.monitor_timer = QTimer(self)
+        self.monitor_timer.timeout.connect(self.refresh_monitor)
+
+        # Utilization dashboard, sampled while it is enabled
+        self.dashboard_interval = 30
+        self.dashboard_sampling = False
+        self.metric_stores = {}
+        self.dashboard_timer = QTimer(self)
+        self.dashboard_timer.timeout.connect(self.sample_dashboard)
+
+        # Job watcher, polled at its adaptive interval while it watches anything
+        self.watcher = JobWatcher()
+        self.watch_polling = False
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.timeout.connect(self.poll_watcher)
     
     def init_ui(self):
         self.setWindowTitle("slurmLab")
@@ -117,18 +678,72 @@ class MainWindow(QMainWindow):
         self.text_edit = QTextEdit()
         self.text_edit.setReadOnly(True)
         self.text_edit.setAlignment(Qt.AlignCenter)
-        self.text_edit.setStyleSheet(f"""
-            QTextEdit {{
-            background-color: #2E2E2E;
-            color: white;
-            font-family: "Monaco";
-            font-size: {self.font_size}pt;
-            }}
-        """)
-
-        layout.addWidget(self.text_edit)
+        self.text_edit.document().setMaximumBlockCount(self.SCROLLBACK_LINES)
+        self.console_request = None
+
+        # Table view for squeue and sinfo
+        self.table_model = TableModel(self)
+        self.proxy_model = TableFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.table_model)
+        self.delegate = HighlightDelegate(self)
+
+        self.table_view = QTableView()
+        self.table_view.setModel(self.proxy_model)
+        self.table_view.setItemDelegate(self.delegate)
+        self.table_view.setSortingEnabled(True)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_view.setShowGrid(False)
+        self.table_view.verticalHeader().setVisible(False)
+        # Fixed row heights and sampled column widths keep large tables cheap
+        self.table_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table_view.horizontalHeader().setResizeContentsPrecision(200)
+        self.table_view.horizontalHeader().setStretchLastSection(True)
+        self.table_view.horizontalHeader().setDefaultAlignment(Qt.AlignLeft)
+        self.table_view.clicked.connect(self.open_job_detail)
+        self.table_view.activated.connect(self.open_job_detail)
+        self.table_view.selectionModel().currentRowChanged.connect(self.follow_job_detail)
+
+        # Details of the selected job
+        self.detail_panel = JobDetailPanel(self)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.detail_panel)
+        self.detail_panel.hide()
+        self.detail_panel.open_log.connect(self.open_log)
+
+        # Timing percentiles of every operation
+        self.stats_panel = StatsPanel(self.instrument, self)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.stats_panel)
+        self.stats_panel.hide()
+
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter rows...")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self.proxy_model.setFilterFixedString)
+
+        table_page = QWidget()
+        table_layout = QVBoxLayout(table_page)
+        table_layout.setContentsMargins(0, 0, 0, 0)
+        self.job_filters = JobFilterBar()
+        self.job_filters.setVisible(False)
+        self.job_filters.changed.connect(self.refresh_jobs)
+        table_layout.addWidget(self.job_filters)
+        self.node_filters = NodeFilterBar()
+        self.node_filters.setVisible(False)
+        self.node_filters.changed.connect(self.show_nodes)
+        table_layout.addWidget(self.node_filters)
+        table_layout.addWidget(self.filter_edit)
+        table_layout.addWidget(self.table_view)
+
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.text_edit)
+        self.stack.addWidget(table_page)
+        self.dashboard = DashboardWidget()
+        self.stack.addWidget(self.dashboard)
+        self.apply_font_size()
+
+        layout.addWidget(self.stack)
 
         toolbar = QToolBar("MainToolbar")
+        toolbar.setObjectName("main_toolbar")
         self.addToolBar(toolbar)
         toolbar.setStyleSheet("""
             QToolBar {
@@ -148,14 +763,43 @@ class MainWindow(QMainWindow):
         self.cmd_type.setPlaceholderText("Type command here (just SLURM commands are supported)...")
         self.cmd_type.returnPressed.connect(self.execute_command)
 
+        # Cluster the typed commands run on
+        self.cluster_combo = QComboBox()
+        self.cluster_combo.setVisible(False)
+
+        # Stop the command running in the console
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_command)
+
         input_layout.addWidget(self.icon_label)
+        input_layout.addWidget(self.cluster_combo)
         input_layout.addWidget(self.cmd_type)
+        input_layout.addWidget(self.stop_button)
 
         layout.addLayout(input_layout)
 
         # Status bar
         self.status = QStatusBar()
         self.setStatusBar(self.status)
+
+        # In flight commands indicator
+        self.inflight_label = QLabel()
+        self.inflight_progress = QProgressBar()
+        self.inflight_progress.setRange(0, 0)
+        self.inflight_progress.setMaximumWidth(80)
+        self.inflight_progress.setVisible(False)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_commands)
+        # Shown while the table holds data restored from the last session
+        self.stale_label = QLabel()
+        self.stale_label.setStyleSheet("color: #FF7700; font-weight: bold;")
+        self.stale_label.setVisible(False)
+        self.status.addPermanentWidget(self.stale_label)
+        self.status.addPermanentWidget(self.inflight_label)
+        self.status.addPermanentWidget(self.inflight_progress)
+        self.status.addPermanentWidget(self.cancel_button)
         
         # SSH menu
         ssh_menu = self.menuBar().addMenu("&SSH")
@@ -190,19 +834,19 @@ class MainWindow(QMainWindow):
         # EDIT
         # Clear
         self.clear_action = QAction(get_icon("icons/icons8-clean-48.png"), "Clear", self)
-        self.clear_action.triggered.connect(self.text_edit.clear)
+        self.clear_action.triggered.connect(self.clear_view)
         toolbar.addAction(self.clear_action)
         edit_menu.addAction(self.clear_action)
 
         # Copy
         self.copy_action = QAction(get_icon("icons/icons8-copy-48.png"), "Copy", self)
-        self.copy_action.triggered.connect(self.text_edit.copy)
+        self.copy_action.triggered.connect(self.copy_selection)
         toolbar.addAction(self.copy_action)
         edit_menu.addAction(self.copy_action)
 
         # Select All
         self.select_all_action = QAction(get_icon("icons/icons8-select-all-files-48.png"), "Select All", self)
-        self.select_all_action.triggered.connect(self.text_edit.selectAll)
+        self.select_all_action.triggered.connect(self.select_all)
         toolbar.addAction(self.select_all_action)
         edit_menu.addAction(self.select_all_action)
 
@@ -235,6 +879,24 @@ class MainWindow(QMainWindow):
         toolbar.addAction(self.squeue_u_action)
         monitor_menu.addAction(self.squeue_u_action)
 
+        monitor_menu.addSeparator()
+
+        # Live monitor
+        self.monitor_action = QAction("Live Monitor", self)
+        self.monitor_action.setCheckable(True)
+        self.monitor_action.setEnabled(False)
+        self.monitor_action.toggled.connect(self.toggle_monitor)
+        monitor_menu.addAction(self.monitor_action)
+
+        # Monitor interval
+        self.monitor_interval_action = QAction("Monitor Interval...", self)
+        self.monitor_interval_action.triggered.connect(self.set_monitor_interval)
+        monitor_menu.addAction(self.monitor_interval_action)
+
+        monitor_menu.addSeparator()
+        self.stats_action = self.stats_panel.toggleViewAction()
+        monitor_menu.addAction(self.stats_action)
+
         toolbar.addSeparator()
 
         # JOBS CONTROL
@@ -244,6 +906,54 @@ class MainWindow(QMainWindow):
         toolbar.addAction(self.scancel_action)
         jobs_menu.addAction(self.scancel_action)
 
+        self.submit_action = QAction("Submit...", self)
+        self.submit_action.setEnabled(False)
+        self.submit_action.triggered.connect(self.submit_jobs)
+        jobs_menu.addAction(self.submit_action)
+
+        self.detail_action = self.detail_panel.toggleViewAction()
+        jobs_menu.addAction(self.detail_action)
+
+        self.open_log_action = QAction("Open Log File...", self)
+        self.open_log_action.setEnabled(False)
+        self.open_log_action.triggered.connect(self.ask_log_path)
+        jobs_menu.addAction(self.open_log_action)
+
+        jobs_menu.addSeparator()
+
+        # Job notifications
+        self.watch_jobs_action = QAction("Watch Jobs...", self)
+        self.watch_jobs_action.setEnabled(False)
+        self.watch_jobs_action.triggered.connect(self.watch_selected_jobs)
+        jobs_menu.addAction(self.watch_jobs_action)
+
+        self.watch_mine_action = QAction("Watch My Jobs", self)
+        self.watch_mine_action.setCheckable(True)
+        self.watch_mine_action.setEnabled(False)
+        self.watch_mine_action.toggled.connect(self.toggle_watch_mine)
+        jobs_menu.addAction(self.watch_mine_action)
+
+        self.stop_watching_action = QAction("Stop Watching", self)
+        self.stop_watching_action.setEnabled(False)
+        self.stop_watching_action.triggered.connect(self.stop_watching)
+        jobs_menu.addAction(self.stop_watching_action)
+
+        # Notifications go to the system tray, shown while watching
+        self.tray = QSystemTrayIcon(QIcon("icon.png"), self)
+        self.tray.activated.connect(lambda _reason: (self.showNormal(), self.raise_(), self.activateWindow()))
+
+        jobs_menu.addSeparator()
+
+        # Job history
+        self.sync_history_action = QAction("Sync History", self)
+        self.sync_history_action.setEnabled(False)
+        self.sync_history_action.triggered.connect(self.sync_history)
+        jobs_menu.addAction(self.sync_history_action)
+
+        self.history_report_action = QAction("History Report...", self)
+        self.history_report_action.triggered.connect(self.history_report)
+        jobs_menu.addAction(self.history_report_action)
+
         toolbar.addSeparator()
 
         # CLUSTER INFO
@@ -254,6 +964,12 @@ class MainWindow(QMainWindow):
         toolbar.addAction(self.sinfo_action)
         cluster_menu.addAction(self.sinfo_action)
 
+        # Node browser
+        self.nodes_action = QAction("Nodes", self)
+        self.nodes_action.setEnabled(False)
+        self.nodes_action.triggered.connect(self.fetch_nodes)
+        cluster_menu.addAction(self.nodes_action)
+
         # sdiag
         self.sdiag_action = QAction(get_icon("icons/icons8-discussion-forum-48.png"), "sinfo", self)
         self.sdiag_action.setEnabled(False)
@@ -261,6 +977,26 @@ class MainWindow(QMainWindow):
         toolbar.addAction(self.sdiag_action)
         cluster_menu.addAction(self.sdiag_action)
 
+        # Pending job priorities and fair share
+        self.priority_action = QAction("Priority", self)
+        self.priority_action.setEnabled(False)
+        self.priority_action.setToolTip("Rank the pending jobs with their priority factors and fair share")
+        self.priority_action.triggered.connect(self.priority)
+        cluster_menu.addAction(self.priority_action)
+
+        cluster_menu.addSeparator()
+
+        # Utilization dashboard
+        self.dashboard_action = QAction("Utilization Dashboard", self)
+        self.dashboard_action.setCheckable(True)
+        self.dashboard_action.setEnabled(False)
+        self.dashboard_action.toggled.connect(self.toggle_dashboard)
+        cluster_menu.addAction(self.dashboard_action)
+
+        self.dashboard_interval_action = QAction("Dashboard Interval...", self)
+        self.dashboard_interval_action.triggered.connect(self.set_dashboard_interval)
+        cluster_menu.addAction(self.dashboard_interval_action)
+
         toolbar.addSeparator()
 
         # HELP
@@ -270,33 +1006,27 @@ class MainWindow(QMainWindow):
         help_menu.addAction(self.help_action)
 
     def connect_ssh(self):
-        """Connect to an SSH server"""
+        """Connect to an SSH server, in addition to the clusters already connected"""
         dialog = SSHConnectionDialog(self)
         if dialog.exec_():
             conn_info = dialog.get_connection_info()
+            name = conn_info['name']
+            if name in self.runner.connections:
+                QMessageBox.information(self, "SSH Connection", f"Already connected to {name}")
+                return
             
             try:
-                # Create SSH client
-                self.ssh_client = paramiko.SSHClient()
-                self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                
-                # Connect to the server
-                self.ssh_client.connect(
-                    hostname=conn_info['host'],
-                    port=conn_info['port'],
-                    username=conn_info['username'],
-                    password=conn_info['password']
-                )
-                
-                # Enable disconnect
-                self.connect_action.setEnabled(False)
-                self.disconnect_action.setEnabled(True)
-                self.squeue_action.setEnabled(True)
-                self.squeue_u_action.setEnabled(True)
-                self.scancel_action.setEnabled(True)
-                self.sinfo_action.setEnabled(True)
-                self.sdiag_action.setEnabled(True)
-                self.cmd_type.setEnabled(True)
+                # Create the connection and connect to the server
+                connection = connect(conn_info, on_state=self.connection_state_changed.emit)
+                self.runner.add_connection(name, connection)
+                self.jobs_scope = None
+                self.update_connected_state()
+                if self.watch_mine_action.isChecked():
+                    self.watcher.watch_user(name, connection.username)
+                    self.start_watching()
+
+                if dialog.save_check.isChecked():
+                    save_profile(dict(conn_info, port=str(conn_info['port'])))
                 
                 message = f"Connected to {conn_info['host']} as {conn_info['username']}"
 
@@ -308,232 +1038,963 @@ class MainWindow(QMainWindow):
 
                 # Show welcome message
                 welcome_message = f"Welcome! {conn_info['username']} 👤\n\nYou are now connected to {conn_info['host']} 🖥️"
+                self.show_console()
                 self.text_edit.clear()
                 self.text_edit.insertPlainText(welcome_message)
                 
             except Exception as e:
                 QMessageBox.critical(self, "SSH Error", f"Error connecting: {str(e)}")
-                self.disconnect_ssh()
 
     def disconnect_ssh(self):
-        """Disconnect from the SSH server"""
-        if self.ssh_client:
-            self.ssh_client.close()
-            self.ssh_client = None
-
-            self.connect_action.setEnabled(True)
-            self.disconnect_action.setEnabled(False)
-            self.squeue_action.setEnabled(False)
-            self.squeue_u_action.setEnabled(False)
-            self.scancel_action.setEnabled(False)
-            self.sinfo_action.setEnabled(False)
-            self.sdiag_action.setEnabled(False)
-            self.cmd_type.setEnabled(False)
-
-            # Show message in status bar disconnected
-            message = "Disconnected from the SSH server"
-            self.status.showMessage(message)
-
-            QMessageBox.information(self, "SSH Disconnection", message)
+        """Disconnect from one or every connected cluster"""
+        clusters = self.runner.clusters()
+        if not clusters:
+            return
+        if len(clusters) > 1:
+            choice, ok = QInputDialog.getItem(
+                self, "SSH Disconnection", "Disconnect from:", ["All clusters"] + clusters, 0, False)
+            if not ok:
+                return
+            if choice != "All clusters":
+                clusters = [choice]
+
+        for name in clusters:
+            self.runner.remove_connection(name).close()
+            self.jobs.update([], cluster=name)
+            self.nodes.update([], cluster=name)
+            self.watcher.remove_cluster(name)
+        if self.view_kind == 'jobs':
+            self.show_jobs(self.view_mine)
+        self.update_connected_state()
+
+        # Show message in status bar disconnected
+        message = f"Disconnected from {', '.join(clusters)}"
+        self.status.showMessage(message)
+
+        QMessageBox.information(self, "SSH Disconnection", message)
+
+    def update_connected_state(self):
+        """Enable the actions that need a connection and list the clusters"""
+        clusters = self.runner.clusters()
+        connected = bool(clusters)
+
+        self.disconnect_action.setEnabled(connected)
+        self.squeue_action.setEnabled(connected)
+        self.squeue_u_action.setEnabled(connected)
+        self.monitor_action.setEnabled(connected)
+        self.scancel_action.setEnabled(connected)
+        self.sinfo_action.setEnabled(connected)
+        self.nodes_action.setEnabled(connected)
+        self.sdiag_action.setEnabled(connected)
+        self.priority_action.setEnabled(connected)
+        self.sync_history_action.setEnabled(connected)
+        self.open_log_action.setEnabled(connected)
+        self.submit_action.setEnabled(connected)
+        self.dashboard_action.setEnabled(connected)
+        self.watch_jobs_action.setEnabled(connected)
+        self.watch_mine_action.setEnabled(connected)
+        self.cmd_type.setEnabled(connected)
+        if not connected:
+            self.monitor_action.setChecked(False)
+            self.dashboard_action.setChecked(False)
+            self.stop_watching()
+            self.jobs_scope = None
+
+        current = self.cluster_combo.currentText()
+        self.cluster_combo.clear()
+        self.cluster_combo.addItems(clusters)
+        if current in clusters:
+            self.cluster_combo.setCurrentText(current)
+        self.cluster_combo.setVisible(len(clusters) > 1)
     
-    def squeue(self):
-        """Execute squeue command on the SSH server and convert output to HTML"""
-        _, stdout, _ = self.ssh_client.exec_command('squeue')
-        jobs = stdout.read().decode()
-
+    def save_session(self):
+        """Save the connected profiles, the window layout and the fetched data for a warm start"""
+        profiles = [{'name': name, 'host': c.host, 'port': str(c.port), 'username': c.username}
+                    for name, c in self.runner.connections.items()]
+        kind = self.view_kind if self.stack.currentIndex() == 1 else None
+        # Jobs and nodes views are rebuilt from their stores
+        table = None
+        if kind in ('sinfo', 'priority', 'history'):
+            table = (kind, self.table_model.columns(), self.table_model.records())
+        has_data = bool(len(self.jobs) or len(self.nodes) or (table and table[2]))
+        if not profiles and not has_data:
+            # Nothing to warm start from: do not show a stale empty window
+            remove_snapshot(self.session_path)
+            return
+        session = {
+            'profiles': profiles,
+            'geometry': bytes(self.saveGeometry().toHex()).decode(),
+            'state': bytes(self.saveState().toHex()).decode(),
+            'font_size': self.font_size,
+            'view': {'kind': kind, 'mine': self.view_mine},
+            'has_data': has_data,
+        }
+        write_snapshot(Snapshot(session=session, data=encode_data(self.jobs, self.nodes, table)),
+                       self.session_path)
+
+    def restore_session(self):
+        """Warm start from the last session's snapshot.
+
+        The layout is applied at once; the jobs, nodes and table are
+        decoded off the GUI thread and shown marked stale while the
+        clusters reconnect and the view refreshes in the background.
+        Returns False if there is no usable snapshot.
+        """
+        snapshot = read_snapshot(self.session_path) if self.session_path is not None else None
+        if snapshot is None:
+            return False
+        session = snapshot.session
+        self.restoreGeometry(QByteArray.fromHex(session.get('geometry', '').encode()))
+        self.restoreState(QByteArray.fromHex(session.get('state', '').encode()))
+        self.font_size = session.get('font_size', self.font_size)
+        self.apply_font_size()
+        profiles = session.get('profiles', [])
+        self.session_users = {p['name']: p['username'] for p in profiles}
+        view = session.get('view') or {}
+        kind, mine = view.get('kind'), view.get('mine', False)
+        if not session.get('has_data', True):
+            # Only the layout and the connections to restore
+            self.reconnect_session(profiles, lambda clusters: None)
+            return True
+        self.set_stale(snapshot.saved_at)
+
+        def on_decoded(result):
+            jobs, nodes, table = result
+            # Fresh data arrived first, or the user moved on
+            if self.stale_since is None or self.view_kind is not None:
+                return
+            self.jobs = jobs
+            self.nodes = nodes
+            self.node_filters.set_values(self.nodes, list(self.nodes.by_cluster))
+            if kind == 'jobs':
+                self.show_jobs(mine)
+            elif kind == 'nodes':
+                self.show_nodes()
+            elif table is not None:
+                self.show_records(table[1], table[2], cluster_column=False, operation='snapshot')
+                self.view_kind = table[0]
+
+        self.runner.submit(lambda: decode_data(snapshot.data), on_decoded, self.show_command_error,
+                           "Loading the last session")
+        self.reconnect_session(profiles, lambda clusters: self.refresh_session(clusters, kind, mine))
+        return True
+
+    def reconnect_session(self, profiles, on_done):
+        """Reconnect to the clusters of the last session, off the GUI thread.
+
+        Passwords are never saved: the .env password is used for its host,
+        otherwise SSH keys or the agent. on_done is called with the
+        clusters connected once every attempt finished.
+        """
+        if not profiles:
+            on_done([])
+            return
+        saved = load_profiles()
+        pending = {profile['name'] for profile in profiles}
+        connected = []
+
+        def finish(name):
+            pending.discard(name)
+            if not pending:
+                on_done(connected)
+
+        for profile in profiles:
+            name = profile['name']
+            profile = dict(profile, password=saved.get(name, {}).get('password', ''))
+
+            def on_connected(connection, name=name):
+                if name in self.runner.connections:
+                    # Connected by hand in the meantime
+                    connection.close()
+                else:
+                    self.runner.add_connection(name, connection)
+                    connected.append(name)
+                    self.update_connected_state()
+                finish(name)
+
+            def on_error(message, name=name):
+                self.status.showMessage(f"Could not reconnect to {name}: {message}", 10000)
+                finish(name)
+
+            self.runner.submit(
+                lambda profile=profile: connect(profile, on_state=self.connection_state_changed.emit),
+                on_connected, on_error, f"Reconnecting to {name}")
+
+    def refresh_session(self, clusters, kind, mine):
+        """Refresh the restored view once the clusters reconnected"""
+        if not clusters:
+            if self.stale_since is not None:
+                self.status.showMessage("Offline: showing the last session. Use Connect to refresh it.")
+            return
+        # The user already fetched something else
+        if self.stale_since is None or self.view_kind not in (None, kind):
+            return
+        if kind == 'nodes':
+            self.fetch_nodes()
+        elif kind == 'sinfo':
+            self.sinfo()
+        elif kind == 'priority':
+            self.priority()
+        elif kind == 'jobs':
+            self.fetch_jobs(mine, on_loaded=lambda _diff: self.show_jobs(mine))
+        # History reports are computed from the local database, and without
+        # a view only the stores were restored: those stay marked stale
+        # until the user fetches again
+
+    def set_stale(self, saved_at):
+        """Mark the data as restored from a snapshot saved at saved_at, or as fresh with None"""
+        self.stale_since = saved_at
+        if saved_at is None:
+            self.session_users = {}
+            self.stale_label.setVisible(False)
+            return
+        saved = time.strftime('%Y-%m-%d %H:%M', time.localtime(saved_at))
+        self.stale_label.setText(f"Stale: last session, {saved}")
+        self.stale_label.setToolTip("Data restored from the last session, shown until it is refreshed")
+        self.stale_label.setVisible(True)
+
+    def closeEvent(self, event):
+        """Save the session for a warm start on the next launch"""
+        if self.session_path is not None:
+            try:
+                self.save_session()
+            except OSError as e:
+                QMessageBox.warning(self, "Session Error",
+                                    f"Could not save the session; the next launch starts cold.\n{e}")
+        super().closeEvent(event)
+
+    def run_command(self, command, on_result, on_error=None, cache=True, cluster=None):
+        """Run a command in the background and pass its output to on_result"""
         try:
-            # Convert the plain text to HTML format
-            html_output = self.convert_to_html(jobs)
-
-            # Clear the text edit widget and insert the HTML output
-            self.text_edit.clear()
-            self.text_edit.setHtml(html_output)
+            self.runner.run(command, on_result, on_error or self.show_command_error, cache, cluster)
+            return True
         except Exception as e:
-            print(f"Error converting to HTML: {str(e)}")
-            # If there's an error, fall back to plain text
-            self.text_edit.clear()
-            self.text_edit.insertPlainText(jobs)
+            QMessageBox.critical(self, "SSH Error", str(e))
+            return False
+
+    def show_command_error(self, message):
+        """Show an error raised while running a background command"""
+        self.show_console()
+        self.text_edit.clear()
+        self.text_edit.insertPlainText(f"Exception: {message}")
+
+    def show_records(self, columns, records, key=None, cluster_column=True, operation='table'):
+        """Show parsed records in the table view, one column per (header, attribute).
+
+        The time taken is recorded as the render time of operation.
+        """
+        self.job_filters.setVisible(False)
+        self.node_filters.setVisible(False)
+        if cluster_column and len(self.runner.clusters()) > 1:
+            columns = [('CLUSTER', 'cluster')] + list(columns)
+        self.delegate.usernames = {c.username for c in self.runner.connections.values()}
+        with self.instrument.measure(operation, 'render'):
+            self.table_model.set_records(columns, records, key)
+            self.table_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+            self.proxy_model.sort(-1)
+            self.table_view.resizeColumnsToContents()
+        self.stack.setCurrentIndex(1)
+
+    def show_jobs(self, mine=False):
+        """Show the stored jobs of every cluster, optionally only mine"""
+        self.show_records(job_columns(self.job_filters.columns()), self.select_jobs(mine), key='key',
+                          operation='squeue')
+        self.job_filters.setVisible(True)
+        self.view_kind = 'jobs'
+        self.view_mine = mine
+
+    def select_jobs(self, mine=False):
+        """Return the stored jobs, or only those of the connected users.
+
+        Before the restored clusters reconnect, their users are those of
+        the last session.
+        """
+        if not mine:
+            return self.jobs.select()
+        users = {name: c.username for name, c in self.runner.connections.items()} or self.session_users
+        return [job for name, user in users.items() for job in self.jobs.select(user=user, cluster=name)]
+
+    def show_connection_state(self, message):
+        """Show reconnection progress in the status bar"""
+        self.status.showMessage(message, 5000)
+
+    def show_console(self):
+        """Switch to the plain text console"""
+        self.stack.setCurrentIndex(0)
+
+    def username(self, cluster=None):
+        """Return the user name on cluster, by default the first connected one"""
+        connections = self.runner.connections
+        if cluster is None and connections:
+            cluster = next(iter(connections))
+        connection = connections.get(cluster)
+        return connection.username if connection is not None else ''
+
+    def update_inflight_status(self, commands):
+        """Show the commands running in the background in the status bar"""
+        busy = bool(commands)
+        self.inflight_progress.setVisible(busy)
+        self.cancel_button.setEnabled(busy)
+        if not busy:
+            self.inflight_label.clear()
+        elif len(commands) == 1:
+            # Long commands would widen the window
+            command = commands[0] if len(commands[0]) <= 60 else commands[0][:57] + '...'
+            self.inflight_label.setText(f"Running: {command}")
+        else:
+            self.inflight_label.setText(f"{len(commands)} commands in flight")
+        self.inflight_label.setToolTip("\n".join(commands))
+
+    def cancel_commands(self):
+        """Cancel every command running in the background"""
+        self.runner.cancel()
+        self.status.showMessage("Commands cancelled", 3000)
+
+    def squeue(self):
+        """Execute squeue command on every cluster and show the jobs"""
+        self.fetch_jobs(on_loaded=lambda _diff: self.show_jobs())
     
     def squeue_u(self):
-        """Execute squeue -u command on the SSH server"""
-        username = SSHConnectionDialog(self).get_connection_info()['username']
-        _, stdout, _ = self.ssh_client.exec_command(f'squeue -u {username}')
-        jobs_user = stdout.read().decode()
+        """Execute squeue -u command on every cluster"""
+        self.fetch_jobs(True, on_loaded=lambda _diff: self.show_jobs(True))
+
+    def fetch_jobs(self, mine=False, on_loaded=None, on_error=None):
+        """Fetch the jobs of every cluster, or only mine, into the job store.
+
+        The clusters are queried in parallel, with the filters of the job
+        filter bar applied by squeue and only the columns of its preset
+        fetched. on_loaded is called with the JobDiff against the previous
+        snapshot. Returns False if no cluster is connected.
+        """
+        columns = self.job_filters.columns()
+        filters = self.job_filters.filters()
+        commands = squeue_commands(self.runner.connections, mine, columns, filters)
+
+        def on_done(results, errors):
+            outputs = split_outputs(results, errors)
+            with self.instrument.measure('squeue', 'parse'):
+                diff = store_jobs(self.jobs, outputs, self.runner.connections, mine, columns)
+
+            if errors and len(errors) == len(commands):
+                message = self.cluster_messages(errors)
+                if on_error is not None:
+                    on_error(message)
+                else:
+                    self.show_command_output('', message)
+                return
+            if errors:
+                self.status.showMessage(f"squeue failed on {', '.join(errors)}")
+            self.set_stale(None)
+
+            if any(filters.values()):
+                self.jobs_scope = 'filtered'
+            elif not mine or self.jobs_scope in (None, 'filtered'):
+                self.jobs_scope = 'mine' if mine else 'all'
+            if on_loaded is not None:
+                on_loaded(diff)
+
+        self.runner.run_each(commands, on_done)
+        return bool(commands)
+
+    def cluster_messages(self, messages):
+        """Join per cluster messages, naming the clusters when there are several"""
+        if len(self.runner.clusters()) <= 1:
+            return '\n'.join(messages.values())
+        return '\n'.join(f"== {cluster} ==\n{message}" for cluster, message in messages.items())
+
+    def toggle_monitor(self, enabled):
+        """Start or stop refreshing the job table periodically"""
+        if enabled:
+            if self.view_kind != 'jobs':
+                self.show_jobs()
+            self.monitor_timer.start(self.monitor_interval * 1000)
+            self.status.showMessage(f"Live monitor every {self.monitor_interval} s", 3000)
+            self.refresh_monitor()
+        else:
+            self.monitor_timer.stop()
+
+    def set_monitor_interval(self):
+        """Ask for the live monitor polling interval"""
+        interval, ok = QInputDialog.getInt(
+            self, "Monitor Interval", "Refresh every (seconds):", self.monitor_interval, 5, 3600)
+        if ok:
+            self.monitor_interval = interval
+            if self.monitor_timer.isActive():
+                self.monitor_timer.start(interval * 1000)
+
+    def refresh_monitor(self):
+        """Fetch a new snapshot and update only the rows that changed"""
+        # Skip a tick rather than piling up requests on a slow controller
+        if self.monitor_fetching or not self.runner.clusters():
+            return
+        mine = self.view_mine if self.view_kind == 'jobs' else False
+
+        def on_loaded(diff):
+            self.monitor_fetching = False
+            if self.view_kind == 'jobs' and diff:
+                with self.instrument.measure('squeue', 'render'):
+                    self.table_model.apply_diff(diff.added, diff.removed, diff.changed)
+            transitions = diff.transitions()
+            self.status.showMessage(
+                f"Updated {QTime.currentTime().toString()}: {len(diff.added)} new, "
+                f"{len(diff.removed)} gone, {len(transitions)} state changes")
+
+        def on_error(message):
+            self.monitor_fetching = False
+            self.status.showMessage(f"Live monitor error: {message}")
+
+        self.monitor_fetching = self.fetch_jobs(mine, on_loaded, on_error)
 
-        try:
-            # Convert the plain text to HTML format
-            html_output = self.convert_to_html(jobs_user)
+    def scancel(self):
+        """Open the cancel dialog with the user jobs from the job store"""
+        if self.jobs_scope is not None:
+            self.show_scancel_dialog()
+        else:
+            self.fetch_jobs(True, on_loaded=lambda _diff: self.show_scancel_dialog())
+
+    def show_scancel_dialog(self):
+        """Let the user select jobs and cancel them with one scancel per cluster"""
+        jobs = self.select_jobs(mine=True)
+        if not jobs:
+            QMessageBox.information(self, "No Jobs", "No jobs found for the user.")
+            return
+
+        # Jobs fetched through the filter bar also passed its account, QOS or
+        # name filters on the controller, which scancel by filter would ignore
+        diag = ScancelDialog(jobs, len(self.runner.clusters()) > 1,
+                             self.jobs_scope != 'filtered', self)
+        if not diag.exec_():
+            return
+        keys = diag.selected_keys()
+        if not keys:
+            QMessageBox.warning(self, "Input Error", "No job selected.")
+            return
+        if len(keys) > 1:
+            answer = QMessageBox.question(self, "Job Cancel", f"Cancel {len(keys)} jobs?")
+            if answer != QMessageBox.Yes:
+                return
 
-            # Clear the text edit widget and insert the HTML output
-            self.text_edit.clear()
-            self.text_edit.setHtml(html_output)
-        except Exception as e:
-            print(f"Error converting to HTML: {str(e)}")
-            # Clear the text edit widget and insert the plain text output
-            self.text_edit.clear()
-            self.text_edit.insertPlainText(jobs_user)
+        usernames = {name: self.username(name) for name in self.runner.clusters()}
+        commands = scancel_commands(keys, usernames, diag.server_filters())
 
-    def scancel(self):
-        diag = ScancelDialog(self)
-        # Populate job IDs in the combo box
-        try:
-            username = SSHConnectionDialog(self).get_connection_info()['username']
-            _, stdout, _ = self.ssh_client.exec_command(f'squeue -u {username}')
-            jobs_output = stdout.read().decode()
-
-            # Extract job IDs from the output
-            lines = jobs_output.splitlines()
-            if len(lines) > 1:  # Ensure there is at least one job
-                headers = lines[0].split()
-                job_id_index = headers.index("JOBID")  # Find the index of the JOBID column
-                job_ids = [line.split()[job_id_index] for line in lines[1:]]
-
-                # Add job IDs to the combo box
-                diag.job_id.addItems(job_ids)
+        def on_done(results, errors):
+            for cluster, (_output, error_output) in results.items():
+                if error_output.strip():
+                    errors[cluster] = error_output.strip()
+            if errors:
+                QMessageBox.critical(self, "Error Job Cancel", self.cluster_messages(errors))
             else:
-                QMessageBox.information(self, "No Jobs", "No jobs found for the user.")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to retrieve job IDs: {str(e)}")
-        
-        if diag.exec_():
-            job_id_selected = diag.job_id.currentText()
-            print(job_id_selected)
-            if not job_id_selected:
-                QMessageBox.warning(self, "Input Error", "Job ID cannot be empty.")
-                return
-            try:
-                _, stdout, stderr = self.ssh_client.exec_command(f'scancel {job_id_selected}')
-                error_output = stderr.read().decode().strip()
-                if error_output:
-                    QMessageBox.critical(self, "Error Job Cancel", error_output)
+                if len(keys) == 1:
+                    message = f"The Job {keys[0][1]} has been cancelled successfully"
                 else:
-                    message = f"The Job {job_id_selected} has been cancelled successfully"
-                    QMessageBox.information(self, "Job Cancel", message)
-                    self.squeue()
-            except Exception as e:
-                QMessageBox.critical(self, "Error Job Cancel", str(e))
+                    message = f"{len(keys)} jobs have been cancelled successfully"
+                QMessageBox.information(self, "Job Cancel", message)
+            # A single refresh once every batch is done
+            self.refresh_jobs()
+
+        self.runner.run_each(commands, on_done, cache=False)
+
+    def submit_jobs(self):
+        """Submit a script or a parameter sweep, then monitor the new jobs"""
+        diag = SubmitDialog(self.runner.clusters(), self)
+        if not diag.exec_():
+            return
+        try:
+            sweep = diag.sweep()
+        except ValueError as e:
+            QMessageBox.warning(self, "Input Error", str(e))
+            return
+        cluster = diag.cluster()
+        connection = self.runner.connections[cluster]
+
+        def on_submitted(result):
+            job_ids, errors = result
+            # sbatch ran outside run(), so cached queries are dropped here
+            self.runner.invalidate()
+            if errors:
+                QMessageBox.critical(self, "Error Job Submit", '\n'.join(errors))
+            if not job_ids:
+                return
+            self.status.showMessage(f"Submitted {len(job_ids)} jobs: {sweep.directory}")
+            self.watch_jobs(job_ids, sweep.array)
+
+        self.runner.submit(lambda: submit_sweep(connection, sweep), on_submitted,
+                           self.show_command_error, f"Submitting {len(sweep)} jobs")
+
+    def watch_jobs(self, job_ids, array=False):
+        """Show my jobs with the live monitor on, filtered to a submitted array"""
+        if array:
+            self.filter_edit.setText(job_ids[0].split('_')[0])
+        elif len(job_ids) == 1:
+            self.filter_edit.setText(job_ids[0])
+        else:
+            self.filter_edit.clear()
+        def on_loaded(_diff):
+            self.show_jobs(True)
+            self.monitor_action.setChecked(True)
+
+        self.fetch_jobs(True, on_loaded=on_loaded)
+
+    def refresh_jobs(self):
+        """Fetch the jobs again and show them, keeping the mine/all view"""
+        mine = self.view_mine if self.view_kind == 'jobs' else False
+        self.fetch_jobs(mine, on_loaded=lambda _diff: self.show_jobs(mine))
 
     def sinfo(self):
-        """Execute sinfo command on the SSH server"""
-        _, stdout, _ = self.ssh_client.exec_command('sinfo')
-        sinfo = stdout.read().decode()
-        
-        try:
-            # Convert the plain text to HTML format
-            html_output = self.convert_to_html(sinfo)
+        """Execute sinfo command on every cluster"""
+        def on_done(results, errors):
+            with self.instrument.measure('sinfo', 'parse'):
+                records = parse_partitions(split_outputs(results, errors))
+            if errors and not records:
+                self.show_command_output('', self.cluster_messages(errors))
+                return
+            if errors:
+                self.status.showMessage(f"sinfo failed on {', '.join(errors)}")
+            self.set_stale(None)
+            self.show_records(partition_columns(), records, operation='sinfo')
+            self.view_kind = 'sinfo'
 
-            # Clear the text edit widget and insert the HTML output
-            self.text_edit.clear()
-            self.text_edit.setHtml(html_output)
-        except Exception as e:
-            print(f"Error converting to HTML: {str(e)}")
-            # Clear the text edit widget and insert the plain text output
-            self.text_edit.clear()
-            self.text_edit.insertPlainText(sinfo)
+        self.runner.run_each({name: sinfo_command() for name in self.runner.clusters()}, on_done)
     
-    def sdiag(self):
-        """Execute sdiag fo command on the SSH server"""
-        _, stdout, _ = self.ssh_client.exec_command('sdiag')
-        sdiag = stdout.read().decode()
-        
+    def open_job_detail(self, index):
+        """Show the details of the clicked job in the detail panel"""
+        if self.view_kind != 'jobs':
+            return
+        self.detail_panel.show()
+        self.follow_job_detail(index)
+
+    def follow_job_detail(self, index, _previous=None):
+        """Show the details of the current job while the panel is open.
+
+        Details are fetched only when needed, and those of the next rows
+        are prefetched at a low priority so browsing down the queue is
+        instant.
+        """
+        if self.view_kind != 'jobs' or not index.isValid() or not self.detail_panel.isVisible():
+            return
+        key = self.job_key(index.row())
+        detail = self.job_details.get(key)
+        if detail is not None:
+            self.detail_panel.key = key
+            self.detail_panel.show_detail(detail)
+        else:
+            self.detail_panel.show_loading(key)
+            self.fetch_job_detail(key)
+
+        last = min(index.row() + self.PREFETCH_ROWS, self.proxy_model.rowCount() - 1)
+        for row in range(index.row() + 1, last + 1):
+            key = self.job_key(row)
+            if key not in self.job_details:
+                self.fetch_job_detail(key, priority=-1)
+
+    def job_key(self, row):
+        """Return the (cluster, job id) of a row of the table view"""
+        source = self.proxy_model.mapToSource(self.proxy_model.index(row, 0))
+        return self.table_model.record(source.row()).key
+
+    def fetch_job_detail(self, key, priority=0):
+        """Fetch scontrol show job, sstat and the output tails of a job in one round trip"""
+        if key in self.detail_requests:
+            return
+        cluster, job_id = key
+
+        def on_result(output, error):
+            self.detail_requests.pop(key, None)
+            with self.instrument.measure('scontrol', 'parse', cluster):
+                detail = parse_job_detail(output, error, job_id, cluster)
+            active = detail.state in ('PENDING', 'RUNNING', 'SUSPENDED', 'CONFIGURING', 'COMPLETING')
+            self.job_details.put(key, detail, self.DETAIL_TTL if active else self.FINISHED_DETAIL_TTL)
+            with self.instrument.measure('scontrol', 'render', cluster):
+                self.detail_panel.show_detail(detail)
+
+        def on_error(message):
+            self.detail_requests.pop(key, None)
+            self.detail_panel.show_error(key, message)
+
         try:
-            # Convert the plain text to HTML format
-            html_output = self.convert_to_html(sdiag)
+            self.detail_requests[key] = self.runner.run(
+                job_detail_command(job_id), on_result, on_error, False, cluster, priority)
+        except ConnectionError as e:
+            self.detail_panel.show_error(key, str(e))
+
+    def ask_log_path(self):
+        """Ask for a remote file, and its cluster when several are connected, to view"""
+        clusters = self.runner.clusters()
+        cluster = clusters[0] if clusters else ''
+        if len(clusters) > 1:
+            cluster, ok = QInputDialog.getItem(self, "Open Log File", "Cluster:", clusters, 0, False)
+            if not ok:
+                return
+        path, ok = QInputDialog.getText(self, "Open Log File", "Remote path:")
+        if ok and path.strip():
+            self.open_log(cluster, path.strip())
+
+    def open_log(self, cluster, path):
+        """Page through and follow a remote file over SFTP in its own window"""
+        connection = self.runner.connections.get(cluster)
+        if connection is None or not path:
+            self.show_command_error(f"Cannot open {path or 'log'}: not connected to {cluster}")
+            return
+        viewer = LogViewer(self.runner, connection, path, self.font_size, self)
+        if len(self.runner.clusters()) > 1:
+            viewer.setWindowTitle(f"{cluster}: {path}")
+        viewer.show()
+
+    def fetch_nodes(self):
+        """Fetch every node of every cluster with one scontrol call each and browse them"""
+        def on_done(results, errors):
+            outputs = split_outputs(results, errors)
+            for cluster, output in outputs.items():
+                with self.instrument.measure('scontrol', 'parse', cluster):
+                    self.nodes.update(parse_nodes(output, cluster), cluster)
+            if errors and not outputs:
+                self.show_command_output('', self.cluster_messages(errors))
+                return
+            if errors:
+                self.status.showMessage(f"scontrol failed on {', '.join(errors)}")
+            self.set_stale(None)
+            self.node_filters.set_values(self.nodes, self.runner.clusters())
+            self.show_nodes()
 
-            # Clear the text edit widget and insert the HTML output
-            self.text_edit.clear()
-            self.text_edit.setHtml(html_output)
+        self.runner.run_each({name: NODES_COMMAND for name in self.runner.clusters()}, on_done)
+
+    def show_nodes(self):
+        """Show the stored nodes matching the node filters, optionally grouped"""
+        try:
+            nodes = self.nodes.select(**self.node_filters.filters())
+        except ValueError:
+            # A hostlist still being typed, such as node[001-
+            self.status.showMessage("Invalid hostlist", 3000)
+            return
+        group_by = self.node_filters.group_by()
+        if group_by is None:
+            self.show_records(node_columns(), nodes, key='key', operation='scontrol')
+        else:
+            self.show_records(node_group_columns(group_by), self.nodes.group(nodes, group_by),
+                              operation='scontrol')
+        self.node_filters.setVisible(True)
+        self.view_kind = 'nodes'
+        self.status.showMessage(f"{len(nodes)} of {len(self.nodes)} nodes", 3000)
+
+    def sdiag(self):
+        """Execute sdiag fo command on every cluster"""
+        def on_done(results, errors):
+            outputs = {cluster: output + error for cluster, (output, error) in results.items()}
+            outputs.update(errors)
+            self.show_command_output(self.cluster_messages(outputs), '')
+
+        self.runner.run_each({name: 'sdiag' for name in self.runner.clusters()}, on_done)
+
+    def priority(self):
+        """Rank the pending jobs of every cluster by priority, with sprio and sshare.
+
+        Each cluster answers in one round trip, and the join and ranking
+        run off the GUI thread.
+        """
+        def on_done(results, errors):
+            def parse():
+                with self.instrument.measure('sprio', 'parse'):
+                    return parse_priorities(results, errors)
+
+            def on_parsed(records):
+                if errors and not records:
+                    self.show_command_output('', self.cluster_messages(errors))
+                    return
+                if errors:
+                    self.status.showMessage(f"sprio failed on {', '.join(errors)}")
+                self.set_stale(None)
+                self.show_records(priority_columns(), records, key='key', operation='sprio')
+                self.view_kind = 'priority'
+                if not errors:
+                    self.status.showMessage(f"{len(records)} pending jobs ranked", 3000)
+
+            self.runner.submit(parse, on_parsed, self.show_command_error, "Ranking pending jobs")
+
+        self.runner.run_each({name: priority_command() for name in self.runner.clusters()}, on_done)
+
+    def history_db(self):
+        """Return the local job history, opening it on first use"""
+        if self.history is None:
+            self.history = HistoryDB()
+        return self.history
+
+    def sync_history(self):
+        """Fetch the jobs that ended since the last sync of every cluster.
+
+        sacct only returns jobs since each cluster's watermark, and the
+        rows are stored off the GUI thread.
+        """
+        try:
+            db = self.history_db()
+            commands = history_commands(db, self.runner.clusters())
         except Exception as e:
-            print(f"Error converting to HTML: {str(e)}")
-            # Clear the text edit widget and insert the plain text output
-            self.text_edit.clear()
-            self.text_edit.insertPlainText(sdiag)
+            QMessageBox.critical(self, "History Error", str(e))
+            return
+
+        def on_done(results, errors):
+            outputs = split_outputs(results, errors)
+            if errors:
+                self.status.showMessage(f"History sync failed on {', '.join(errors)}")
+                self.show_command_output('', self.cluster_messages(errors))
+            if not outputs:
+                return
 
-    def convert_to_html(self, jobs):
-        """Converts the plain text output of squeue to an HTML table"""
-        
-        # Split the output into lines
-        lines = jobs.splitlines()
-
-        # Get the headers from the first line
-        headers = lines[0].split()
-
-        # Start the HTML table
-        html = '''
-        <style>
-            body { margin: 20px; }
-            table { width: 100%; border-collapse: collapse; margin: 20px 0; }
-            th, td {padding: 4px 6px; text-align: left; }
-        </style>
-        '''
-        html += '<body>'
-        html += '<table>'
-        
-        # Create the header row
-        html += '<tr>'
-        for header in headers:
-            html += f'<th style="color: #66FF66; font-weight: bold;">{header}</th>'
-        html += '</tr>'
-
-        # Iterate over the remaining lines (job information)
-        for line in lines[1:]:
-            # Split each line into columns
-            columns = line.split()
-
-            # Add a row for each job
-            html += '<tr>'
-            for i, column in enumerate(columns):
-                # Check if the header contains 'ST' and apply color based on the value in the corresponding column
-                if headers[i] == 'ST':
-                    if column == 'PD':
-                        html += f'<td style="color: #FF7700;">{column}</td>'
-                    elif column == 'R':
-                        html += f'<td style="color: #66FF66;">{column}</td>'
-                    else:
-                        html += f'<td>{column}</td>'
-                elif headers[i] == 'USER':
-                    username_prefix = SSHConnectionDialog(self).get_connection_info()['username'][:8]
-                    if column == username_prefix:
-                        html += f'<td style="color: #008BFC; font-style: italic;">{column}</td>'
-                    else:
-                        html += f'<td>{column}</td>'
-                elif headers[i] == 'STATE':
-                    if column == 'down' or column == 'down*':
-                        html += f'<td style="color: #FF5555;">{column}</td>'
-                    else:
-                        html += f'<td>{column}</td>'
-                else:
-                    html += f'<td>{column}</td>'
-            html += '</tr>'
+            def on_stored(counts):
+                self.status.showMessage(
+                    f"History synced: {sum(counts.values())} jobs fetched, {db.count()} stored", 5000)
 
-        # Close the HTML table
-        html += '</table></body>'
-        
-        return html
+            self.runner.submit(lambda: store_history(db, outputs), on_stored, self.show_command_error, "Storing job history")
+
+        self.status.showMessage("Syncing job history...")
+        self.runner.run_each(commands, on_done, cache=False)
+
+    def history_report(self):
+        """Show a report computed from the local job history"""
+        dialog = HistoryDialog(self.runner.clusters(), self)
+        if not dialog.exec_():
+            return
+        report = dialog.get_report()
+        try:
+            db = self.history_db()
+        except Exception as e:
+            QMessageBox.critical(self, "History Error", str(e))
+            return
+
+        def on_report(result):
+            columns, rows = result
+            if not rows:
+                QMessageBox.information(self, "Job History",
+                                        "No jobs in the local history. Use Sync History first.")
+                return
+            self.show_records([(c.upper(), c) for c in columns], rows, cluster_column=False,
+                              operation='sacct')
+            self.view_kind = 'history'
+
+        self.runner.submit(lambda: db.report(**report), on_report, self.show_command_error,
+                           report['name'])
+
+    def toggle_dashboard(self, enabled):
+        """Start or stop sampling node states and sdiag metrics"""
+        if enabled:
+            self.stack.setCurrentIndex(2)
+            self.sample_dashboard()
+            self.dashboard_timer.start(self.dashboard_interval * 1000)
+        else:
+            self.dashboard_timer.stop()
+
+    def set_dashboard_interval(self):
+        """Ask for the dashboard sampling interval in seconds"""
+        seconds, ok = QInputDialog.getInt(
+            self, "Dashboard Interval", "Sample every (seconds):", self.dashboard_interval, 5, 3600)
+        if ok:
+            self.dashboard_interval = seconds
+            if self.dashboard_timer.isActive():
+                self.dashboard_timer.start(seconds * 1000)
+
+    def metric_store(self, cluster):
+        """Return the samples of cluster, loading its ring file on first use"""
+        store = self.metric_stores.get(cluster)
+        if store is None:
+            try:
+                store = MetricStore(path=metrics_path(cluster))
+            except OSError as e:
+                self.status.showMessage(f"Dashboard samples of {cluster} kept in memory only: {e}")
+                store = MetricStore()
+            self.metric_stores[cluster] = store
+        return store
+
+    def sample_dashboard(self):
+        """Take one sample of every cluster, sinfo and sdiag in a single round trip"""
+        if self.dashboard_sampling:
+            return
+        clusters = self.runner.clusters()
+        for cluster in clusters:
+            self.metric_store(cluster)
+        self.dashboard.set_stores({c: self.metric_stores[c] for c in clusters})
+
+        def on_done(results, errors):
+            self.dashboard_sampling = False
+            now = time.time()
+            for cluster, output in split_outputs(results, errors).items():
+                self.metric_store(cluster).append(now, parse_sample(output))
+            if errors:
+                self.status.showMessage(f"Dashboard sample failed on {', '.join(errors)}", 5000)
+            self.dashboard.update_partitions()
+
+        self.dashboard_sampling = True
+        self.runner.run_each({c: sample_command() for c in clusters}, on_done, cache=False)
+
+    def watch_selected_jobs(self):
+        """Notify the state changes of the selected jobs, or of job ids typed in"""
+        keys = []
+        if self.view_kind == 'jobs' and self.stack.currentIndex() == 1:
+            rows = {index.row() for index in self.table_view.selectionModel().selectedIndexes()}
+            keys = [self.job_key(row) for row in sorted(rows)]
+        if not keys:
+            cluster = self.cluster_combo.currentText() or self.runner.clusters()[0]
+            text, ok = QInputDialog.getText(self, "Watch Jobs", f"Job ids on {cluster}:")
+            if not ok:
+                return
+            keys = [(cluster, job_id) for job_id in text.replace(',', ' ').split()]
+            if not keys:
+                return
+        for cluster in {cluster for cluster, _ in keys}:
+            self.watcher.watch_jobs(cluster, [job_id for c, job_id in keys if c == cluster])
+        self.start_watching()
+
+    def toggle_watch_mine(self, enabled):
+        """Watch every job of the connected users, including the ones submitted later"""
+        for name, connection in self.runner.connections.items():
+            if enabled:
+                self.watcher.watch_user(name, connection.username)
+            else:
+                self.watcher.unwatch_user(name, connection.username)
+        if enabled:
+            self.start_watching()
+        elif not self.watcher.is_active():
+            self.stop_watching()
+
+    def start_watching(self):
+        """Poll the watcher now, then at its own pace"""
+        self.stop_watching_action.setEnabled(True)
+        self.tray.setVisible(QSystemTrayIcon.isSystemTrayAvailable())
+        if not self.watch_polling:
+            self.watch_timer.start(0)
+
+    def stop_watching(self):
+        """Forget every watched job and user"""
+        self.watcher.clear()
+        self.watch_timer.stop()
+        self.watch_mine_action.blockSignals(True)
+        self.watch_mine_action.setChecked(False)
+        self.watch_mine_action.blockSignals(False)
+        self.stop_watching_action.setEnabled(False)
+        self.tray.hide()
+
+    def poll_watcher(self):
+        """Run one watcher poll: one squeue per cluster, then sacct for the jobs that left the queue"""
+        if self.watch_polling:
+            return
+        if not self.watcher.is_active():
+            self.stop_watching()
+            return
+        commands = {cluster: command for cluster, command in self.watcher.commands().items()
+                    if cluster in self.runner.connections}
+
+        def on_squeue(results, errors):
+            events = self.watcher.update(results)
+            sacct_commands = {cluster: command for cluster, command in self.watcher.sacct_commands().items()
+                              if cluster in self.runner.connections}
+            if not sacct_commands:
+                finish(events, errors)
+                return
+            self.runner.run_each(sacct_commands,
+                                 lambda sacct_results, sacct_errors: finish(
+                                     events + self.watcher.resolve(sacct_results),
+                                     {**errors, **sacct_errors}),
+                                 cache=False)
+
+        def finish(events, errors):
+            self.watch_polling = False
+            self.notify_events(events)
+            if errors:
+                self.status.showMessage(f"Job watch failed on {', '.join(errors)}", 5000)
+            if not self.watcher.is_active():
+                self.stop_watching()
+                self.status.showMessage("No job left to watch", 5000)
+                return
+            interval = self.watcher.next_interval(events)
+            self.watch_timer.start(interval * 1000)
+            self.tray.setToolTip(f"slurmLab: watching {len(self.watcher)} jobs, next check in {interval} s")
+
+        self.watch_polling = True
+        self.runner.run_each(commands, on_squeue, cache=False)
+
+    def notify_events(self, events):
+        """Show job events as one system tray notification, or in the status bar"""
+        if not events:
+            return
+        show_cluster = len(self.runner.clusters()) > 1
+        if len(events) == 1:
+            title = events[0].title
+            lines = [events[0].message(show_cluster)]
+        else:
+            title = f"{len(events)} job updates"
+            lines = [f"{event.title}: {event.message(show_cluster)}" for event in events[:5]]
+            if len(events) > 5:
+                lines.append(f"and {len(events) - 5} more")
+        failed = any(event.kind in ('failed', 'timeout') for event in events)
+        if self.tray.isVisible() and QSystemTrayIcon.supportsMessages():
+            icon = QSystemTrayIcon.Warning if failed else QSystemTrayIcon.Information
+            self.tray.showMessage(title, '\n'.join(lines), icon)
+        self.status.showMessage(f"{title}: {'; '.join(lines)}", 15000)
 
     def execute_command(self):
-        """Execute a command from cmd_type on the SSH server"""
+        """Execute a command from cmd_type on the SSH server, streaming its output"""
         cmd = self.cmd_type.text()
         self.cmd_type.clear()
+        if not cmd.strip():
+            return
+        self.stop_command()
 
+        self.show_console()
+        self.text_edit.clear()
+        cluster = self.cluster_combo.currentText() or None
         try:
-            _, stdout, stderr = self.ssh_client.exec_command(cmd)
-            cmd_executed = stdout.read().decode()
-            cmd_error = stderr.read().decode()
-
-            self.text_edit.clear()
-
-            if cmd_executed:
-                self.text_edit.insertPlainText(cmd_executed)
-            if cmd_error:
-                self.text_edit.insertPlainText(f"Error:\n{cmd_error}")
-
+            # Typed commands always go to the server
+            self.console_request = self.runner.stream(
+                cmd, self.append_console_output, self.console_command_exited,
+                self.console_command_failed, cluster)
+            self.stop_button.setEnabled(True)
         except Exception as e:
-            self.text_edit.clear()
-            self.text_edit.insertPlainText(f"Exception: {str(e)}")
+            QMessageBox.critical(self, "SSH Error", str(e))
+
+    def stop_command(self):
+        """Stop the command running in the console"""
+        if self.console_request is not None:
+            self.runner.cancel(self.console_request)
+
+    def append_console_output(self, text, is_stderr=False):
+        """Append streamed text at the end of the console"""
+        scrollbar = self.text_edit.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+
+        text_format = QTextCharFormat()
+        if is_stderr:
+            text_format.setForeground(QColor('#FF5555'))
+        with self.instrument.measure('console', 'render'):
+            cursor = QTextCursor(self.text_edit.document())
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(text, text_format)
+
+        # Follow the output unless the user scrolled up to read
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def console_command_exited(self, status):
+        self.console_request = None
+        self.stop_button.setEnabled(False)
+        if status != 0:
+            self.append_console_output(f"\n[exit status {status}]", True)
+
+    def console_command_failed(self, message):
+        self.console_request = None
+        self.stop_button.setEnabled(False)
+        self.append_console_output(f"\n[{message}]", True)
+
+    def show_command_output(self, cmd_executed, cmd_error):
+        """Show the output of a free-form command"""
+        self.show_console()
+        self.text_edit.clear()
+
+        if cmd_executed:
+            self.text_edit.insertPlainText(cmd_executed)
+        if cmd_error:
+            self.text_edit.insertPlainText(f"Error:\n{cmd_error}")
 
     def help(self):
         """Show help text in the text edit"""
+        self.show_console()
         self.text_edit.clear()
         try:
             with open('help.html', 'r', encoding='utf-8') as file:
@@ -542,9 +2003,36 @@ class MainWindow(QMainWindow):
         except Exception as e:
             self.text_edit.setPlainText(f"Error opening the file: {str(e)}")
 
-    def increase_font_size(self):
-        """Increase the font size of the text edit"""
-        self.font_size += 1
+    def clear_view(self):
+        """Clear the console or the table, whichever is shown"""
+        if self.stack.currentIndex() == 0:
+            self.text_edit.clear()
+        elif self.stack.currentIndex() == 1:
+            self.table_model.set_records([], [])
+            self.view_kind = None
+
+    def copy_selection(self):
+        """Copy the selected text or table rows to the clipboard"""
+        if self.stack.currentIndex() == 0:
+            self.text_edit.copy()
+            return
+
+        rows = sorted({index.row() for index in self.table_view.selectionModel().selectedIndexes()})
+        columns = range(self.proxy_model.columnCount())
+        lines = ['\t'.join(self.proxy_model.headerData(c, Qt.Horizontal) for c in columns)]
+        for row in rows:
+            lines.append('\t'.join(str(self.proxy_model.index(row, c).data()) for c in columns))
+        QApplication.clipboard().setText('\n'.join(lines))
+
+    def select_all(self):
+        """Select all the text or table rows"""
+        if self.stack.currentIndex() == 0:
+            self.text_edit.selectAll()
+        else:
+            self.table_view.selectAll()
+
+    def apply_font_size(self):
+        """Apply the current font size to the console and the table"""
         self.text_edit.setStyleSheet(f"""
             QTextEdit {{
             background-color: #2E2E2E;
@@ -553,22 +2041,40 @@ class MainWindow(QMainWindow):
             font-size: {self.font_size}pt;
             }}
         """)
-
-    def decrease_font_size(self):
-        """Decrease the font size of the text edit"""
-        if self.font_size > 1:  # Prevent font size from becoming too small
-            self.font_size -= 1
-            self.text_edit.setStyleSheet(f"""
-            QTextEdit {{
+        self.table_view.setStyleSheet(f"""
+            QTableView {{
             background-color: #2E2E2E;
             color: white;
             font-family: "Monaco";
             font-size: {self.font_size}pt;
             }}
-            """)
+            QHeaderView::section {{
+            background-color: #2E2E2E;
+            color: #66FF66;
+            font-weight: bold;
+            border: none;
+            padding: 4px 6px;
+            }}
+        """)
+        self.table_view.verticalHeader().setDefaultSectionSize(self.font_size * 2 + 8)
+        self.detail_panel.set_font_size(self.font_size)
+        self.stats_panel.set_font_size(self.font_size)
+
+    def increase_font_size(self):
+        """Increase the font size of the text edit"""
+        self.font_size += 1
+        self.apply_font_size()
+
+    def decrease_font_size(self):
+        """Decrease the font size of the text edit"""
+        if self.font_size > 1:  # Prevent font size from becoming too small
+            self.font_size -= 1
+            self.apply_font_size()
 
 if __name__ == "__main__":
+    load_env()
     app = QApplication(sys.argv)
     window = MainWindow()
+    window.restore_session()
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1 @@
+"""Benchmarks of slurmLab against a synthetic cluster; see benchmarks/run.py"""
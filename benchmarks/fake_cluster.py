@@ -0,0 +1,413 @@
+"""A synthetic SLURM cluster served over a local paramiko SSH server.
+
+FakeCluster answers the commands slurmLab sends (squeue, sinfo, scontrol,
+sdiag, sacct and the job detail, sample and priority one-liners) with canned output
+for any number of jobs. FakeSSHServer serves it on localhost, so the real
+SSHConnection, workers and parsers run end to end.
+"""
+import logging
+import random
+import shlex
+import socket
+import threading
+import time
+from parsers import DETAIL_SEPARATOR, SQUEUE_FIELDS
+from metrics import SAMPLE_SEPARATOR
+from priority import PRIORITY_SEPARATOR
+
+PARTITIONS = ('batch', 'gpu', 'long', 'debug')
+
+# Job states and their share of the queue
+STATES = (('R', 40), ('PD', 50), ('CG', 5), ('S', 5))
+
+PENDING_REASONS = ('(Priority)', '(Resources)', '(QOSMaxJobsPerUserLimit)', '(Dependency)')
+
+# Distinct users; the connected user owns every USERS-th job
+USERS = 200
+
+# Final states of the jobs leaving the queue, in sacct terms
+FINAL_STATES = ('COMPLETED', 'COMPLETED', 'COMPLETED', 'FAILED', 'TIMEOUT', 'CANCELLED by 1000',
+                'OUT_OF_MEMORY')
+
+NODE_STATES = ('MIXED', 'ALLOCATED', 'IDLE', 'DRAIN', 'DOWN*')
+
+SDIAG_OUTPUT = """\
+*******************************************************
+sdiag output at Thu Oct 17 10:00:00 2026 (1760695200)
+Data since      Thu Oct 17 00:00:00 2026 (1760659200)
+*******************************************************
+Server thread count:  3
+Agent queue size:     0
+Jobs submitted: {submitted}
+Jobs started:   {started}
+Jobs completed: {completed}
+Jobs failed:    12
+
+Main schedule statistics (microseconds):
+\tLast cycle:   1850
+\tMax cycle:    95000
+\tTotal cycles: 2880
+\tMean cycle:   2100
+\tMean depth cycle:  120
+\tLast queue length: {pending}
+
+Backfilling stats
+\tTotal backfilled jobs (since last slurm start): 4210
+\tLast cycle: 350000
+\tMax cycle:  2900000
+\tMean cycle: 410000
+\tLast depth cycle: 800
+\tDepth Mean: 750
+
+Remote Procedure Call statistics by message type
+\tREQUEST_JOB_INFO                        ( 2003) count:{rpc}  ave_time:3100   total_time:{rpc_time}
+\tREQUEST_PARTITION_INFO                  ( 2009) count:8100   ave_time:120    total_time:972000
+\tREQUEST_NODE_INFO                       ( 2007) count:7900   ave_time:450    total_time:3555000
+"""
+
+_SPECIFIERS = {spec: field for field, (_, spec) in SQUEUE_FIELDS.items()}
+
+# Server side paramiko log, silent: closed clients show up as resets
+_log = logging.getLogger('benchmarks.fake_ssh')
+_log.addHandler(logging.NullHandler())
+_log.propagate = False
+
+
+def _duration(seconds):
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    text = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{days}-{text}" if days else text
+
+
+class FakeCluster:
+    """Deterministic jobs, nodes and scheduler statistics of a cluster.
+
+    Outputs are generated once per job snapshot; tick() changes a fraction
+    of the jobs the way a live queue does between two polls.
+    """
+
+    def __init__(self, jobs=1000, username='bench', seed=0):
+        self.username = username
+        self.random = random.Random(seed)
+        self.next_id = 1000000
+        self.node_count = max(16, jobs // 20)
+        self.jobs = [self._new_job() for _ in range(jobs)]
+        # Job id -> final state of the jobs that left the queue
+        self.finished = {}
+        self.version = 0
+        self._outputs = {}
+        self._lock = threading.Lock()
+
+    def _new_job(self):
+        rng = self.random
+        job_id = self.next_id
+        self.next_id += 1
+        user = self.username if job_id % USERS == 0 else f"user{job_id % USERS:03d}"
+        state = rng.choices([s for s, _ in STATES], [w for _, w in STATES])[0]
+        job = {
+            'job_id': str(job_id),
+            'partition': PARTITIONS[job_id % len(PARTITIONS)],
+            'name': f"train_{job_id % 500}",
+            'user': user,
+            'account': f"proj{job_id % 40:02d}",
+            'qos': 'normal' if job_id % 7 else 'high',
+            'state': state,
+            'time_limit': _duration(rng.choice((3600, 14400, 86400, 172800))),
+            'nodes': str(rng.choice((1, 1, 1, 2, 4, 8))),
+            'cpus': str(rng.choice((1, 4, 16, 32, 64))),
+            'priority': str(rng.randint(1000, 100000)),
+            'submit_time': time.strftime('%Y-%m-%dT%H:%M:%S',
+                                         time.gmtime(1760600000 + job_id % 86400)),
+            'array_job_id': str(job_id),
+            'array_task_id': 'N/A',
+        }
+        self._set_state(job, state)
+        return job
+
+    def _set_state(self, job, state):
+        job['state'] = state
+        if state == 'PD':
+            job['time'] = '0:00'
+            job['time_left'] = job['time_limit']
+            job['reason'] = self.random.choice(PENDING_REASONS)
+        else:
+            job['time'] = _duration(self.random.randint(1, 86400))
+            job['time_left'] = _duration(self.random.randint(60, 86400))
+            first = self.random.randint(1, self.node_count)
+            job['reason'] = f"node[{first:04d}-{first + int(job['nodes']) - 1:04d}]"
+
+    def tick(self, fraction=0.05):
+        """Start, finish and submit fraction of the jobs, like one poll interval"""
+        with self._lock:
+            rng = self.random
+            count = max(1, int(len(self.jobs) * fraction))
+            for job in rng.sample(self.jobs, min(count, len(self.jobs))):
+                if job['state'] == 'PD':
+                    self._set_state(job, 'R')
+                else:
+                    job['time'] = _duration(rng.randint(1, 86400))
+            finished = set(rng.sample(range(len(self.jobs)), min(count // 2, len(self.jobs))))
+            for i in finished:
+                self.finished[self.jobs[i]['job_id']] = rng.choice(FINAL_STATES)
+            self.jobs = [job for i, job in enumerate(self.jobs) if i not in finished]
+            self.jobs.extend(self._new_job() for _ in range(count // 2))
+            self.version += 1
+            self._outputs.clear()
+
+    def respond(self, command):
+        """Return (stdout, stderr, exit status) of command as bytes"""
+        if command.startswith('squeue') and '; ' in command:
+            # Several squeue calls in one round trip, as the job watcher sends
+            parts = [self.respond(part) for part in command.split('; ')]
+            return (b''.join(out for out, _, _ in parts), b''.join(err for _, err, _ in parts),
+                    parts[-1][2])
+        try:
+            if command.startswith('info=$(scontrol show job'):
+                return self.job_detail(shlex.split(command.split(';')[0])[-1].rstrip(')')), b'', 0
+            if command.startswith('sinfo') and SAMPLE_SEPARATOR in command:
+                return self._cached('sample', self.sample), b'', 0
+            if command.startswith('sprio') and PRIORITY_SEPARATOR in command:
+                # sprio and sshare, then the pending jobs from squeue
+                squeue = command.rsplit('; ', 1)[1]
+                return self._cached('priority', self.priority) + self.respond(squeue)[0], b'', 0
+            if command.startswith('now=$(date') and 'sacct' in command:
+                return self._cached('sacct', self.sacct), b'', 0
+            program, *args = shlex.split(command)
+        except ValueError as e:
+            return b'', f"bash: {e}\n".encode(), 2
+        if program == 'squeue':
+            return self.squeue(args), b'', 0
+        if program == 'sinfo':
+            return self._cached('sinfo', self.sinfo), b'', 0
+        if program == 'scontrol' and args[:2] == ['show', 'node']:
+            return self._cached('nodes', self.nodes), b'', 0
+        if program == 'sdiag':
+            return self.sdiag(), b'', 0
+        if program == 'sacct':
+            return self.sacct_jobs(args), b'', 0
+        return b'', f"bash: {program}: command not found\n".encode(), 127
+
+    def _cached(self, name, function, *args):
+        with self._lock:
+            key = (name,) + args
+            output = self._outputs.get(key)
+            if output is None:
+                output = self._outputs[key] = function(*args)
+            return output
+
+    def squeue(self, args):
+        """squeue --noheader --format=... with the filters slurmLab uses"""
+        options = dict(arg[2:].split('=', 1) for arg in args if arg.startswith('--') and '=' in arg)
+        fields = tuple(_SPECIFIERS[spec] for spec in options.get('format', '%i').split('|'))
+        filters = tuple((field, frozenset(options[option].split(',')))
+                        for option, field in (('jobs', 'job_id'), ('user', 'user'), ('states', 'state'),
+                                              ('partition', 'partition'), ('account', 'account'),
+                                              ('name', 'name'), ('qos', 'qos'))
+                        if option in options)
+        return self._cached('squeue', self._squeue, fields, filters)
+
+    def _squeue(self, fields, filters):
+        return ''.join(
+            '|'.join(job[field] for field in fields) + '\n'
+            for job in self.jobs if all(job[field] in values for field, values in filters)
+        ).encode()
+
+    def sinfo(self):
+        lines = []
+        per_state = max(1, self.node_count // (len(PARTITIONS) * 3))
+        first = 1
+        for i, partition in enumerate(PARTITIONS):
+            for state in ('mix', 'alloc', 'idle'):
+                last = first + per_state - 1
+                name = partition + ('*' if i == 0 else '')
+                lines.append(f"{name}|up|2-00:00:00|{per_state}|{state}|node[{first:04d}-{last:04d}]")
+                first = last + 1
+        return ('\n'.join(lines) + '\n').encode()
+
+    def nodes(self):
+        lines = []
+        for i in range(1, self.node_count + 1):
+            state = NODE_STATES[i % len(NODE_STATES)]
+            alloc = 0 if state in ('IDLE', 'DOWN*') else (64 if state == 'ALLOCATED' else 32)
+            reason = ' Reason=maintenance [root@2026-10-16T08:00:00]' if state in ('DRAIN', 'DOWN*') else ''
+            lines.append(
+                f"NodeName=node{i:04d} Arch=x86_64 CoresPerSocket=32 CPUAlloc={alloc} CPUTot=64 "
+                f"CPULoad={alloc * 0.9:.2f} AvailableFeatures=avx512,ib ActiveFeatures=avx512,ib "
+                f"Gres={'gpu:a100:4' if i % 8 == 0 else '(null)'} NodeAddr=node{i:04d} "
+                f"NodeHostName=node{i:04d} Version=23.11.4 OS=Linux 5.14.0 RealMemory=512000 "
+                f"AllocMem={alloc * 4000} FreeMem={512000 - alloc * 5000} Sockets=2 Boards=1 "
+                f"State={state} ThreadsPerCore=1 TmpDisk=0 Weight=1 Owner=N/A "
+                f"Partitions={PARTITIONS[i % len(PARTITIONS)]},long "
+                f"BootTime=2026-10-01T08:00:00 SlurmdStartTime=2026-10-01T08:01:00{reason}")
+        return ('\n'.join(lines) + '\n').encode()
+
+    def sdiag(self):
+        pending = sum(1 for job in self.jobs if job['state'] == 'PD')
+        return SDIAG_OUTPUT.format(submitted=self.next_id - 1000000, started=len(self.jobs) - pending,
+                                   completed=len(self.jobs) // 2, pending=pending,
+                                   rpc=len(self.jobs) * 3, rpc_time=len(self.jobs) * 9300).encode()
+
+    def sample(self):
+        """sinfo --format='%R|%T|%D' then sdiag, as metrics.sample_command asks"""
+        states = {'mix': 'mixed', 'alloc': 'allocated', 'idle': 'idle'}
+        lines = []
+        for line in self.sinfo().decode().splitlines():
+            partition, _, _, count, state, _ = line.split('|')
+            lines.append(f"{partition.rstrip('*')}|{states[state]}|{count}")
+        return ('\n'.join(lines) + f"\n{SAMPLE_SEPARATOR}\n").encode() + self.sdiag()
+
+    def priority(self):
+        """sprio of the pending jobs and sshare of their associations, as priority_command asks"""
+        lines = []
+        associations = set()
+        for job in self.jobs:
+            if job['state'] != 'PD':
+                continue
+            priority = int(job['priority'])
+            age, fairshare, size = priority * 3 // 10, priority * 4 // 10, priority // 10
+            partition = 1000 if job['partition'] == 'debug' else 0
+            qos = priority - age - fairshare - size - partition
+            lines.append(f"{job['job_id']}|{job['partition']}|{job['user']}|{job['account']}|"
+                         f"{priority}|0|{age}|{fairshare}|{size}|{partition}|{qos}|0|"
+                         f"cpu={job['cpus']},mem=0")
+            associations.add((job['account'], job['user']))
+        lines.append(PRIORITY_SEPARATOR)
+        lines.append("root||1|1.000000|1000000|1.000000|0.500000")
+        for account in sorted({account for account, _ in associations}):
+            lines.append(f" {account}||1|0.025000|25000|0.025000|")
+            for user in sorted(user for a, user in associations if a == account):
+                usage = (sum(map(ord, user + account)) % 97 + 1) / 100
+                lines.append(f"  {account}|{user}|1|0.001000|{int(usage * 1000)}|{usage / 1000:.6f}|"
+                             f"{1 - usage:.6f}")
+        lines.append(PRIORITY_SEPARATOR)
+        return ('\n'.join(lines) + '\n').encode()
+
+    def sacct(self):
+        """The finished jobs of the last days, one per queued job"""
+        rng = random.Random(self.version)
+        lines = []
+        for i, job in enumerate(self.jobs):
+            submit = 1760600000 + i % 80000
+            start = submit + rng.randint(0, 7200)
+            elapsed = rng.randint(60, 86400)
+            cpus = int(job['cpus'])
+            state = rng.choice(FINAL_STATES)
+            lines.append('|'.join((
+                str(900000 + i), job['user'], job['account'], job['partition'],
+                state, '0:0',
+                time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(submit)),
+                time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(start)),
+                time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(start + elapsed)),
+                str(elapsed), job['time_limit'], str(cpus),
+                _duration(int(elapsed * cpus * rng.random())), job['nodes'], job['name'])))
+        lines.append('2026-10-17T10:00:00')
+        return ('\n'.join(lines) + '\n').encode()
+
+    def sacct_jobs(self, args):
+        """sacct --jobs=... --format=JobID,State,ExitCode,JobName of finished jobs"""
+        options = dict(arg[2:].split('=', 1) for arg in args if arg.startswith('--') and '=' in arg)
+        lines = []
+        for job_id in options.get('jobs', '').split(','):
+            state = self.finished.get(job_id)
+            if state is not None:
+                exit_code = '0:0' if state == 'COMPLETED' else '1:0'
+                lines.append(f"{job_id}|{state}|{exit_code}|train_{int(job_id) % 500}")
+        return ''.join(line + '\n' for line in lines).encode()
+
+    def job_detail(self, job_id):
+        """scontrol show job, sstat and the output tails of job_detail_command"""
+        job = next((job for job in self.jobs if job['job_id'] == job_id), None)
+        if job is None:
+            return f"slurm_load_jobs error: Invalid job id specified\n{DETAIL_SEPARATOR}\n".encode()
+        out = f"/home/{job['user']}/slurm-{job_id}.out"
+        info = (f"JobId={job_id} JobName={job['name']} UserId={job['user']}(1000) "
+                f"Account={job['account']} QOS={job['qos']} JobState={job['state']} "
+                f"Reason=None Partition={job['partition']} NumNodes={job['nodes']} "
+                f"NumCPUs={job['cpus']} TimeLimit={job['time_limit']} "
+                f"SubmitTime={job['submit_time']} TRES=cpu={job['cpus']},mem=64G,node=1 "
+                f"Command=/home/{job['user']}/run.sh WorkDir=/home/{job['user']} "
+                f"StdErr={out} StdOut={out}")
+        steps = f"{job_id}.0|{job['cpus']}|01:02:03|1.2G|2.5G|8G|10M|2M" if job['state'] == 'R' else ''
+        tail = ''.join(f"epoch {i} loss {1 / (i + 1):.4f}\n" for i in range(40))
+        return '\n'.join((info, DETAIL_SEPARATOR, steps, DETAIL_SEPARATOR, tail + DETAIL_SEPARATOR,
+                          '')).encode()
+
+
+class FakeSSHServer:
+    """Local SSH server running every exec request against a FakeCluster.
+
+    Any password is accepted. latency seconds are waited before each
+    command answers, standing in for the network and the controller.
+    """
+
+    def __init__(self, cluster, latency=0.0, host='127.0.0.1', port=0):
+        import paramiko
+        self.cluster = cluster
+        self.latency = latency
+        self.key = paramiko.RSAKey.generate(2048)
+        self.socket = socket.socket()
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.host, self.port = self.socket.getsockname()
+        self._transports = []
+        self._closed = False
+
+    def start(self):
+        self.socket.listen(16)
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def close(self):
+        self._closed = True
+        self.socket.close()
+        for transport in self._transports:
+            transport.close()
+
+    def _accept(self):
+        import paramiko
+        server = self
+
+        class Interface(paramiko.ServerInterface):
+            def get_allowed_auths(self, username):
+                return 'password'
+
+            def check_auth_password(self, username, password):
+                return paramiko.AUTH_SUCCESSFUL
+
+            def check_channel_request(self, kind, chanid):
+                return paramiko.OPEN_SUCCEEDED
+
+            def check_channel_exec_request(self, channel, command):
+                threading.Thread(target=server._run, args=(channel, command.decode()),
+                                 daemon=True).start()
+                return True
+
+        while not self._closed:
+            try:
+                client, _ = self.socket.accept()
+            except OSError:
+                return
+            # Without it the small exec replies wait for delayed ACKs (~40 ms)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(client)
+            transport.set_log_channel(_log.name)
+            transport.add_server_key(self.key)
+            transport.start_server(server=Interface())
+            self._transports.append(transport)
+
+    def _run(self, channel, command):
+        if self.latency:
+            time.sleep(self.latency)
+        stdout, stderr, status = self.cluster.respond(command)
+        try:
+            if stdout:
+                channel.sendall(stdout)
+            if stderr:
+                channel.sendall_stderr(stderr)
+            channel.send_exit_status(status)
+        finally:
+            # Only EOF: closing here could overtake the reply to the exec
+            # request. The client closes the channel once it read everything.
+            channel.shutdown_write()
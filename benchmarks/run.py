@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""Benchmarks of slurmLab against a synthetic cluster, run from the repository root.
+
+Three suites, each at every scale (number of queued jobs):
+    parse  parsers and stores on canned output, no network
+    core   SlurmClient over a local SSH server, as the CLI runs
+    gui    the MainWindow views, offscreen, over the same server
+
+Times are the best of --repeat runs; memory is the tracemalloc peak of
+one extra run, so tracing does not slow the timed ones.
+
+Examples:
+    python -m benchmarks.run
+    python -m benchmarks.run --scales 100000 --suites parse
+    python -m benchmarks.run --latency 0.05 --json results.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from benchmarks.fake_cluster import FakeCluster, FakeSSHServer
+from core import SlurmClient, store_history
+from connection import SSHConnection
+from history import HistoryDB, parse_sacct, sacct_command
+from instrument import Instrument
+from metrics import parse_sample
+from nodes import NodeStore, parse_nodes
+from priority import parse_priority, priority_command
+from session import decode_data, encode_data
+from parsers import (
+    SQUEUE_FETCH_COLUMNS, JobStore, parse_job_detail, parse_sinfo, parse_squeue, sinfo_command,
+    squeue_command
+    )
+
+SCALES = (1000, 10000, 100000)
+
+SUITES = ('parse', 'core', 'gui')
+
+# Fraction of the jobs changed between two monitor polls
+TICK_FRACTION = 0.05
+
+# Seconds to wait for a GUI operation before giving up
+GUI_TIMEOUT = 600
+
+
+class Result:
+    """Timings of one benchmark step"""
+    __slots__ = ('suite', 'scale', 'step', 'best', 'median', 'peak', 'extra')
+
+    def __init__(self, suite, scale, step, times, peak=None, extra=None):
+        self.suite = suite
+        self.scale = scale
+        self.step = step
+        self.best = min(times)
+        self.median = statistics.median(times)
+        # tracemalloc peak in bytes
+        self.peak = peak
+        # Metrics recorded by the instrument, such as rtt and bytes
+        self.extra = extra or {}
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def measure(function, repeat, setup=None):
+    """Run setup() then time function(state) repeat times, and once more traced.
+
+    Returns the times in seconds and the traced peak in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(state)
+        times.append(time.perf_counter() - start)
+
+    state = setup() if setup is not None else None
+    tracemalloc.start()
+    try:
+        function(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def instrument_medians(instrument, operation):
+    """Return the median of every metric recorded for operation"""
+    return {stat.metric: stat.p50 for stat in instrument.stats()
+            if stat.operation == operation and stat.metric in ('queue', 'rtt', 'remote', 'bytes')}
+
+
+def bench_parse(cluster, repeat, scratch):
+    """Parsers and stores on canned output"""
+    scale = len(cluster.jobs)
+    squeue_output = cluster.respond(squeue_command())[0].decode()
+    outputs = {
+        'sinfo': cluster.respond(sinfo_command())[0].decode(),
+        'nodes': cluster.respond('scontrol show node --oneliner')[0].decode(),
+        'sacct': cluster.respond(sacct_command())[0].decode(),
+        'sample': cluster.sample().decode(),
+        'detail': cluster.job_detail(cluster.jobs[0]['job_id']).decode(),
+        'priority': cluster.respond(priority_command())[0].decode(),
+    }
+    records = parse_squeue(squeue_output, SQUEUE_FETCH_COLUMNS, 'bench')
+
+    def filled_store():
+        store = JobStore()
+        store.update(records, 'bench')
+        return store
+
+    def filled_nodes():
+        store = NodeStore()
+        store.update(parse_nodes(outputs['nodes'], 'bench'), 'bench')
+        return store
+
+    cluster.tick(TICK_FRACTION)
+    next_output = cluster.respond(squeue_command())[0].decode()
+    next_records = parse_squeue(next_output, SQUEUE_FETCH_COLUMNS, 'bench')
+    databases = iter(range(repeat + 1))
+
+    steps = [
+        ('squeue parse', lambda _: parse_squeue(squeue_output, SQUEUE_FETCH_COLUMNS, 'bench'), None),
+        ('job store build', lambda _: JobStore().update(records, 'bench'), None),
+        ('job store diff', lambda store: store.update(next_records, 'bench'), filled_store),
+        ('sinfo parse', lambda _: parse_sinfo(outputs['sinfo'], cluster='bench'), None),
+        ('nodes parse', lambda _: NodeStore().update(parse_nodes(outputs['nodes'], 'bench'), 'bench'),
+         None),
+        ('sacct parse', lambda _: parse_sacct(outputs['sacct']), None),
+        ('sacct store', lambda db: store_history(db, {'bench': outputs['sacct']}),
+         lambda: HistoryDB(Path(scratch) / f"parse-{scale}-{next(databases)}.sqlite")),
+        ('sample parse', lambda _: parse_sample(outputs['sample']), None),
+        ('job detail parse', lambda _: parse_job_detail(outputs['detail'], '', '1', 'bench'), None),
+        ('priority join', lambda _: parse_priority(outputs['priority'], 'bench'), None),
+        ('snapshot save', lambda stores: encode_data(*stores), lambda: (filled_store(), filled_nodes())),
+        ('snapshot load', lambda block: decode_data(block),
+         lambda: encode_data(filled_store(), filled_nodes())),
+    ]
+    results = []
+    for step, function, setup in steps:
+        times, peak = measure(function, repeat, setup)
+        results.append(Result('parse', scale, step, times, peak))
+    return results
+
+
+def bench_core(cluster, server, repeat, scratch):
+    """SlurmClient calls over SSH, fetch and parse together"""
+    scale = len(cluster.jobs)
+    instrument = Instrument()
+    connection = SSHConnection(server.host, server.port, cluster.username, 'bench')
+    connection.connect()
+    client = SlurmClient({'bench': connection}, instrument)
+    job_id = cluster.jobs[0]['job_id']
+    databases = iter(range(repeat + 1))
+
+    steps = [
+        ('squeue', 'squeue', lambda _: client.squeue(), None),
+        ('squeue --mine', 'squeue', lambda _: client.squeue(mine=True), None),
+        ('sinfo', 'sinfo', lambda _: client.sinfo(), None),
+        ('nodes', 'scontrol', lambda _: client.fetch_nodes(), None),
+        ('sdiag', 'sdiag', lambda _: client.sdiag(), None),
+        ('sample', 'sinfo', lambda _: client.sample(), None),
+        ('history sync', 'date', lambda db: client.sync_history(db),
+         lambda: HistoryDB(Path(scratch) / f"core-{scale}-{next(databases)}.sqlite")),
+        ('job detail', 'info=$(scontrol', lambda _: client.job_detail(job_id), None),
+        ('priority', 'sprio', lambda _: client.priority(), None),
+    ]
+    results = []
+    try:
+        for step, operation, function, setup in steps:
+            instrument.reset()
+            times, peak = measure(function, repeat, setup)
+            results.append(Result('core', scale, step, times, peak,
+                                  instrument_medians(instrument, operation)))
+    finally:
+        client.close()
+    return results
+
+
+def bench_gui(cluster, server, repeat):
+    """MainWindow views over SSH: fetch, parse, model update and paint"""
+    from PyQt5.QtWidgets import QApplication
+    import app
+
+    qt_app = QApplication.instance() or QApplication([])
+    scale = len(cluster.jobs)
+    window = app.MainWindow()
+    # Keep the user's session snapshot out of it
+    window.session_path = None
+    window.resize(1400, 900)
+    window.show()
+    connection = SSHConnection(server.host, server.port, cluster.username, 'bench')
+    connection.connect()
+    window.runner.add_connection('bench', connection)
+    window.update_connected_state()
+    instrument = window.instrument
+
+    def wait():
+        deadline = time.monotonic() + GUI_TIMEOUT
+        qt_app.processEvents()
+        while window.runner.inflight():
+            if time.monotonic() > deadline:
+                raise TimeoutError("GUI operation did not finish")
+            qt_app.processEvents()
+            time.sleep(0.001)
+        qt_app.processEvents()
+
+    def run(trigger):
+        def function(_):
+            window.runner.invalidate()
+            trigger()
+            wait()
+        return function
+
+    def paint(_):
+        window.table_view.viewport().repaint()
+
+    def sort(_):
+        window.proxy_model.sort(0)
+        window.table_view.viewport().repaint()
+
+    def refresh(_):
+        cluster.tick(TICK_FRACTION)
+        run(window.refresh_monitor)(None)
+
+    def filter_rows(_):
+        window.filter_edit.setText('train_42')
+        qt_app.processEvents()
+        window.filter_edit.setText('')
+        qt_app.processEvents()
+
+    steps = [
+        ('squeue view', 'squeue', run(window.squeue)),
+        ('paint', None, paint),
+        ('sort', None, sort),
+        ('filter', None, filter_rows),
+        ('monitor refresh', 'squeue', refresh),
+        ('sinfo view', 'sinfo', run(window.sinfo)),
+        ('nodes view', 'scontrol', run(window.fetch_nodes)),
+        ('priority view', 'sprio', run(window.priority)),
+    ]
+    results = []
+    try:
+        for step, operation, function in steps:
+            instrument.reset()
+            if step == 'sort':
+                run(window.squeue)(None)
+            times, peak = measure(function, repeat)
+            extra = {}
+            if operation is not None:
+                extra = instrument_medians(instrument, operation)
+                extra.update({stat.metric: stat.p50 for stat in instrument.stats()
+                              if stat.operation == operation and stat.metric in ('parse', 'render')})
+            results.append(Result('gui', scale, step, times, peak, extra))
+    finally:
+        window.runner.cancel()
+        connection.close()
+        window.close()
+        window.deleteLater()
+        qt_app.processEvents()
+    return results
+
+
+def format_value(metric, value):
+    if value is None:
+        return ''
+    if metric == 'bytes':
+        return f"{value / 1024:.0f}K"
+    return f"{value * 1000:.1f}"
+
+
+def print_results(results):
+    """Print the results as an aligned table; times in ms, memory in MB"""
+    metrics = ('queue', 'rtt', 'remote', 'bytes', 'parse', 'render')
+    rows = [['SUITE', 'SCALE', 'STEP', 'BEST_MS', 'MEDIAN_MS', 'PEAK_MB']
+            + [m.upper() for m in metrics]]
+    for r in results:
+        rows.append([r.suite, str(r.scale), r.step, f"{r.best * 1000:.1f}",
+                     f"{r.median * 1000:.1f}", '' if r.peak is None else f"{r.peak / 2**20:.1f}"]
+                    + [format_value(m, r.extra.get(m)) for m in metrics])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks', description="Benchmark slurmLab on a synthetic cluster")
+    parser.add_argument('--scales', default=','.join(map(str, SCALES)),
+                        help="comma separated job counts (default: %(default)s)")
+    parser.add_argument('--suites', default=','.join(SUITES),
+                        help="comma separated suites among %(default)s")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds each remote command waits before answering")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per step")
+    parser.add_argument('--json', metavar='FILE', help="also write the results to FILE")
+    args = parser.parse_args(argv)
+    try:
+        args.scales = [int(scale) for scale in args.scales.split(',')]
+    except ValueError:
+        parser.error("--scales takes integers")
+    args.suites = [suite.strip() for suite in args.suites.split(',')]
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Offscreen unless a platform was chosen, so the GUI suite runs headless
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='slurmlab-bench-') as scratch:
+        for scale in args.scales:
+            print(f"Benchmarking {scale} jobs...", file=sys.stderr)
+            if 'parse' in args.suites:
+                results.extend(bench_parse(FakeCluster(scale), args.repeat, scratch))
+            if 'core' in args.suites or 'gui' in args.suites:
+                cluster = FakeCluster(scale)
+                server = FakeSSHServer(cluster, args.latency).start()
+                try:
+                    if 'core' in args.suites:
+                        results.extend(bench_core(cluster, server, args.repeat, scratch))
+                    if 'gui' in args.suites:
+                        results.extend(bench_gui(cluster, server, args.repeat))
+                finally:
+                    server.close()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump({'latency': args.latency, 'repeat': args.repeat,
+                       'results': [r.as_dict() for r in results]}, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import shlex
+import time
+from collections import OrderedDict
+
+# Seconds a read-only command output stays fresh, by program
+DEFAULT_TTLS = {
+    'squeue': 5,
+    'sinfo': 30,
+    'sdiag': 30,
+    # Only read-only subcommands (show) are cached
+    'scontrol': 10,
+}
+
+# Programs that change the cluster state and make cached outputs stale
+MUTATING_PROGRAMS = ('scancel', 'sbatch', 'srun', 'salloc', 'sacctmgr')
+
+# Read-only scontrol subcommands; any other scontrol call is a mutation
+SCONTROL_READ_ONLY = ('show', 'ping', 'listpids', 'version')
+
+# scontrol options taking the next word as their value, as in -M cluster
+SCONTROL_VALUE_OPTIONS = ('-M', '--clusters', '-u', '--uid')
+
+
+def command_key(command):
+    """Normalize a command so equivalent spellings share a cache entry"""
+    try:
+        return ' '.join(shlex.split(command))
+    except ValueError:
+        return command.strip()
+
+
+def command_program(command):
+    """Return the program name of a command, or '' if there is none"""
+    return command_key(command).split(' ', 1)[0]
+
+
+def is_mutating(command):
+    """Return True if command may change jobs or nodes"""
+    parts = command_key(command).split(' ')
+    program = parts[0]
+    if program == 'scontrol':
+        return _scontrol_subcommand(parts[1:]) not in SCONTROL_READ_ONLY + ('',)
+    return program in MUTATING_PROGRAMS
+
+
+def _scontrol_subcommand(arguments):
+    """Return the subcommand of scontrol arguments, skipping the options before it"""
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument in SCONTROL_VALUE_OPTIONS:
+            next(arguments, None)
+        elif not argument.startswith('-'):
+            return argument
+    return ''
+
+
+class CommandCache:
+    """Cache of (stdout, stderr) outputs keyed by cluster and normalized command.
+
+    Entries expire after the TTL of their program. invalidate() bumps a
+    generation counter so results of requests started before a mutation are
+    never stored.
+    """
+
+    def __init__(self, ttls=None, clock=time.monotonic):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.clock = clock
+        self.generation = 0
+        self._entries = {}
+
+    def ttl(self, command):
+        """Return the TTL of command in seconds, 0 if it is not cacheable"""
+        if is_mutating(command):
+            return 0
+        return self.ttls.get(command_program(command), 0)
+
+    def get(self, command, cluster=''):
+        """Return the cached (stdout, stderr) of command on cluster, or None"""
+        key = (cluster, command_key(command))
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if self.clock() >= expires:
+            del self._entries[key]
+            return None
+        return result
+
+    def put(self, command, result, generation=None, cluster=''):
+        """Store result unless the cache was invalidated since generation"""
+        ttl = self.ttl(command)
+        if ttl <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        now = self.clock()
+        # Filtered queries give every filter its own key: drop expired
+        # entries here, or those never read again would pile up
+        for key in [key for key, (expires, _) in self._entries.items() if now >= expires]:
+            del self._entries[key]
+        self._entries[(cluster, command_key(command))] = (now + ttl, result)
+
+    def invalidate(self):
+        """Drop every entry"""
+        self.generation += 1
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DetailCache:
+    """Parsed details by key, kept for a TTL and at most capacity entries.
+
+    The least recently used entry is dropped first, so browsing a long
+    queue does not keep every job ever opened.
+    """
+
+    def __init__(self, ttl=30, capacity=200, clock=time.monotonic):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.clock = clock
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the fresh value of key, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if self.clock() >= expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, ttl=None):
+        self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self._entries.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""Command line interface of slurmLab, usable without a display.
+
+Examples:
+    python cli.py squeue --json
+    python cli.py --cluster hpc1 --cluster hpc2 squeue --mine
+    python cli.py squeue -t PD -p gpu --columns Scheduling
+    python cli.py priority --mine
+    python cli.py submit sweep.sh -p lr=0.1,0.01 -p seed=1..5
+    python cli.py tail --follow /scratch/me/slurm-1234.out
+    python cli.py watch 1234 1235 && notify-send "jobs done"
+    python cli.py --timings --trace trace.jsonl squeue
+    python cli.py history sync && python cli.py history report "Wait time by user"
+    */5 * * * * python cli.py sample   # feed the GUI dashboard from cron
+"""
+import argparse
+import getpass
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from core import (
+    SlurmClient, connect, job_columns, node_columns, node_group_columns, partition_columns,
+    priority_columns
+    )
+from history import REPORTS, HistoryDB
+from instrument import METRICS, Instrument
+from metrics import MetricStore, metrics_path
+from nodes import GROUP_FIELDS, hostlist_matcher
+from parsers import COLUMN_PRESETS, SQUEUE_FIELDS, SQUEUE_FILTERS
+from profiles import load_column_presets, load_env, load_profiles
+from sweeps import Sweep, parse_params
+from watcher import MAX_INTERVAL, MIN_INTERVAL, JobWatcher
+
+# Seconds between two reads of a followed file
+FOLLOW_INTERVAL = 2
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='slurmlab', description="Manage SLURM jobs over SSH")
+    parser.add_argument('-c', '--cluster', action='append', default=[],
+                        help="saved profile to use, may be repeated (default: the .env or first profile)")
+    parser.add_argument('--host', help="connect to this host instead of a profile")
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', help="user name for --host")
+    parser.add_argument('--timings', action='store_true',
+                        help="print the round trip, remote, parse and print times to stderr")
+    parser.add_argument('--trace', metavar='FILE', help="append the timings as JSON lines to FILE")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    squeue = commands.add_parser('squeue', help="list the jobs in the queue")
+    squeue.add_argument('--mine', action='store_true', help="only the jobs of the connected user")
+    for short, option, dest in (('-u', '--users', 'user'), ('-A', '--account', 'account'),
+                                ('-p', '--partition', 'partition'), ('-t', '--states', 'state'),
+                                ('-n', '--name', 'name'), ('-q', '--qos', 'qos')):
+        squeue.add_argument(short, option, dest=f'filter_{dest}', metavar='LIST',
+                            help="comma separated, filtered by squeue on the controller")
+    squeue.add_argument('--columns', default='Default',
+                        help="a column preset or a comma separated list of columns; "
+                             "only those are fetched (see --list-columns)")
+    squeue.add_argument('--list-columns', action='store_true', help="list the presets and columns")
+    squeue.add_argument('--json', action='store_true', help="print JSON instead of a table")
+
+    sinfo = commands.add_parser('sinfo', help="list the partitions")
+    sinfo.add_argument('--json', action='store_true', help="print JSON instead of a table")
+
+    job = commands.add_parser('job', help="show the details of a job")
+    job.add_argument('job_id')
+    job.add_argument('--json', action='store_true', help="print JSON instead of text")
+
+    nodes = commands.add_parser('nodes', help="list the nodes, filtered and grouped locally")
+    nodes.add_argument('--partition')
+    nodes.add_argument('--state', help="a state or flag, e.g. IDLE or DRAIN")
+    nodes.add_argument('--feature')
+    nodes.add_argument('--hostlist', help="e.g. node[001-064]")
+    nodes.add_argument('--group-by', choices=GROUP_FIELDS)
+    nodes.add_argument('--json', action='store_true', help="print JSON instead of a table")
+
+    commands.add_parser('sdiag', help="show scheduler statistics")
+
+    priority = commands.add_parser('priority', help="rank the pending jobs with their priority factors and fair share")
+    priority.add_argument('--mine', action='store_true',
+                          help="only the jobs of the connected user, still ranked against the whole queue")
+    priority.add_argument('-p', '--partition')
+    priority.add_argument('--json', action='store_true', help="print JSON instead of a table")
+    commands.add_parser('sample', help="append one utilization dashboard sample per cluster")
+
+    scancel = commands.add_parser('scancel', help="cancel jobs")
+    scancel.add_argument('job_ids', nargs='+', metavar='JOB_ID')
+
+    submit = commands.add_parser('submit', help="submit a batch script, or a template over a parameter grid")
+    submit.add_argument('template', type=argparse.FileType('r'), help="script with {{name}} placeholders")
+    submit.add_argument('-p', '--param', action='append', default=[], metavar='NAME=VALUES',
+                        help="values such as a,b,c or 1..10, may be repeated")
+    submit.add_argument('--name', help="sweep name (default: the script name)")
+    submit.add_argument('--no-array', action='store_true', help="one sbatch per job instead of a job array")
+    submit.add_argument('--max-running', type=int, default=0, help="job array task limit")
+
+    tail = commands.add_parser('tail', help="print the end of a remote file, e.g. a job's StdOut")
+    tail.add_argument('path')
+    tail.add_argument('--bytes', type=int, default=4096, help="bytes to print from the end")
+    tail.add_argument('-f', '--follow', action='store_true', help="print appended lines until interrupted")
+
+    watch = commands.add_parser('watch', help="print job state changes until the watched jobs end")
+    watch.add_argument('job_ids', nargs='*', metavar='JOB_ID')
+    watch.add_argument('--mine', action='store_true', help="watch every job of the connected user, until interrupted")
+    watch.add_argument('--min-interval', type=int, default=MIN_INTERVAL, help="seconds between polls after a change")
+    watch.add_argument('--max-interval', type=int, default=MAX_INTERVAL, help="seconds between polls when idle")
+
+    run = commands.add_parser('exec', help="run a command and stream its output")
+    run.add_argument('remote_command', nargs=argparse.REMAINDER)
+
+    history = commands.add_parser('history', help="local sacct job history")
+    history_commands = history.add_subparsers(dest='history_command', required=True)
+    history_commands.add_parser('sync', help="fetch the jobs that ended since the last sync")
+    report = history_commands.add_parser('report', help="run a report over the local history")
+    report.add_argument('name', choices=list(REPORTS))
+    report.add_argument('--days', type=int, help="only jobs that ended in the last days")
+    report.add_argument('--json', action='store_true', help="print JSON instead of a table")
+
+    return parser.parse_args(argv)
+
+
+def select_profiles(args):
+    """Return the profiles to connect to"""
+    if args.host:
+        return [{
+            'name': args.host,
+            'host': args.host,
+            'port': args.port,
+            'username': args.user or getpass.getuser(),
+            'password': os.getenv('SSH_PASSWORD', ''),
+        }]
+    profiles = load_profiles()
+    if not profiles:
+        raise SystemExit("slurmlab: no profile found; set SSH_HOST in .env or use --host")
+    if not args.cluster:
+        return [next(iter(profiles.values()))]
+    missing = [name for name in args.cluster if name not in profiles]
+    if missing:
+        raise SystemExit(f"slurmlab: unknown profile {', '.join(missing)}")
+    return [profiles[name] for name in args.cluster]
+
+
+def open_client(args, instrument=None):
+    """Connect to every selected cluster, asking for missing passwords"""
+    client = SlurmClient(instrument=instrument)
+    for profile in select_profiles(args):
+        if not profile['password'] and sys.stdin.isatty():
+            profile = dict(profile, password=getpass.getpass(
+                f"Password for {profile['username']}@{profile['host']}: "))
+        try:
+            client.add_connection(profile['name'], connect(profile))
+        except Exception as e:
+            client.close()
+            raise SystemExit(f"slurmlab: cannot connect to {profile['name']}: {e}")
+    return client
+
+
+def print_records(columns, records, as_json, show_cluster=False):
+    """Print records as an aligned table or as a JSON list of objects"""
+    if show_cluster:
+        columns = [('CLUSTER', 'cluster')] + list(columns)
+    if as_json:
+        json.dump([{attribute: getattr(r, attribute) for _, attribute in columns} for r in records],
+                  sys.stdout, indent=2)
+        print()
+        return
+    rows = [[header for header, _ in columns]]
+    rows += [['' if getattr(r, a) is None else str(getattr(r, a)) for _, a in columns]
+             for r in records]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def print_timings(instrument):
+    """Print the recorded timings as a table on stderr"""
+    print(f"{'OPERATION':<10} {'METRIC':<7} {'COUNT':<6} {'P50':>12}  {'P90':>12}  {'MAX':>12}", file=sys.stderr)
+    for stat in instrument.stats():
+        header, unit = METRICS.get(stat.metric, (stat.metric, 's'))
+        values = [stat.p50, stat.p90, stat.max]
+        if unit == 's':
+            text = '  '.join(f"{value * 1000:9.1f} ms" for value in values)
+        else:
+            text = '  '.join(f"{value:9.0f} B " for value in values)
+        print(f"{stat.operation:<10} {header:<7} {stat.count:<6} {text}", file=sys.stderr)
+
+
+def print_errors(errors):
+    for cluster, message in errors.items():
+        print(f"{cluster}: {message}", file=sys.stderr)
+
+
+def parse_columns(spec):
+    """Return the columns of a preset name or of a comma separated list"""
+    presets = dict(COLUMN_PRESETS, **load_column_presets())
+    if spec in presets:
+        return presets[spec]
+    columns = tuple(c.strip() for c in spec.split(',') if c.strip())
+    unknown = [c for c in columns if c not in SQUEUE_FIELDS]
+    if unknown or not columns:
+        raise SystemExit(f"slurmlab: unknown columns {', '.join(unknown) or spec}; "
+                         "see squeue --list-columns")
+    return columns
+
+
+def print_columns():
+    presets = dict(COLUMN_PRESETS, **load_column_presets())
+    for name, columns in presets.items():
+        print(f"{name}: {','.join(columns)}")
+    print(f"\nColumns: {','.join(SQUEUE_FIELDS)}")
+
+
+def stream_output(text, is_stderr):
+    stream = sys.stderr if is_stderr else sys.stdout
+    stream.write(text)
+    stream.flush()
+
+
+def tail_log(log, length, follow):
+    """Print the last whole lines of a RemoteLog, then follow it"""
+    try:
+        _start, end, text = log.read_end(length)
+        stream_output(text, False)
+        while follow:
+            time.sleep(FOLLOW_INTERVAL)
+            _start, end, text = log.read_appended(end)
+            stream_output(text, False)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log.close()
+
+
+def watch_jobs(client, watcher):
+    """Poll a JobWatcher and print its events until nothing is left to watch"""
+    show_cluster = len(client.clusters()) > 1
+    try:
+        while watcher.is_active():
+            events, errors = client.poll_watcher(watcher)
+            for event in events:
+                print(f"{time.strftime('%H:%M:%S')}  {event.title}: {event.message(show_cluster)}",
+                      flush=True)
+            print_errors(errors)
+            if watcher.is_active():
+                time.sleep(watcher.next_interval(events))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    load_env()
+    args = parse_args(argv)
+
+    # Reports only read the local database
+    if args.command == 'history' and args.history_command == 'report':
+        columns, rows = HistoryDB().report(args.name, args.days)
+        print_records([(c.upper(), c) for c in columns], rows, args.json)
+        return 0
+
+    if args.command == 'squeue':
+        if args.list_columns:
+            print_columns()
+            return 0
+        columns = parse_columns(args.columns)
+        filters = {name: getattr(args, f'filter_{name}') for name in SQUEUE_FILTERS}
+
+    instrument = None
+    if args.timings or args.trace:
+        instrument = Instrument()
+        if args.trace:
+            try:
+                instrument.start_trace(args.trace)
+            except OSError as e:
+                raise SystemExit(f"slurmlab: {args.trace}: {e.strerror or e}")
+
+    client = open_client(args, instrument)
+    show_cluster = len(client.clusters()) > 1
+    try:
+        if args.command == 'squeue':
+            jobs, errors = client.squeue(args.mine, columns, filters)
+            with client.measure('squeue', 'render'):
+                print_records(job_columns(columns), jobs, args.json, show_cluster)
+        elif args.command == 'sinfo':
+            partitions, errors = client.sinfo()
+            with client.measure('sinfo', 'render'):
+                print_records(partition_columns(), partitions, args.json, show_cluster)
+        elif args.command == 'job':
+            detail = client.job_detail(args.job_id)
+            errors = {detail.cluster: detail.error} if detail.error else {}
+            if args.json:
+                json.dump({'fields': detail.fields, 'steps': detail.steps,
+                           'stdout_tail': detail.stdout_tail, 'stderr_tail': detail.stderr_tail},
+                          sys.stdout, indent=2)
+                print()
+            elif not detail.error:
+                for name, value in detail.fields.items():
+                    print(f"{name}={value}")
+                for title, tail in (("stdout", detail.stdout_tail), ("stderr", detail.stderr_tail)):
+                    if tail.strip():
+                        print(f"\n== {title} (last lines) ==\n{tail}", end='')
+        elif args.command == 'nodes':
+            if args.hostlist:
+                try:
+                    hostlist_matcher(args.hostlist)
+                except ValueError as e:
+                    raise SystemExit(f"slurmlab: --hostlist: {e}")
+            errors = client.fetch_nodes()
+            nodes = client.nodes.select(partition=args.partition, state=args.state,
+                                        feature=args.feature, hostlist=args.hostlist)
+            if args.group_by:
+                print_records(node_group_columns(args.group_by),
+                              client.nodes.group(nodes, args.group_by), args.json, show_cluster)
+            else:
+                print_records(node_columns(), nodes, args.json, show_cluster)
+        elif args.command == 'sdiag':
+            outputs, errors = client.sdiag()
+            for cluster, output in outputs.items():
+                if show_cluster:
+                    print(f"== {cluster} ==")
+                print(output, end='')
+        elif args.command == 'priority':
+            records, errors = client.priority()
+            usernames = {name: c.username for name, c in client.connections.items()}
+            records = [r for r in records
+                       if (not args.mine or r.user == usernames[r.cluster])
+                       and (not args.partition or r.partition == args.partition)]
+            with client.measure('sprio', 'render'):
+                print_records(priority_columns(), records, args.json, show_cluster)
+        elif args.command == 'sample':
+            samples, errors = client.sample()
+            for cluster, metrics in samples.items():
+                store = MetricStore(path=metrics_path(cluster))
+                store.append(time.time(), metrics)
+                store.close()
+        elif args.command == 'scancel':
+            if show_cluster:
+                raise SystemExit("slurmlab: job ids are per cluster; scancel needs a single --cluster")
+            keys = [(cluster, job_id) for cluster in client.clusters() for job_id in args.job_ids]
+            errors = client.scancel(keys)
+        elif args.command == 'submit':
+            if show_cluster:
+                raise SystemExit("slurmlab: submit needs a single --cluster")
+            try:
+                sweep = Sweep(args.template.read(), parse_params('\n'.join(args.param)),
+                              args.name or Path(args.template.name).stem,
+                              not args.no_array, args.max_running)
+            except ValueError as e:
+                raise SystemExit(f"slurmlab: {e}")
+            job_ids, messages = client.submit_sweep(sweep)
+            for job_id in job_ids:
+                print(job_id)
+            errors = {client.clusters()[0]: '\n'.join(messages)} if messages else {}
+        elif args.command == 'watch':
+            if args.job_ids and show_cluster:
+                raise SystemExit("slurmlab: job ids are per cluster; watch needs a single --cluster")
+            if not args.job_ids and not args.mine:
+                raise SystemExit("slurmlab: give job ids or --mine")
+            watcher = JobWatcher(args.min_interval, args.max_interval)
+            for cluster, connection in client.connections.items():
+                if args.job_ids:
+                    watcher.watch_jobs(cluster, args.job_ids)
+                if args.mine:
+                    watcher.watch_user(cluster, connection.username)
+            watch_jobs(client, watcher)
+            errors = {}
+        elif args.command == 'tail':
+            errors = {}
+            try:
+                tail_log(client.open_log(args.path), args.bytes, args.follow)
+            except OSError as e:
+                errors = {client.clusters()[0]: f"{args.path}: {e.strerror or e}"}
+        elif args.command == 'exec':
+            _stdout, _stderr, status = client.execute(' '.join(args.remote_command),
+                                                      on_output=stream_output)
+            return status
+        else:
+            counts, errors = client.sync_history(HistoryDB())
+            for cluster, count in counts.items():
+                print(f"{cluster}: {count} jobs synced")
+    finally:
+        client.close()
+        if instrument is not None:
+            instrument.stop_trace()
+            if args.timings:
+                print_timings(instrument)
+
+    print_errors(errors)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _ssh_exception():
+    import paramiko
+    return paramiko.SSHException
+
+
+class SSHConnection:
+    """A persistent SSH connection shared by every command.
+
+    Commands run on their own channels multiplexed over one transport, at
+    most max_channels at a time, waiting at most channel_timeout seconds for
+    a free one. SFTP clients, which log viewers keep open, have a budget of
+    max_sftp channels of their own so they never hold up commands; the
+    defaults stay within the 10 sessions sshd allows per connection. The
+    transport sends keepalives, and when it drops it is reopened
+    transparently with exponential backoff the next time a channel is needed.
+    """
+
+    def __init__(self, host, port, username, password, keepalive=30,
+                 max_channels=8, max_sftp=2, channel_timeout=60, retries=4, backoff=1.0,
+                 max_backoff=30.0, on_state=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.max_channels = max_channels
+        self.max_sftp = max_sftp
+        self.channel_timeout = channel_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Called with a short status message from whichever thread reconnects
+        self.on_state = on_state
+
+        self._client = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._channels = threading.BoundedSemaphore(max_channels)
+        self._sftp_channels = threading.BoundedSemaphore(max_sftp)
+
+    def connect(self):
+        """Open the connection, raising on failure"""
+        with self._lock:
+            self._closed = False
+            self._open()
+
+    def close(self):
+        """Close the connection; it is not reopened until connect is called"""
+        with self._lock:
+            self._closed = True
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def is_active(self):
+        client = self._client
+        if client is None:
+            return False
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def transport(self):
+        """Return an active transport, reconnecting if it dropped"""
+        with self._lock:
+            if self._closed:
+                raise ConnectionError("Not connected to an SSH server")
+            if not self.is_active():
+                self._reconnect()
+            return self._client.get_transport()
+
+    @contextmanager
+    def session(self):
+        """Open a channel, waiting while max_channels are already in use"""
+        with self._slot(self._channels, self.channel_timeout,
+                        f"No free channel to {self.host} after {self.channel_timeout} s"):
+            try:
+                channel = self.transport().open_session()
+            except ConnectionError:
+                raise
+            except (_ssh_exception(), OSError):
+                # The transport died between the check and the open: retry
+                # once on a fresh connection. Commands are never re-run once
+                # started, since they may not be idempotent (scancel).
+                if self.is_active():
+                    raise
+                channel = self.transport().open_session()
+            try:
+                yield channel
+            finally:
+                channel.close()
+
+    @contextmanager
+    def sftp(self, timeout=None):
+        """Open an SFTP client on the shared transport, within the max_sftp budget.
+
+        Waits at most timeout seconds, channel_timeout by default, for
+        another SFTP client to close.
+        """
+        import paramiko
+        if timeout is None:
+            timeout = self.channel_timeout
+        with self._slot(self._sftp_channels, timeout,
+                        f"Too many remote files open on {self.host}; close a log viewer first"):
+            client = paramiko.SFTPClient.from_transport(self.transport())
+            try:
+                yield client
+            finally:
+                client.close()
+
+    @staticmethod
+    @contextmanager
+    def _slot(semaphore, timeout, message):
+        """Hold one slot of semaphore, raising TimeoutError(message) if none frees up in time"""
+        if not semaphore.acquire(timeout=timeout):
+            raise TimeoutError(message)
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def _open(self):
+        import paramiko
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname=self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password
+        )
+        transport = client.get_transport()
+        transport.set_keepalive(self.keepalive)
+        transport.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Commands are short request/reply exchanges: without it, opening a
+        # channel right after closing the previous one waits for a delayed ACK
+        transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        if self._client is not None:
+            self._client.close()
+        self._client = client
+
+    def _reconnect(self):
+        delay = self.backoff
+        for attempt in range(1, self.retries + 1):
+            self._notify(f"Reconnecting to {self.host} (attempt {attempt}/{self.retries})...")
+            try:
+                self._open()
+                self._notify(f"Reconnected to {self.host}")
+                return
+            except (_ssh_exception(), OSError) as e:
+                error = e
+                if attempt == self.retries:
+                    break
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+        self._notify(f"Connection to {self.host} lost")
+        raise ConnectionError(f"Could not reconnect to {self.host}: {error}")
+
+    def _notify(self, message):
+        if self.on_state is not None:
+            self.on_state(message)
@@ -0,0 +1,428 @@
+import codecs
+import select
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from cache import command_program
+from connection import SSHConnection
+from history import sacct_command
+from metrics import parse_sample, sample_command
+from nodes import NODE_FIELDS, NODES_COMMAND, NodeStore, parse_nodes
+from parsers import (
+    SINFO_COLUMNS, SINFO_FIELDS, SQUEUE_COLUMNS, SQUEUE_FIELDS, JobDiff, JobStore, fetch_columns,
+    job_detail_command, parse_job_detail, parse_sinfo, parse_squeue, scancel_command,
+    scancel_filter_command, sinfo_command, squeue_command
+    )
+from priority import PRIORITY_HEADERS, parse_priority, priority_command
+from remote_log import RemoteLog
+
+# Size of each read from an SSH channel
+CHUNK_SIZE = 32768
+
+# Seconds to wait for channel data before checking for cancellation
+POLL_INTERVAL = 0.1
+
+# Minimum seconds between two batches of streamed output
+STREAM_INTERVAL = 0.05
+
+
+def _never():
+    return False
+
+
+def _channel_done(channel):
+    return channel.closed or (channel.eof_received and channel.exit_status_ready()
+                              and not channel.recv_ready() and not channel.recv_stderr_ready())
+
+
+def _drain(channel, cancelled):
+    stdout, stderr = [], []
+    while not cancelled():
+        select.select([channel], [], [], POLL_INTERVAL)
+        while channel.recv_ready():
+            stdout.append(channel.recv(CHUNK_SIZE))
+        while channel.recv_stderr_ready():
+            stderr.append(channel.recv_stderr(CHUNK_SIZE))
+        if _channel_done(channel):
+            break
+    return b''.join(stdout), b''.join(stderr)
+
+
+def read_channel(channel, cancelled=_never):
+    """Drain stdout and stderr together so neither pipe can fill up.
+
+    Returns the (stdout, stderr) text; stops early once cancelled() is true.
+    """
+    stdout, stderr = _drain(channel, cancelled)
+    return stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+
+def run_command(channel, command, cancelled=_never):
+    """Start command on channel and read its whole output.
+
+    Returns (stdout, stderr, metrics): the SSH round trip to start the
+    command (rtt), the time until it finished (remote) and the bytes
+    received, as recorded by an Instrument.
+    """
+    start = time.perf_counter()
+    # exec_command waits for the server's reply: one round trip
+    channel.exec_command(command)
+    started = time.perf_counter()
+    stdout, stderr = _drain(channel, cancelled)
+    metrics = {'rtt': started - start, 'remote': time.perf_counter() - started,
+               'bytes': len(stdout) + len(stderr)}
+    return stdout.decode(errors='replace'), stderr.decode(errors='replace'), metrics
+
+
+def stream_channel(channel, on_output, cancelled=_never):
+    """Pass stdout and stderr text to on_output(text, is_stderr) in batches as it arrives"""
+    # Incremental decoders keep multibyte characters split across reads
+    decoders = {
+        False: codecs.getincrementaldecoder('utf-8')(errors='replace'),
+        True: codecs.getincrementaldecoder('utf-8')(errors='replace'),
+    }
+    pending = {False: [], True: []}
+    last_output = 0.0
+    done = False
+    while not cancelled() and not done:
+        select.select([channel], [], [], POLL_INTERVAL)
+        while channel.recv_ready():
+            pending[False].append(decoders[False].decode(channel.recv(CHUNK_SIZE)))
+        while channel.recv_stderr_ready():
+            pending[True].append(decoders[True].decode(channel.recv_stderr(CHUNK_SIZE)))
+        done = _channel_done(channel)
+
+        now = time.monotonic()
+        if done or now - last_output >= STREAM_INTERVAL:
+            last_output = now
+            for is_stderr, parts in pending.items():
+                if done:
+                    parts.append(decoders[is_stderr].decode(b'', final=True))
+                text = ''.join(parts)
+                parts.clear()
+                if text and not cancelled():
+                    on_output(text, is_stderr)
+
+
+def connect(profile, **options):
+    """Open an SSHConnection for a profile dict (host, port, username, password)"""
+    connection = SSHConnection(
+        host=profile['host'],
+        port=int(profile['port']),
+        username=profile['username'],
+        password=profile.get('password', ''),
+        **options
+    )
+    connection.connect()
+    return connection
+
+
+def split_outputs(results, errors):
+    """Return the stdout of each cluster that answered.
+
+    A cluster that wrote only to stderr is moved to errors.
+    """
+    outputs = {}
+    for cluster, (output, error) in results.items():
+        if error and not output:
+            errors[cluster] = error
+        else:
+            outputs[cluster] = output
+    return outputs
+
+
+def squeue_commands(connections, mine=False, columns=SQUEUE_COLUMNS, filters=None):
+    """Return the squeue command of every cluster, optionally for its user only.
+
+    Only the columns to show (and the required ones) are fetched, and
+    filters are applied by squeue itself.
+    """
+    return {name: squeue_command(fetch_columns(columns), connection.username if mine else None,
+                                 filters)
+            for name, connection in connections.items()}
+
+
+def store_jobs(store, outputs, connections, mine=False, columns=SQUEUE_COLUMNS):
+    """Parse squeue outputs into a JobStore and return the combined JobDiff"""
+    diff = JobDiff()
+    for cluster, output in outputs.items():
+        user = connections[cluster].username if mine else None
+        records = parse_squeue(output, fetch_columns(columns), cluster)
+        diff.extend(store.update(records, cluster, user))
+    return diff
+
+
+def parse_partitions(outputs):
+    """Parse the sinfo outputs of every cluster into one list"""
+    records = []
+    for cluster, output in outputs.items():
+        records.extend(parse_sinfo(output, cluster=cluster))
+    return records
+
+
+def parse_priorities(results, errors):
+    """Parse the priority_command results of every cluster into one list.
+
+    A cluster with no pending job and an error, such as sprio without a
+    multifactor priority plugin, is moved to errors.
+    """
+    records = []
+    for cluster, (output, error) in results.items():
+        parsed = parse_priority(output, cluster)
+        if not parsed and error.strip():
+            errors[cluster] = error.strip()
+        records.extend(parsed)
+    return records
+
+
+def scancel_commands(keys, usernames, filters=None):
+    """Return the scancel command of every cluster for (cluster, job id) keys.
+
+    With filters (state, name, partition) each cluster cancels the user
+    jobs matching them on the server instead of listing the ids.
+    """
+    job_ids = {}
+    for cluster, job_id in keys:
+        job_ids.setdefault(cluster, []).append(job_id)
+    if filters is not None:
+        return {cluster: scancel_filter_command(usernames[cluster], **filters)
+                for cluster in job_ids}
+    return {cluster: scancel_command(ids) for cluster, ids in job_ids.items()}
+
+
+def history_commands(db, clusters):
+    """Return the sacct command fetching what ended since each cluster's last sync"""
+    return {name: sacct_command(db.watermark(name)) for name in clusters}
+
+
+def store_history(db, outputs):
+    """Store sacct outputs in a HistoryDB and return the job count of each cluster"""
+    return {cluster: db.store(cluster, output) for cluster, output in outputs.items()}
+
+
+def submit_sweep(connection, sweep):
+    """Upload the scripts of a Sweep over SFTP and submit them from one remote shell.
+
+    Returns the job ids and the error messages.
+    """
+    with connection.sftp() as sftp:
+        with sftp.open(sweep.archive_path(), 'wb') as remote:
+            remote.set_pipelined(True)
+            remote.write(sweep.archive())
+
+    with connection.session() as channel:
+        channel.exec_command('bash -s')
+        channel.sendall(sweep.script().encode())
+        channel.shutdown_write()
+        output, error = read_channel(channel)
+        status = channel.recv_exit_status()
+
+    job_ids, errors = sweep.parse_output(output)
+    if status != 0 and not job_ids:
+        errors.append(error.strip() or f"Submission failed with exit status {status}")
+    return job_ids, errors
+
+
+def job_columns(columns=SQUEUE_COLUMNS):
+    """Return the (header, attribute) display columns of squeue"""
+    return [(SQUEUE_FIELDS[c][0], c) for c in columns]
+
+
+def node_columns():
+    """Return the (header, attribute) display columns of nodes"""
+    return [(header, attribute) for attribute, header in NODE_FIELDS.values()]
+
+
+def node_group_columns(group_by):
+    """Return the (header, attribute) display columns of NodeGroups"""
+    return [(group_by.upper(), 'value'), ('NODES', 'count'), ('STATES', 'states'),
+            ('CPU_ALLOC', 'cpu_alloc'), ('CPU_TOT', 'cpu_total'), ('HOSTLIST', 'hostlist')]
+
+
+def priority_columns():
+    """Return the (header, attribute) display columns of the priority view"""
+    return [(header, attribute) for attribute, header in PRIORITY_HEADERS.items()]
+
+
+def partition_columns():
+    """Return the (header, attribute) display columns of sinfo"""
+    return [(SINFO_FIELDS[c][0], c) for c in SINFO_COLUMNS]
+
+
+class SlurmClient:
+    """Blocking SLURM operations over one or several clusters.
+
+    This is the scriptable counterpart of the GUI's CommandRunner: every
+    call waits for its result, and per cluster calls run in parallel on a
+    thread pool. Nothing here imports Qt.
+    """
+
+    def __init__(self, connections=None, instrument=None):
+        # Cluster name -> SSHConnection
+        self.connections = dict(connections or {})
+        self.jobs = JobStore()
+        self.nodes = NodeStore()
+        # Optional Instrument recording the timings of every command
+        self.instrument = instrument
+
+    def add_connection(self, name, connection):
+        self.connections[name] = connection
+
+    def clusters(self):
+        return list(self.connections)
+
+    def close(self):
+        for connection in self.connections.values():
+            connection.close()
+        self.connections.clear()
+
+    def execute(self, command, cluster=None, on_output=None):
+        """Run command on cluster, by default the first one.
+
+        Returns (stdout, stderr, exit status). With on_output the output is
+        streamed to on_output(text, is_stderr) and stdout and stderr are
+        returned empty.
+        """
+        connection = self._connection(cluster)
+        with connection.session() as channel:
+            if on_output is not None:
+                channel.exec_command(command)
+                stream_channel(channel, on_output)
+                return '', '', channel.recv_exit_status()
+            stdout, stderr, metrics = run_command(channel, command)
+            if self.instrument is not None:
+                name = cluster if cluster is not None else next(iter(self.connections))
+                self.instrument.record(command_program(command), name, **metrics)
+            return stdout, stderr, channel.recv_exit_status()
+
+    def measure(self, operation, metric):
+        """Time a block into the instrument, if any"""
+        if self.instrument is None:
+            return nullcontext()
+        return self.instrument.measure(operation, metric)
+
+    def run_each(self, commands):
+        """Run one command per cluster in parallel.
+
+        Returns results mapping clusters to (stdout, stderr) and errors
+        mapping clusters to messages.
+        """
+        results, errors = {}, {}
+        if not commands:
+            return results, errors
+        with ThreadPoolExecutor(max_workers=len(commands)) as pool:
+            futures = {cluster: pool.submit(self.execute, command, cluster)
+                       for cluster, command in commands.items()}
+            for cluster, future in futures.items():
+                try:
+                    stdout, stderr, _status = future.result()
+                    results[cluster] = (stdout, stderr)
+                except Exception as e:
+                    errors[cluster] = str(e)
+        return results, errors
+
+    def squeue(self, mine=False, columns=SQUEUE_COLUMNS, filters=None):
+        """Fetch the jobs of every cluster, or only the connected users' ones.
+
+        filters are applied on the controllers, and only columns are
+        fetched. Returns the jobs and the errors by cluster.
+        """
+        results, errors = self.run_each(squeue_commands(self.connections, mine, columns, filters))
+        with self.measure('squeue', 'parse'):
+            store_jobs(self.jobs, split_outputs(results, errors), self.connections, mine, columns)
+        if mine:
+            jobs = [job for name, connection in self.connections.items()
+                    for job in self.jobs.select(user=connection.username, cluster=name)]
+        else:
+            jobs = self.jobs.select()
+        return jobs, errors
+
+    def sinfo(self):
+        """Return the partitions of every cluster and the errors by cluster"""
+        results, errors = self.run_each({name: sinfo_command() for name in self.connections})
+        with self.measure('sinfo', 'parse'):
+            partitions = parse_partitions(split_outputs(results, errors))
+        return partitions, errors
+
+    def job_detail(self, job_id, cluster=None):
+        """Return the JobDetail of a job: scontrol show job, sstat and output tails"""
+        cluster = cluster or next(iter(self.connections), None)
+        stdout, stderr, _status = self.execute(job_detail_command(job_id), cluster)
+        with self.measure('scontrol', 'parse'):
+            return parse_job_detail(stdout, stderr, job_id, cluster)
+
+    def open_log(self, path, cluster=None):
+        """Open a remote file for ranged reads over SFTP; close it when done"""
+        log = RemoteLog(self._connection(cluster), path)
+        log.open()
+        return log
+
+    def submit_sweep(self, sweep, cluster=None):
+        """Submit a Sweep on cluster; returns the job ids and the error messages"""
+        return submit_sweep(self._connection(cluster), sweep)
+
+    def fetch_nodes(self):
+        """Fetch every node of every cluster into self.nodes; returns the errors by cluster"""
+        results, errors = self.run_each({name: NODES_COMMAND for name in self.connections})
+        with self.measure('scontrol', 'parse'):
+            for cluster, output in split_outputs(results, errors).items():
+                self.nodes.update(parse_nodes(output, cluster), cluster)
+        return errors
+
+    def sdiag(self):
+        """Return the sdiag output of every cluster and the errors by cluster"""
+        results, errors = self.run_each({name: 'sdiag' for name in self.connections})
+        return {cluster: output + error for cluster, (output, error) in results.items()}, errors
+
+    def priority(self):
+        """Return the ranked PriorityRecords of the pending jobs of every cluster and the errors"""
+        results, errors = self.run_each({name: priority_command() for name in self.connections})
+        with self.measure('sprio', 'parse'):
+            records = parse_priorities(results, errors)
+        return records, errors
+
+    def sample(self):
+        """Return the dashboard metrics of every cluster and the errors by cluster"""
+        results, errors = self.run_each({name: sample_command() for name in self.connections})
+        return {cluster: parse_sample(output)
+                for cluster, output in split_outputs(results, errors).items()}, errors
+
+    def scancel(self, keys, filters=None):
+        """Cancel (cluster, job id) keys; returns the errors by cluster"""
+        usernames = {name: c.username for name, c in self.connections.items()}
+        results, errors = self.run_each(scancel_commands(keys, usernames, filters))
+        for cluster, (_output, error) in results.items():
+            if error.strip():
+                errors[cluster] = error.strip()
+        return errors
+
+    def sync_history(self, db):
+        """Sync the finished jobs of every cluster into a HistoryDB.
+
+        Returns the number of jobs fetched by cluster and the errors.
+        """
+        results, errors = self.run_each(history_commands(db, self.connections))
+        return store_history(db, split_outputs(results, errors)), errors
+
+    def poll_watcher(self, watcher):
+        """Run one poll of a JobWatcher: squeue, then sacct for the jobs that left the queue.
+
+        Returns the JobEvents and the errors by cluster.
+        """
+        results, errors = self.run_each(watcher.commands())
+        events = watcher.update(results)
+        if watcher.vanished:
+            results, sacct_errors = self.run_each(watcher.sacct_commands())
+            events += watcher.resolve(results)
+            errors.update(sacct_errors)
+        return events, errors
+
+    def _connection(self, cluster):
+        if not self.connections:
+            raise ConnectionError("Not connected to an SSH server")
+        if cluster is None:
+            cluster = next(iter(self.connections))
+        connection = self.connections.get(cluster)
+        if connection is None:
+            raise ConnectionError(f"Not connected to {cluster}")
+        return connection
@@ -0,0 +1,242 @@
+import math
+import time
+from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QColor, QPainter, QPainterPath, QPen
+from PyQt5.QtWidgets import QComboBox, QGridLayout, QHBoxLayout, QLabel, QVBoxLayout, QWidget
+from metrics import combine, rate
+
+# Line colors, in the order of a chart's series
+COLORS = ['#66FF66', '#008BFC', '#FF7700', '#FF5555', '#CCCCCC']
+
+# Node states charted for each partition
+STATES = ('alloc', 'mix', 'idle', 'down')
+
+# Time windows: label -> seconds, None for everything kept
+WINDOWS = {
+    "Last hour": 3600,
+    "Last 6 hours": 6 * 3600,
+    "Last 24 hours": 24 * 3600,
+    "All samples": None,
+}
+
+# Charts below the node states: title, [(label, metric)], whether the metrics are counters
+CHARTS = [
+    ("Scheduler cycle (µs)",
+     [("main last", 'main.last_cycle'), ("main mean", 'main.mean_cycle'),
+      ("backfill last", 'backfill.last_cycle')], False),
+    ("Backfill depth and queue length",
+     [("backfill depth", 'backfill.last_depth'), ("depth mean", 'backfill.depth_mean'),
+      ("queue length", 'main.queue_length')], False),
+    ("RPC rate (/s)", [("RPCs", 'rpc_count')], True),
+    ("Agent queue and threads",
+     [("agent queue", 'agent_queue'), ("server threads", 'server_threads')], False),
+]
+
+
+class ChartWidget(QWidget):
+    """Line chart of time series, drawn with QPainter"""
+
+    BACKGROUND = QColor('#2E2E2E')
+    GRID = QColor('#555555')
+    TEXT = QColor('white')
+
+    def __init__(self, title, parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.start = 0.0
+        self.end = 0.0
+        # [(label, times, values)]
+        self.lines = []
+        self.setMinimumSize(300, 160)
+
+    def set_lines(self, lines, start, end):
+        self.lines = lines
+        self.start = start
+        self.end = end
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), self.BACKGROUND)
+        metrics = painter.fontMetrics()
+        line_height = metrics.height()
+
+        painter.setPen(QColor('#66FF66'))
+        painter.drawText(6, line_height, self.title)
+
+        values = [v for _, ts, vs in self.lines for t, v in zip(ts, vs)
+                  if t >= self.start and not math.isnan(v)]
+        top = max(values) if values else 0.0
+        top = top * 1.1 if top > 0 else 1.0
+        plot = QRectF(metrics.horizontalAdvance(f"{top:.4g}") + 12, line_height * 2,
+                      0, 0)
+        plot.setRight(self.width() - 8)
+        plot.setBottom(self.height() - line_height - 6)
+        if plot.width() <= 0 or plot.height() <= 0:
+            return
+
+        # Axes and labels
+        painter.setPen(self.GRID)
+        painter.drawRect(plot)
+        painter.drawLine(QPointF(plot.left(), plot.center().y()), QPointF(plot.right(), plot.center().y()))
+        painter.setPen(self.TEXT)
+        painter.drawText(QRectF(0, plot.top() - line_height / 2, plot.left() - 4, line_height),
+                         Qt.AlignRight, f"{top:.4g}")
+        painter.drawText(QRectF(0, plot.bottom() - line_height / 2, plot.left() - 4, line_height),
+                         Qt.AlignRight, "0")
+        if self.end > self.start:
+            painter.drawText(QRectF(plot.left(), plot.bottom() + 2, 100, line_height), Qt.AlignLeft,
+                             time.strftime('%d %H:%M', time.localtime(self.start)))
+            painter.drawText(QRectF(plot.right() - 100, plot.bottom() + 2, 100, line_height),
+                             Qt.AlignRight, time.strftime('%d %H:%M', time.localtime(self.end)))
+
+        # Legend
+        x = plot.left() + metrics.horizontalAdvance(self.title)
+        for i, (label, _, _) in enumerate(self.lines):
+            color = QColor(COLORS[i % len(COLORS)])
+            painter.setPen(color)
+            x += 16
+            painter.drawText(int(x), line_height, label)
+            x += metrics.horizontalAdvance(label)
+
+        span = self.end - self.start
+        if span <= 0:
+            return
+        for i, (_, times, values) in enumerate(self.lines):
+            painter.setPen(QPen(QColor(COLORS[i % len(COLORS)]), 1.5))
+            painter.drawPath(self.path(times, values, plot, span, top))
+
+    def path(self, times, values, plot, span, top):
+        """Build the line of a series, with one point per pixel column at most.
+
+        Gaps (NaN values) break the line.
+        """
+        path = QPainterPath()
+        drawing = False
+        last_x = None
+        for t, v in zip(times, values):
+            if math.isnan(v) or t < self.start:
+                drawing = False
+                continue
+            x = plot.left() + (t - self.start) / span * plot.width()
+            if drawing and last_x is not None and x - last_x < 1:
+                continue
+            point = QPointF(x, plot.bottom() - v / top * plot.height())
+            if drawing:
+                path.lineTo(point)
+            else:
+                path.moveTo(point)
+                drawing = True
+            last_x = x
+        return path
+
+
+class DashboardWidget(QWidget):
+    """Charts of the node states and scheduler metrics sampled from every cluster"""
+
+    ALL = "All partitions"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Cluster name -> MetricStore
+        self.stores = {}
+
+        self.cluster_combo = QComboBox()
+        self.cluster_combo.currentIndexChanged.connect(self.update_partitions)
+        self.partition_combo = QComboBox()
+        self.partition_combo.currentIndexChanged.connect(self.refresh)
+        self.window_combo = QComboBox()
+        self.window_combo.addItems(WINDOWS)
+        self.window_combo.currentIndexChanged.connect(self.refresh)
+        self.sample_label = QLabel()
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.cluster_combo)
+        controls.addWidget(self.partition_combo)
+        controls.addWidget(self.window_combo)
+        controls.addStretch()
+        controls.addWidget(self.sample_label)
+
+        self.nodes_chart = ChartWidget("Nodes")
+        self.charts = [ChartWidget(title) for title, _, _ in CHARTS]
+        grid = QGridLayout()
+        grid.addWidget(self.nodes_chart, 0, 0, 1, 2)
+        for i, chart in enumerate(self.charts):
+            grid.addWidget(chart, 1 + i // 2, i % 2)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(controls)
+        layout.addLayout(grid, 1)
+
+    def set_stores(self, stores):
+        """Chart the given {cluster: MetricStore}"""
+        self.stores = stores
+        current = self.cluster_combo.currentText()
+        self.cluster_combo.blockSignals(True)
+        self.cluster_combo.clear()
+        self.cluster_combo.addItems(stores)
+        if current in stores:
+            self.cluster_combo.setCurrentText(current)
+        self.cluster_combo.blockSignals(False)
+        self.cluster_combo.setVisible(len(stores) > 1)
+        self.update_partitions()
+
+    def store(self):
+        return self.stores.get(self.cluster_combo.currentText())
+
+    def update_partitions(self):
+        """List the partitions seen in the samples of the current cluster"""
+        store = self.store()
+        partitions = []
+        if store is not None:
+            partitions = sorted({name[len('nodes.'):].rsplit('.', 1)[0] for name in store.names()
+                                 if name.startswith('nodes.')})
+        current = self.partition_combo.currentText()
+        self.partition_combo.blockSignals(True)
+        self.partition_combo.clear()
+        self.partition_combo.addItem(self.ALL)
+        self.partition_combo.addItems(partitions)
+        if current in partitions:
+            self.partition_combo.setCurrentText(current)
+        self.partition_combo.blockSignals(False)
+        self.refresh()
+
+    def refresh(self):
+        """Redraw every chart from the current store"""
+        store = self.store()
+        if store is None or not len(store):
+            self.sample_label.setText("No samples yet")
+            for chart in [self.nodes_chart] + self.charts:
+                chart.set_lines([], 0, 0)
+            return
+
+        times = store.series(store.names()[0])[0] if store.names() else []
+        end = times[-1] if times else 0
+        window = WINDOWS[self.window_combo.currentText()]
+        start = end - window if window is not None else (times[0] if times else 0)
+        self.sample_label.setText(
+            f"{len(store)} samples, last at {time.strftime('%H:%M:%S', time.localtime(end))}")
+
+        partition = self.partition_combo.currentText()
+        lines = []
+        for state in STATES:
+            if partition == self.ALL:
+                names = [n for n in store.names() if n.startswith('nodes.') and n.endswith('.' + state)]
+                values = combine([store.series(n)[1] for n in names])
+            else:
+                values = store.series(f"nodes.{partition}.{state}")[1]
+            if len(values):
+                lines.append((state, times, values))
+        self.nodes_chart.set_lines(lines, start, end)
+
+        for chart, (_, series, counter) in zip(self.charts, CHARTS):
+            lines = []
+            for label, name in series:
+                values = store.series(name)[1]
+                if counter:
+                    values = rate(times, values)
+                if len(values):
+                    lines.append((label, times, values))
+            chart.set_lines(lines, start, end)
@@ -0,0 +1,257 @@
+import calendar
+import re
+import sqlite3
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Local job history database
+HISTORY_PATH = Path.home() / '.local' / 'share' / 'slurmlab' / 'history.sqlite'
+
+# Days of history fetched by the first sync of a cluster
+INITIAL_DAYS = 30
+
+# Seconds the next sync window overlaps the previous one, so jobs recorded
+# by slurmdbd slightly late are not missed; duplicates are upserted
+OVERLAP = 300
+
+# Terminal states: a job is synced once, when it has ended
+FINAL_STATES = 'CA,CD,F,NF,OOM,PR,TO,DL,BF'
+
+_DURATION = re.compile(r'^(?:(\d+)-)?(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)$')
+
+
+def parse_time(value):
+    """Convert a sacct YYYY-MM-DDTHH:MM:SS timestamp to epoch seconds, None if unknown.
+
+    Timestamps are in the cluster's local time; they are only compared with
+    each other, so they are stored as if they were UTC. Slicing is several
+    times faster than strptime over a month of history.
+    """
+    if len(value) != 19 or value[10] != 'T':
+        return None
+    try:
+        return calendar.timegm((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                int(value[11:13]), int(value[14:16]), int(value[17:19])))
+    except ValueError:
+        return None
+
+
+def parse_duration(value):
+    """Convert a [DD-][HH:]MM:SS[.mmm] duration to seconds, None if invalid"""
+    match = _DURATION.match(value.strip())
+    if match is None:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return (int(days or 0) * 86400 + int(hours or 0) * 3600
+            + int(minutes) * 60 + float(seconds))
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def parse_state(value):
+    """Drop details such as "CANCELLED by 1234" -> "CANCELLED"""
+    return value.split(' ', 1)[0]
+
+
+# sacct field -> (column, converter). JobName is free text that may contain
+# the delimiter, so it comes last and keeps the rest of the line
+SACCT_FIELDS = {
+    'JobID': ('job_id', str),
+    'User': ('user', str),
+    'Account': ('account', str),
+    'Partition': ('partition', str),
+    'State': ('state', parse_state),
+    'ExitCode': ('exit_code', str),
+    'Submit': ('submit', parse_time),
+    'Start': ('start', parse_time),
+    'End': ('end', parse_time),
+    'ElapsedRaw': ('elapsed', parse_int),
+    'Timelimit': ('time_limit', str),
+    'AllocCPUS': ('alloc_cpus', parse_int),
+    'TotalCPU': ('total_cpu', parse_duration),
+    'NNodes': ('nodes', parse_int),
+    'JobName': ('name', str),
+}
+
+COLUMNS = [column for column, _ in SACCT_FIELDS.values()]
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    cluster TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    name TEXT, user TEXT, account TEXT, partition TEXT, state TEXT,
+    exit_code TEXT, submit INTEGER, start INTEGER, "end" INTEGER,
+    elapsed INTEGER, time_limit TEXT, alloc_cpus INTEGER,
+    total_cpu REAL, nodes INTEGER,
+    PRIMARY KEY (cluster, job_id)
+);
+CREATE INDEX IF NOT EXISTS jobs_end ON jobs (cluster, "end");
+CREATE INDEX IF NOT EXISTS jobs_user ON jobs (cluster, user, "end");
+CREATE INDEX IF NOT EXISTS jobs_partition ON jobs (cluster, partition, "end");
+CREATE INDEX IF NOT EXISTS jobs_account ON jobs (cluster, account, "end");
+CREATE TABLE IF NOT EXISTS sync (
+    cluster TEXT PRIMARY KEY,
+    watermark TEXT NOT NULL
+);
+'''
+
+# Only jobs that started have a wait time
+STARTED = 'start IS NOT NULL AND submit IS NOT NULL'
+
+# Local reports: name -> (group by column, select clause, condition)
+REPORTS = {
+    'Wait time by partition': ('partition', '''
+        COUNT(*) AS jobs,
+        ROUND(AVG(start - submit) / 60.0, 1) AS avg_wait_min,
+        ROUND(MAX(start - submit) / 60.0, 1) AS max_wait_min''', STARTED),
+    'Wait time by user': ('user', '''
+        COUNT(*) AS jobs,
+        ROUND(AVG(start - submit) / 60.0, 1) AS avg_wait_min,
+        ROUND(MAX(start - submit) / 60.0, 1) AS max_wait_min''', STARTED),
+    'CPU efficiency by user': ('user', '''
+        COUNT(*) AS jobs,
+        ROUND(SUM(elapsed * alloc_cpus) / 3600.0, 1) AS cpu_hours,
+        ROUND(100.0 * SUM(total_cpu) / NULLIF(SUM(elapsed * alloc_cpus), 0), 1) AS cpu_efficiency_pct''', None),
+    'Usage by account': ('account', '''
+        COUNT(*) AS jobs,
+        ROUND(SUM(elapsed * alloc_cpus) / 3600.0, 1) AS cpu_hours,
+        SUM(state = 'FAILED') AS failed,
+        SUM(state = 'TIMEOUT') AS timeout''', None),
+    'Usage by partition': ('partition', '''
+        COUNT(*) AS jobs,
+        ROUND(SUM(elapsed * alloc_cpus) / 3600.0, 1) AS cpu_hours,
+        ROUND(AVG(elapsed) / 60.0, 1) AS avg_runtime_min''', None),
+    'States by user': ('user', '''
+        COUNT(*) AS jobs,
+        SUM(state = 'COMPLETED') AS completed,
+        SUM(state = 'FAILED') AS failed,
+        SUM(state = 'CANCELLED') AS cancelled,
+        SUM(state = 'TIMEOUT') AS timeout,
+        SUM(state = 'OUT_OF_MEMORY') AS out_of_memory''', None),
+}
+
+
+def sacct_command(watermark=None, all_users=True, days=INITIAL_DAYS):
+    """Build the command fetching jobs that ended since watermark.
+
+    The server time is read before sacct runs and printed last, only if
+    sacct succeeded; it becomes the next watermark. A failed sacct prints
+    no watermark, so the next sync fetches the same window again.
+    """
+    if watermark is None:
+        start = f"now-{days}days"
+    else:
+        since = datetime.strptime(watermark, '%Y-%m-%dT%H:%M:%S') - timedelta(seconds=OVERLAP)
+        start = since.strftime('%Y-%m-%dT%H:%M:%S')
+    command = (f"now=$(date +%Y-%m-%dT%H:%M:%S) && sacct --parsable2 --noheader --allocations "
+               f"--state={FINAL_STATES} --starttime={start} --endtime=now "
+               f"--format={','.join(SACCT_FIELDS)}")
+    if all_users:
+        command += " --allusers"
+    return command + ' && echo "$now"'
+
+
+def parse_sacct(output):
+    """Return the new watermark and the job rows of a sacct_command output.
+
+    Without a watermark on the last line sacct failed, possibly midway:
+    (None, []) is returned and nothing is stored.
+    """
+    lines = output.splitlines()
+    if not lines or parse_time(lines[-1].strip()) is None:
+        return None, []
+    watermark = lines[-1].strip()
+    converters = [converter for _, converter in SACCT_FIELDS.values()]
+    count = len(converters)
+    rows = []
+    for line in lines[:-1]:
+        values = line.split('|', count - 1)
+        if len(values) != count:
+            continue
+        rows.append(tuple(convert(value) for convert, value in zip(converters, values)))
+    return watermark, rows
+
+
+class HistoryDB:
+    """SQLite store of finished jobs of every cluster.
+
+    Each method opens its own connection, so a HistoryDB can be used from
+    worker threads.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def watermark(self, cluster):
+        """Return the server time of the last sync of cluster, or None"""
+        with self._connect() as db:
+            row = db.execute('SELECT watermark FROM sync WHERE cluster = ?', (cluster,)).fetchone()
+        return row[0] if row else None
+
+    def store(self, cluster, output):
+        """Upsert the jobs of a sacct_command output and move the watermark.
+
+        Returns the number of jobs stored.
+        """
+        watermark, rows = parse_sacct(output)
+        if watermark is None:
+            return 0
+        columns = ', '.join(f'"{c}"' for c in ['cluster'] + COLUMNS)
+        placeholders = ', '.join('?' * (len(COLUMNS) + 1))
+        with self._connect() as db:
+            db.executemany(f'INSERT OR REPLACE INTO jobs ({columns}) VALUES ({placeholders})',
+                           ((cluster,) + row for row in rows))
+            db.execute('INSERT OR REPLACE INTO sync (cluster, watermark) VALUES (?, ?)',
+                       (cluster, watermark))
+        return len(rows)
+
+    def report(self, name, days=None, cluster=None):
+        """Run a report over the jobs that ended in the last days.
+
+        Returns the column names and namedtuple rows.
+        """
+        group, select, condition = REPORTS[name]
+        where, params = ['1'], []
+        if condition is not None:
+            where.append(condition)
+        if cluster is not None:
+            where.append('cluster = ?')
+            params.append(cluster)
+        if days is not None:
+            # Relative to the newest job of each cluster, since times are
+            # cluster local and clusters may not share a time zone
+            where.append('"end" >= (SELECT MAX(newest."end") FROM jobs AS newest '
+                         'WHERE newest.cluster = jobs.cluster) - ?')
+            params.append(days * 86400)
+        sql = (f'SELECT cluster, {group}, {select} FROM jobs WHERE {" AND ".join(where)} '
+               f'GROUP BY cluster, {group} ORDER BY cluster, jobs DESC')
+        with self._connect() as db:
+            cursor = db.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            Row = namedtuple('Row', columns)
+            return columns, [Row(*row) for row in cursor.fetchall()]
+
+    def count(self, cluster=None):
+        with self._connect() as db:
+            if cluster is None:
+                return db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+            return db.execute('SELECT COUNT(*) FROM jobs WHERE cluster = ?', (cluster,)).fetchone()[0]
@@ -0,0 +1,132 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Recorded metrics: name -> (header, unit); times are in seconds
+METRICS = {
+    'queue': ('QUEUE', 's'),
+    'rtt': ('RTT', 's'),
+    'remote': ('REMOTE', 's'),
+    'bytes': ('BYTES', 'B'),
+    'parse': ('PARSE', 's'),
+    'render': ('RENDER', 's'),
+}
+
+# Samples kept per operation and metric for the percentiles
+CAPACITY = 1000
+
+# Percentiles shown by the stats
+PERCENTILES = (50, 90, 99)
+
+# Seconds above which a timed stage is reported as slow in debug mode
+SLOW_THRESHOLD = 1.0
+
+log = logging.getLogger('slurmlab.instrument')
+
+
+def percentile(values, q):
+    """Return the nearest-rank q-th percentile of sorted values"""
+    if not values:
+        return None
+    rank = max(1, -(-q * len(values) // 100))
+    return values[rank - 1]
+
+
+class Stat:
+    """Percentiles of one metric of one operation"""
+    __slots__ = ('operation', 'metric', 'count', 'p50', 'p90', 'p99', 'max')
+
+    def __init__(self, operation, metric, values):
+        values = sorted(values)
+        self.operation = operation
+        self.metric = metric
+        self.count = len(values)
+        self.p50, self.p90, self.p99 = (percentile(values, q) for q in PERCENTILES)
+        self.max = values[-1] if values else None
+
+
+class Instrument:
+    """Timings and sizes of every operation, by operation and metric.
+
+    An operation is usually a program such as squeue. Commands record the
+    time queued for a thread, the SSH round trip to start them (rtt), the
+    time until the remote command finished (remote) and the bytes received;
+    the GUI adds the parse and render times. Only the last CAPACITY samples
+    of each are kept. Thread safe.
+    """
+
+    def __init__(self, capacity=CAPACITY, slow_threshold=SLOW_THRESHOLD):
+        self.capacity = capacity
+        # Debug mode: report timed stages longer than slow_threshold
+        self.debug = False
+        self.slow_threshold = slow_threshold
+        # Called with (operation, metric, seconds, cluster) for slow stages,
+        # from the thread that recorded them
+        self.on_slow = None
+        self._samples = {}
+        self._trace = None
+        self._lock = threading.Lock()
+
+    def record(self, operation, cluster='', **metrics):
+        """Record the metrics of one operation, e.g. record('squeue', rtt=0.05, bytes=1200)"""
+        slow = []
+        with self._lock:
+            for metric, value in metrics.items():
+                samples = self._samples.get((operation, metric))
+                if samples is None:
+                    samples = self._samples[(operation, metric)] = deque(maxlen=self.capacity)
+                samples.append(value)
+                if self.debug and metric != 'bytes' and value >= self.slow_threshold:
+                    slow.append((metric, value))
+            if self._trace is not None:
+                event = {'ts': round(time.time(), 3), 'operation': operation, 'cluster': cluster}
+                event.update(metrics)
+                self._trace.write(json.dumps(event) + '\n')
+                self._trace.flush()
+
+        for metric, value in slow:
+            log.warning("Slow %s %s on %s: %.3f s", operation, metric, cluster or '-', value)
+            if self.on_slow is not None:
+                self.on_slow(operation, metric, value, cluster)
+
+    @contextmanager
+    def measure(self, operation, metric, cluster=''):
+        """Time the block and record it as metric of operation"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(operation, cluster, **{metric: time.perf_counter() - start})
+
+    def stats(self):
+        """Return a Stat per operation and metric, sorted by operation"""
+        with self._lock:
+            items = [(key, list(samples)) for key, samples in self._samples.items()]
+        order = list(METRICS)
+        items.sort(key=lambda item: (item[0][0], order.index(item[0][1])
+                                     if item[0][1] in order else len(order)))
+        return [Stat(operation, metric, values) for (operation, metric), values in items]
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def start_trace(self, path):
+        """Append every recorded operation to path as one JSON object per line"""
+        trace = open(path, 'a', encoding='utf-8')
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+            self._trace = trace
+
+    def stop_trace(self):
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+    def tracing(self):
+        return self._trace is not None
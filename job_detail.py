@@ -0,0 +1,102 @@
+from html import escape
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtWidgets import QDockWidget, QTextBrowser
+from parsers import SSTAT_FIELDS
+
+# scontrol show job fields shown first, in this order; the others follow
+MAIN_FIELDS = (
+    'JobId', 'JobName', 'UserId', 'Account', 'Partition', 'QOS', 'JobState', 'Reason',
+    'NodeList', 'NumNodes', 'NumCPUs', 'TRES', 'SubmitTime', 'StartTime', 'EndTime',
+    'RunTime', 'TimeLimit', 'Priority', 'WorkDir', 'Command', 'StdOut', 'StdErr',
+)
+
+# Fields holding remote file paths, linked to the log viewer
+LOG_FIELDS = ('StdOut', 'StdErr')
+
+
+def detail_html(detail):
+    """Format a JobDetail as HTML for the dark detail panel"""
+    if detail.error:
+        return (f"<h3 style='color:#66FF66'>Job {escape(detail.job_id)}</h3>"
+                f"<p style='color:#FF5555'>{escape(detail.error)}</p>")
+
+    rows = []
+    fields = detail.fields
+    names = [f for f in MAIN_FIELDS if f in fields] + [f for f in fields if f not in MAIN_FIELDS]
+    for name in names:
+        value = escape(fields[name])
+        if name in LOG_FIELDS and fields[name].startswith('/'):
+            value = f"<a href='{name}' style='color:#008BFC'>{value}</a>"
+        rows.append(f"<tr><td style='color:#AAAAAA'>{escape(name)}</td><td>{value}</td></tr>")
+    parts = [f"<h3 style='color:#66FF66'>Job {escape(detail.job_id)}</h3>",
+             f"<table cellspacing='2'>{''.join(rows)}</table>"]
+
+    if detail.steps:
+        header = ''.join(f"<th align='left' style='color:#66FF66'>{escape(f)}</th>" for f in SSTAT_FIELDS)
+        cells = ''.join("<tr>" + ''.join(f"<td>{escape(step[f])}</td>" for f in SSTAT_FIELDS) + "</tr>"
+                        for step in detail.steps)
+        parts.append(f"<h4 style='color:#66FF66'>Running steps</h4>"
+                     f"<table cellspacing='4'><tr>{header}</tr>{cells}</table>")
+
+    for title, tail, color in (("stdout", detail.stdout_tail, 'white'),
+                               ("stderr", detail.stderr_tail, '#FF5555')):
+        if tail.strip():
+            parts.append(f"<h4 style='color:#66FF66'>{title} (last lines)</h4>"
+                         f"<pre style='color:{color}'>{escape(tail)}</pre>")
+    return ''.join(parts)
+
+
+class JobDetailPanel(QDockWidget):
+    """Dock showing the details of the selected job"""
+
+    # Emitted with (cluster, path) when a StdOut or StdErr path is clicked
+    open_log = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__("Job Details", parent)
+        self.setObjectName("job_details")
+        self.setAllowedAreas(Qt.RightDockWidgetArea | Qt.BottomDockWidgetArea)
+        # Key of the job shown or being fetched
+        self.key = None
+        self.detail = None
+
+        self.text_edit = QTextBrowser()
+        self.text_edit.setOpenLinks(False)
+        self.text_edit.anchorClicked.connect(self.link_clicked)
+        self.text_edit.setMinimumWidth(350)
+        self.setWidget(self.text_edit)
+        self.set_font_size(10)
+
+    def set_font_size(self, size):
+        self.text_edit.setStyleSheet(f"""
+            QTextBrowser {{
+            background-color: #2E2E2E;
+            color: white;
+            font-family: "Monaco";
+            font-size: {size}pt;
+            }}
+        """)
+
+    def show_loading(self, key):
+        self.key = key
+        self.text_edit.setHtml(f"<p style='color:#AAAAAA'>Loading job {escape(key[1])}...</p>")
+
+    def show_detail(self, detail):
+        """Show detail if it is still the selected job"""
+        if detail.key != self.key:
+            return
+        self.detail = detail
+        scrollbar = self.text_edit.verticalScrollBar()
+        position = scrollbar.value()
+        self.text_edit.setHtml(detail_html(detail))
+        scrollbar.setValue(position)
+
+    def show_error(self, key, message):
+        if key != self.key:
+            return
+        self.text_edit.setHtml(f"<p style='color:#FF5555'>{escape(message)}</p>")
+
+    def link_clicked(self, url):
+        detail = self.detail
+        if detail is not None and detail.key == self.key:
+            self.open_log.emit(detail.cluster, detail.fields.get(url.toString(), ''))
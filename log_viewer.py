@@ -0,0 +1,180 @@
+from collections import deque
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtWidgets import (
+    QCheckBox, QDialog, QHBoxLayout, QLabel, QPlainTextEdit, QPushButton, QVBoxLayout
+    )
+from remote_log import PAGE_SIZE, RemoteLog
+
+
+class LogViewer(QDialog):
+    """Window paging through and following a remote file over SFTP.
+
+    The view holds at most VIEWPORT_BYTES of the file: pages replace it,
+    and followed lines are appended while the oldest ones are dropped.
+    Every read runs on the runner's thread pool, one at a time.
+    """
+
+    VIEWPORT_BYTES = 4 * PAGE_SIZE
+
+    # Milliseconds between two reads of a followed file
+    FOLLOW_INTERVAL = 2000
+
+    def __init__(self, runner, connection, path, font_size=10, parent=None):
+        super().__init__(parent)
+        self.runner = runner
+        self.log = RemoteLog(connection, path)
+        # Byte range [start, end) shown, and the (bytes, lines) of each
+        # piece of text appended to the view, oldest first
+        self.start = 0
+        self.end = 0
+        self.chunks = deque()
+        self.busy = False
+        self.closing = False
+
+        self.setWindowTitle(path)
+        self.resize(900, 600)
+
+        self.text_edit = QPlainTextEdit()
+        self.text_edit.setReadOnly(True)
+        self.text_edit.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.text_edit.setStyleSheet(f"""
+            QPlainTextEdit {{
+            background-color: #2E2E2E;
+            color: white;
+            font-family: "Monaco";
+            font-size: {font_size}pt;
+            }}
+        """)
+
+        self.top_button = QPushButton("Top")
+        self.top_button.clicked.connect(lambda: self.load_page(0))
+        self.up_button = QPushButton("Page Up")
+        self.up_button.clicked.connect(lambda: self.load_page(self.start - PAGE_SIZE))
+        self.down_button = QPushButton("Page Down")
+        self.down_button.clicked.connect(lambda: self.load_page(self.end))
+        self.bottom_button = QPushButton("Bottom")
+        self.bottom_button.clicked.connect(self.load_end)
+        self.follow_check = QCheckBox("Follow")
+        self.follow_check.toggled.connect(self.toggle_follow)
+        self.position_label = QLabel()
+
+        controls = QHBoxLayout()
+        for widget in (self.top_button, self.up_button, self.down_button, self.bottom_button,
+                       self.follow_check):
+            controls.addWidget(widget)
+        controls.addStretch()
+        controls.addWidget(self.position_label)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(controls)
+        layout.addWidget(self.text_edit)
+
+        self.follow_timer = QTimer(self)
+        self.follow_timer.timeout.connect(self.read_appended)
+        self.finished.connect(self.close_log)
+
+        self.follow_check.setChecked(True)
+
+    def read(self, function, on_result):
+        """Run function(log) on the thread pool, opening the file first if needed"""
+        if self.busy or self.closing:
+            return
+        self.busy = True
+        log = self.log
+
+        def task():
+            if not log.is_open():
+                log.open()
+            try:
+                return function(log)
+            except Exception:
+                # Reopened on the next read, e.g. after a reconnection
+                log.close()
+                raise
+
+        def on_done(value):
+            self.busy = False
+            if self.closing:
+                self.close_log()
+                return
+            on_result(value)
+            self.update_position()
+
+        def on_error(message):
+            self.busy = False
+            self.position_label.setText(f"Error: {message}")
+            self.follow_check.setChecked(False)
+            if self.closing:
+                self.close_log()
+
+        self.runner.submit(task, on_done, on_error, f"Reading {self.log.path}")
+
+    def load_page(self, offset):
+        """Replace the view with the page starting at offset"""
+        self.follow_check.setChecked(False)
+        self.read(lambda log: log.read_page(max(0, offset)), self.show_page)
+
+    def load_end(self):
+        self.read(lambda log: log.read_end(), self.show_page)
+
+    def show_page(self, page):
+        self.start, self.end, text = page
+        self.chunks = deque([(self.end - self.start, text.count('\n'))])
+        self.text_edit.setPlainText(text)
+        if self.follow_check.isChecked():
+            self.text_edit.moveCursor(QTextCursor.End)
+
+    def toggle_follow(self, enabled):
+        if enabled:
+            self.load_end()
+            self.follow_timer.start(self.FOLLOW_INTERVAL)
+        else:
+            self.follow_timer.stop()
+
+    def read_appended(self):
+        self.read(lambda log: log.read_appended(self.end), self.append)
+
+    def append(self, page):
+        """Append followed lines, dropping the oldest past VIEWPORT_BYTES"""
+        start, end, text = page
+        if start != self.end:
+            # Truncated, or more was appended than one read returns
+            self.show_page(page)
+            return
+        if not text:
+            return
+
+        scrollbar = self.text_edit.verticalScrollBar()
+        at_bottom = scrollbar.value() == scrollbar.maximum()
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self.end = end
+        self.chunks.append((end - start, text.count('\n')))
+
+        while len(self.chunks) > 1 and self.end - self.start > self.VIEWPORT_BYTES:
+            size, lines = self.chunks.popleft()
+            cursor.movePosition(QTextCursor.Start)
+            cursor.movePosition(QTextCursor.NextBlock, QTextCursor.KeepAnchor, lines)
+            cursor.removeSelectedText()
+            self.start += size
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def update_position(self):
+        size = self.log.file_size
+        self.position_label.setText(f"Bytes {self.start:,}-{self.end:,} of {size:,}")
+        self.up_button.setEnabled(self.start > 0)
+        self.down_button.setEnabled(self.end < size)
+
+    def close_log(self):
+        """Stop following and close the SFTP session once no read is running"""
+        self.closing = True
+        self.follow_timer.stop()
+        if self.busy:
+            return
+        self.busy = True
+        log = self.log
+        self.runner.submit(log.close, lambda _: self.deleteLater(), lambda _: self.deleteLater(),
+                           f"Closing {log.path}")
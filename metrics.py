@@ -0,0 +1,397 @@
+import math
+import os
+import re
+import struct
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no other writer is locked out
+    fcntl = None
+
+# Ring files of the dashboard samples, one per cluster
+METRICS_DIR = Path.home() / '.local' / 'share' / 'slurmlab' / 'metrics'
+
+# Samples kept per cluster: two days at the default 30 s interval
+DEFAULT_CAPACITY = 5760
+
+# Separates the sinfo and sdiag outputs of sample_command
+SAMPLE_SEPARATOR = '@@sdiag@@'
+
+# sinfo long node states -> dashboard state
+NODE_STATES = {
+    'allocated': 'alloc',
+    'completing': 'alloc',
+    'idle': 'idle',
+    'mixed': 'mix',
+    'down': 'down',
+    'drained': 'down',
+    'draining': 'down',
+    'fail': 'down',
+    'failing': 'down',
+    'not_responding': 'down',
+}
+
+# sdiag lines -> metric, by section
+SDIAG_METRICS = {
+    None: {
+        'Server thread count': 'server_threads',
+        'Agent queue size': 'agent_queue',
+        'Jobs submitted': 'jobs_submitted',
+        'Jobs started': 'jobs_started',
+        'Jobs completed': 'jobs_completed',
+        'Jobs failed': 'jobs_failed',
+    },
+    'main': {
+        'Last cycle': 'main.last_cycle',
+        'Max cycle': 'main.max_cycle',
+        'Mean cycle': 'main.mean_cycle',
+        'Last queue length': 'main.queue_length',
+    },
+    'backfill': {
+        'Last cycle': 'backfill.last_cycle',
+        'Max cycle': 'backfill.max_cycle',
+        'Mean cycle': 'backfill.mean_cycle',
+        'Last depth cycle': 'backfill.last_depth',
+        'Depth Mean': 'backfill.depth_mean',
+    },
+}
+
+# sdiag section headers
+SDIAG_SECTIONS = (
+    ('Main schedule statistics', 'main'),
+    ('Backfilling stats', 'backfill'),
+    ('Remote Procedure Call statistics by message type', 'rpc'),
+    ('Remote Procedure Call statistics by user', 'rpc_user'),
+    ('Pending RPC statistics', 'rpc_pending'),
+)
+
+_RPC_COUNT = re.compile(r'count:\s*(\d+)')
+
+_FILE_MAGIC = b'SLMT'
+_FILE_VERSION = 1
+# magic, version, capacity, samples written, length of the names block
+_FILE_HEADER = struct.Struct('<4sHIQI')
+
+
+def sample_command():
+    """Build the command fetching node states and scheduler statistics in one round trip"""
+    return f"sinfo --noheader --format='%R|%T|%D'; echo {SAMPLE_SEPARATOR}; sdiag"
+
+
+def parse_node_states(output):
+    """Return node counts by partition and state, as 'nodes.<partition>.<state>' metrics"""
+    metrics = {}
+    for line in output.splitlines():
+        parts = line.strip().split('|')
+        if len(parts) != 3:
+            continue
+        partition, state, count = parts
+        try:
+            count = int(count)
+        except ValueError:
+            continue
+        # Drop flags such as down* or idle~
+        state = NODE_STATES.get(state.rstrip('*~#!%$@^-+'), 'other')
+        name = f"nodes.{partition}.{state}"
+        metrics[name] = metrics.get(name, 0) + count
+    return metrics
+
+
+def parse_sdiag(output):
+    """Return the scheduler metrics of an sdiag output.
+
+    rpc_count is the total of the RPC counts by message type; it only
+    grows until the statistics are reset.
+    """
+    metrics = {}
+    section = None
+    rpc_count = 0
+    for line in output.splitlines():
+        stripped = line.strip()
+        for header, name in SDIAG_SECTIONS:
+            if stripped.startswith(header):
+                section = name
+                break
+        else:
+            if section == 'rpc':
+                match = _RPC_COUNT.search(stripped)
+                if match:
+                    rpc_count += int(match.group(1))
+                continue
+            label, _, value = stripped.partition(':')
+            metric = SDIAG_METRICS.get(section, {}).get(label.strip())
+            if metric is not None:
+                try:
+                    metrics[metric] = float(value.split()[0])
+                except (IndexError, ValueError):
+                    pass
+    if section is not None:
+        metrics['rpc_count'] = rpc_count
+    return metrics
+
+
+def parse_sample(output):
+    """Return the metrics of a sample_command output"""
+    sinfo_output, _, sdiag_output = output.partition(SAMPLE_SEPARATOR)
+    metrics = parse_node_states(sinfo_output)
+    metrics.update(parse_sdiag(sdiag_output))
+    return metrics
+
+
+def combine(series):
+    """Sum aligned value arrays; NaN only where every array is NaN"""
+    if not series:
+        return array('d')
+    total = array('d', series[0])
+    for values in series[1:]:
+        for i, value in enumerate(values):
+            if value == value:
+                total[i] = value if total[i] != total[i] else total[i] + value
+    return total
+
+
+def rate(times, values):
+    """Return the per second increase of a counter, NaN where it was reset"""
+    result = array('d', [math.nan]) * len(values)
+    for i in range(1, len(values)):
+        elapsed = times[i] - times[i - 1]
+        delta = values[i] - values[i - 1]
+        if elapsed > 0 and delta >= 0:
+            result[i] = delta / elapsed
+    return result
+
+
+def metrics_path(cluster):
+    """Return the ring file of cluster"""
+    safe = re.sub(r'[^\w.-]', '_', cluster) or 'default'
+    return METRICS_DIR / f"{safe}.ring"
+
+
+class RingBuffer:
+    """Fixed size buffer of floats; the oldest value is overwritten when full"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._values = array('d', [math.nan]) * capacity
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, value):
+        self._values[self._count % self.capacity] = value
+        self._count += 1
+
+    def values(self):
+        """Return the values from the oldest to the newest"""
+        if self._count <= self.capacity:
+            return self._values[:self._count]
+        start = self._count % self.capacity
+        return self._values[start:] + self._values[:start]
+
+
+class MetricStore:
+    """Time series of named metrics in ring buffers of a fixed capacity.
+
+    Every sample has a timestamp and a value per metric, NaN for the
+    metrics it lacks, so memory stays constant however long sampling runs.
+    With a path the samples are also written to a ring file of the same
+    fixed size and reloaded from it, so the charts survive a restart.
+    Several processes may write the same file, such as the GUI and the
+    sample command: writes hold a lock and first reload the samples the
+    others wrote.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, path=None):
+        self.capacity = capacity
+        self.path = Path(path) if path is not None else None
+        self._times = RingBuffer(capacity)
+        self._series = {}
+        self._file = None
+        self._lock = None
+        if self.path is not None:
+            self._open_file()
+
+    def __len__(self):
+        return len(self._times)
+
+    def names(self):
+        return list(self._series)
+
+    def append(self, timestamp, metrics):
+        """Add a sample of {metric: value} taken at timestamp (epoch seconds)"""
+        if self._file is None:
+            self._append(timestamp, metrics)
+            return
+        with self._locked():
+            self._reload_changed()
+            if self._append(timestamp, metrics):
+                self._rewrite_file()
+            else:
+                self._write_last()
+
+    def series(self, name):
+        """Return the timestamps and values of a metric, oldest first"""
+        series = self._series.get(name)
+        if series is None:
+            return array('d'), array('d')
+        return self._times.values(), series.values()
+
+    def latest(self, name):
+        """Return the last value of a metric, NaN if unknown"""
+        values = self.series(name)[1]
+        return values[-1] if values else math.nan
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def _append(self, timestamp, metrics):
+        """Add a sample in memory; return whether it added metrics"""
+        new = [name for name in metrics if name not in self._series]
+        for name in new:
+            self._add_series(name)
+
+        self._times.append(timestamp)
+        for name, series in self._series.items():
+            series.append(metrics.get(name, math.nan))
+        return bool(new)
+
+    def _add_series(self, name):
+        series = RingBuffer(self.capacity)
+        # Align the new series with the samples already taken
+        series._count = self._times._count
+        self._series[name] = series
+
+    # On-disk ring file: a header with the metric names, then capacity
+    # fixed size records of (timestamp, value per metric) doubles
+
+    def _record(self, index):
+        slot = index % self.capacity
+        values = [self._times._values[slot]]
+        values.extend(series._values[slot] for series in self._series.values())
+        return array('d', values).tobytes()
+
+    def _layout(self):
+        names = '\n'.join(self._series).encode('utf-8')
+        record_size = 8 * (1 + len(self._series))
+        return names, _FILE_HEADER.size + len(names), record_size
+
+    @contextmanager
+    def _locked(self):
+        """Hold the lock of the ring file against the other writers.
+
+        The lock is on a file of its own: the ring file is replaced when
+        metrics are added, which would drop a lock taken on it. Without
+        fcntl, on Windows, the file is written unlocked.
+        """
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+
+    def _open_file(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = open(self.path.with_suffix('.lock'), 'a')
+        with self._locked():
+            if self.path.exists():
+                self._reload()
+                if self._file is not None:
+                    return
+            self._rewrite_file()
+
+    def _reload(self):
+        """Replace the samples in memory with those of the file and reopen it.
+
+        If the file cannot be read, the samples in memory are kept and the
+        file is left closed, for _rewrite_file to write them.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        times, series = self._times, self._series
+        self._times = RingBuffer(self.capacity)
+        self._series = {}
+        try:
+            self._load_file()
+            self._file = open(self.path, 'r+b')
+        except (OSError, ValueError, struct.error):
+            # Missing, unreadable or written with another capacity
+            self._times, self._series = times, series
+
+    def _reload_changed(self):
+        """Reload the file if another process replaced it or appended to it"""
+        try:
+            replaced = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except OSError:
+            replaced = True
+        if not replaced:
+            self._file.seek(0)
+            header = self._file.read(_FILE_HEADER.size)
+            if (len(header) == _FILE_HEADER.size
+                    and _FILE_HEADER.unpack(header)[3] == self._times._count):
+                return
+        self._reload()
+        if self._file is None:
+            self._rewrite_file()
+
+    def _load_file(self):
+        with open(self.path, 'rb') as file:
+            magic, version, capacity, count, names_size = _FILE_HEADER.unpack(
+                file.read(_FILE_HEADER.size))
+            if magic != _FILE_MAGIC or version != _FILE_VERSION or capacity != self.capacity:
+                raise ValueError("Incompatible metrics file")
+            names = file.read(names_size).decode('utf-8')
+            names = names.split('\n') if names else []
+            data = array('d')
+            data.frombytes(file.read())
+        width = 1 + len(names)
+        if len(data) != width * capacity:
+            raise ValueError("Truncated metrics file")
+
+        self._times._values = data[0::width]
+        self._times._count = count
+        for i, name in enumerate(names, 1):
+            series = RingBuffer(capacity)
+            series._values = data[i::width]
+            series._count = count
+            self._series[name] = series
+
+    def _rewrite_file(self):
+        """Write the whole file; only needed when the metric names change"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        names, data_offset, _ = self._layout()
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'wb') as file:
+            file.write(_FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, self.capacity,
+                                         self._times._count, len(names)))
+            file.write(names)
+            for slot in range(self.capacity):
+                file.write(self._record(slot))
+        os.replace(tmp, self.path)
+        self._file = open(self.path, 'r+b')
+
+    def _write_last(self):
+        """Overwrite the slot of the last sample and the sample count"""
+        count = self._times._count
+        names, data_offset, record_size = self._layout()
+        self._file.seek(data_offset + ((count - 1) % self.capacity) * record_size)
+        self._file.write(self._record(count - 1))
+        self._file.seek(0)
+        self._file.write(_FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, self.capacity,
+                                           count, len(names)))
+        self._file.flush()
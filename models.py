@@ -0,0 +1,205 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt5.QtGui import QBrush, QColor, QPalette
+from PyQt5.QtWidgets import QStyledItemDelegate
+
+
+def sort_key(value):
+    """Sort numbers numerically and everything else as text"""
+    if value is None:
+        return ''
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _ranges(rows):
+    """Group descending row numbers into (first, last) contiguous ranges"""
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][0] == row + 1:
+            ranges[-1][0] = row
+        else:
+            ranges.append([row, row])
+    return ranges
+
+
+class TableModel(QAbstractTableModel):
+    """Table model over parsed squeue and sinfo records.
+
+    Only the cells of visible rows are ever requested by the view, so large
+    queues do not need to be rendered up front.
+    """
+
+    # Background of the rows whose state changed in the last update
+    TRANSITION_BRUSH = QBrush(QColor('#5C4A00'))
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._headers = []
+        self._attributes = []
+        self._rows = []
+        self._key = None
+        self._row_of = {}
+        self._transitions = {}
+
+    def set_records(self, columns, records, key=None):
+        """Show records, one column per (header, attribute) pair.
+
+        key names the attribute identifying a record; it is required to
+        apply incremental updates with apply_diff.
+        """
+        self.beginResetModel()
+        self._headers = [header for header, _ in columns]
+        self._attributes = [attribute for _, attribute in columns]
+        self._rows = list(records)
+        self._key = key
+        self._transitions = {}
+        self._reindex()
+        self.endResetModel()
+
+    def apply_diff(self, added, removed, changed):
+        """Update only the rows touched by a snapshot diff.
+
+        removed is a list of records, changed a list of (old, new) pairs.
+        Rows whose state changed are highlighted until the next update.
+        """
+        key = self._key
+
+        # Remove rows bottom up in contiguous ranges
+        rows = sorted((self._row_of[getattr(r, key)] for r in removed
+                       if getattr(r, key) in self._row_of), reverse=True)
+        for first, last in _ranges(rows):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+        if rows:
+            self._reindex()
+
+        # Replace changed rows in place and repaint them with one signal
+        previous = set(self._transitions)
+        self._transitions = {}
+        touched = [self._row_of[k] for k in previous if k in self._row_of]
+        for old, new in changed:
+            row = self._row_of.get(getattr(new, key))
+            if row is None:
+                continue
+            self._rows[row] = new
+            touched.append(row)
+            if old.state != new.state:
+                self._transitions[getattr(new, key)] = (old.state, new.state)
+        if touched and self._headers:
+            self.dataChanged.emit(self.index(min(touched), 0),
+                                  self.index(max(touched), len(self._headers) - 1))
+
+        # Append new rows at the end
+        if added:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for offset, record in enumerate(added):
+                self._rows.append(record)
+                self._row_of[getattr(record, key)] = first + offset
+            self.endInsertRows()
+
+    def transitions(self):
+        return dict(self._transitions)
+
+    def _reindex(self):
+        if self._key is None:
+            self._row_of = {}
+        else:
+            self._row_of = {getattr(r, self._key): row for row, r in enumerate(self._rows)}
+
+    def headers(self):
+        return list(self._headers)
+
+    def columns(self):
+        """Return the shown (header, attribute) pairs"""
+        return list(zip(self._headers, self._attributes))
+
+    def record(self, row):
+        return self._rows[row]
+
+    def records(self):
+        return list(self._rows)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = getattr(self._rows[index.row()], self._attributes[index.column()])
+        if role == Qt.DisplayRole:
+            return value
+        if role == Qt.UserRole:
+            return sort_key(value)
+        if role in (Qt.BackgroundRole, Qt.ToolTipRole) and self._transitions:
+            transition = self._transitions.get(getattr(self._rows[index.row()], self._key))
+            if transition is not None:
+                if role == Qt.BackgroundRole:
+                    return self.TRANSITION_BRUSH
+                return f"{transition[0]} \u2192 {transition[1]}"
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._headers[section]
+        return section + 1
+
+
+class TableFilterProxyModel(QSortFilterProxyModel):
+    """Sort and filter proxy that matches the filter text against every column"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSortRole(Qt.UserRole)
+        self.setFilterKeyColumn(-1)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+
+class HighlightDelegate(QStyledItemDelegate):
+    """Color the ST, USER and STATE columns of squeue, sinfo and nodes"""
+
+    ST_COLORS = {
+        'PD': QColor('#FF7700'),
+        'R': QColor('#66FF66'),
+    }
+    DOWN_COLOR = QColor('#FF5555')
+    DOWN_STATES = ('DOWN', 'DRAIN', 'FAIL')
+    USER_COLOR = QColor('#008BFC')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # User names of the connected clusters
+        self.usernames = set()
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        header = index.model().headerData(index.column(), Qt.Horizontal)
+        value = index.data()
+
+        color = None
+        if header == 'ST':
+            color = self.ST_COLORS.get(value)
+        elif header == 'USER':
+            if value in self.usernames:
+                color = self.USER_COLOR
+                option.font.setItalic(True)
+        elif header == 'STATE':
+            # sinfo short states, or scontrol node states such as IDLE+DRAIN
+            if value in ('down', 'down*') or any(s in str(value) for s in self.DOWN_STATES):
+                color = self.DOWN_COLOR
+
+        if color is not None:
+            option.palette.setColor(QPalette.Text, color)
+            option.palette.setColor(QPalette.HighlightedText, color)
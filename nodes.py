@@ -0,0 +1,314 @@
+import re
+from parsers import parse_key_values
+
+# Fetches every node of the cluster in one call, one line per node
+NODES_COMMAND = 'scontrol show node --oneliner'
+
+# scontrol key -> (attribute, header); numbers are converted to int or float
+NODE_FIELDS = {
+    'NodeName': ('name', 'NODE'),
+    'State': ('state', 'STATE'),
+    'Partitions': ('partitions', 'PARTITIONS'),
+    'CPUAlloc': ('cpu_alloc', 'CPU_ALLOC'),
+    'CPUTot': ('cpu_total', 'CPU_TOT'),
+    'CPULoad': ('cpu_load', 'LOAD'),
+    'RealMemory': ('memory', 'MEMORY_MB'),
+    'AllocMem': ('alloc_memory', 'ALLOC_MEM_MB'),
+    'FreeMem': ('free_memory', 'FREE_MEM_MB'),
+    'AvailableFeatures': ('features', 'FEATURES'),
+    'Gres': ('gres', 'GRES'),
+    'Reason': ('reason', 'REASON'),
+}
+
+NUMERIC_FIELDS = ('cpu_alloc', 'cpu_total', 'memory', 'alloc_memory', 'free_memory')
+
+NODE_COLUMNS = tuple(attribute for attribute, _ in NODE_FIELDS.values())
+
+# Attributes nodes can be grouped by
+GROUP_FIELDS = ('partition', 'state', 'feature')
+
+_RANGE = re.compile(r'\[([^\]]*)\]')
+_NUMBERED = re.compile(r'^(.*?)(\d+)$')
+
+
+def _split_top_level(expression):
+    """Split a hostlist on the commas outside brackets"""
+    items, depth, start = [], 0, 0
+    for i, char in enumerate(expression):
+        if char == '[':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            items.append(expression[start:i])
+            start = i + 1
+    items.append(expression[start:])
+    return [item.strip() for item in items if item.strip()]
+
+
+def hostlist_matcher(expression):
+    """Return a function telling whether a host name is in a Slurm hostlist.
+
+    Names are matched against the parsed ranges, so node[1-1000000] costs
+    no more than node[1-2]. Raises ValueError for a malformed expression,
+    such as one still being typed.
+    """
+    items = []
+    for item in _split_top_level(expression):
+        if item.count('[') != item.count(']'):
+            raise ValueError(f"Unbalanced brackets in {item!r}")
+        parts = _RANGE.split(item)
+        items.append([part if i % 2 == 0 else _parse_ranges(part) for i, part in enumerate(parts)])
+
+    def matches(name):
+        return any(_match_parts(name, 0, parts) for parts in items)
+    return matches
+
+
+def _parse_ranges(ranges):
+    """Return the literal values and the (first, last, width) ranges of a bracket group"""
+    literals, numeric = set(), []
+    for part in ranges.split(','):
+        first, _, last = part.partition('-')
+        if not last:
+            literals.add(first)
+            continue
+        if not (first.isdigit() and last.isdigit()):
+            raise ValueError(f"Invalid range {part!r}")
+        numeric.append((int(first), int(last), len(first)))
+    return literals, numeric
+
+
+def _match_parts(name, position, parts):
+    """Match name from position against the remaining literal and range parts"""
+    if not parts:
+        return position == len(name)
+    part, rest = parts[0], parts[1:]
+    if isinstance(part, str):
+        return name.startswith(part, position) and _match_parts(name, position + len(part), rest)
+    literals, numeric = part
+    for literal in literals:
+        if name.startswith(literal, position) and _match_parts(name, position + len(literal), rest):
+            return True
+    end = position
+    while end < len(name) and name[end].isdigit():
+        end += 1
+    # Every split of the digit run, formatted with the width of the range
+    for stop in range(position + 1, end + 1):
+        digits = name[position:stop]
+        number = int(digits)
+        if any(first <= number <= last and f"{number:0{width}d}" == digits
+               for first, last, width in numeric) and _match_parts(name, stop, rest):
+            return True
+    return False
+
+
+def compress_hostlist(names):
+    """Return a compact Slurm hostlist matching exactly the names.
+
+    Only the trailing number of each name is folded into ranges.
+    """
+    matches, plain = [], []
+    for name in names:
+        match = _NUMBERED.match(name)
+        if match is None:
+            plain.append(name)
+        else:
+            matches.append(match.groups())
+
+    # Zero padded numbers keep their width; unpadded ones join a padded
+    # range of the same length (node0999 and node1000), or have no width
+    padded = {(prefix, len(digits)) for prefix, digits in matches if digits[0] == '0'}
+    numbered = {}
+    for prefix, digits in matches:
+        width = len(digits) if (prefix, len(digits)) in padded else 1
+        numbered.setdefault((prefix, width), set()).add(int(digits))
+
+    items = []
+    for (prefix, width), numbers in sorted(numbered.items()):
+        numbers = sorted(numbers)
+        ranges = []
+        first = previous = numbers[0]
+        for number in numbers[1:]:
+            if number != previous + 1:
+                ranges.append(_format_range(first, previous, width))
+                first = number
+            previous = number
+        ranges.append(_format_range(first, previous, width))
+        if len(numbers) == 1:
+            items.append(f"{prefix}{ranges[0]}")
+        else:
+            items.append(f"{prefix}[{','.join(ranges)}]")
+    return ','.join(items + sorted(plain))
+
+
+def _format_range(first, last, width):
+    if first == last:
+        return f"{first:0{width}d}"
+    return f"{first:0{width}d}-{last:0{width}d}"
+
+
+class NodeRecord:
+    """One node of one cluster, from scontrol show node"""
+    __slots__ = ('cluster',) + NODE_COLUMNS
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values.get(field, ''))
+
+    def __repr__(self):
+        return f"NodeRecord({self.name!r}, cluster={self.cluster!r}, state={self.state!r})"
+
+    @property
+    def key(self):
+        return (self.cluster, self.name)
+
+    def state_flags(self):
+        """Return the base state and flags, e.g. ['IDLE', 'DRAIN'] for IDLE+DRAIN"""
+        flags = (flag.rstrip('*~#!%$@^-') for flag in self.state.split('+'))
+        return [flag for flag in flags if flag]
+
+    def partition_list(self):
+        return [p for p in self.partitions.split(',') if p]
+
+    def feature_list(self):
+        return [f for f in self.features.split(',') if f and f != '(null)']
+
+
+def parse_nodes(output, cluster=''):
+    """Parse scontrol show node --oneliner output into NodeRecords"""
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('NodeName='):
+            continue
+        values = _parse_oneliner(line)
+        for attribute in NUMERIC_FIELDS:
+            try:
+                values[attribute] = int(values[attribute])
+            except (KeyError, ValueError):
+                pass
+        try:
+            values['cpu_load'] = float(values['cpu_load'])
+        except (KeyError, ValueError):
+            pass
+        records.append(NodeRecord(cluster=cluster, **values))
+    return records
+
+
+def _parse_oneliner(line):
+    """Return the known fields of a scontrol node line by attribute"""
+    return {NODE_FIELDS[key][0]: value for key, value in parse_key_values(line).items()
+            if key in NODE_FIELDS}
+
+
+class NodeGroup:
+    """Summary of the nodes sharing a partition, state or feature"""
+    __slots__ = ('cluster', 'value', 'count', 'hostlist', 'cpu_alloc', 'cpu_total', 'states')
+
+    def __init__(self, cluster, value, nodes):
+        self.cluster = cluster
+        self.value = value
+        self.count = len(nodes)
+        self.hostlist = compress_hostlist(node.name for node in nodes)
+        self.cpu_alloc = sum(n.cpu_alloc for n in nodes if isinstance(n.cpu_alloc, int))
+        self.cpu_total = sum(n.cpu_total for n in nodes if isinstance(n.cpu_total, int))
+        states = {}
+        for node in nodes:
+            base = (node.state_flags() or ['UNKNOWN'])[0]
+            states[base] = states.get(base, 0) + 1
+        self.states = ' '.join(f"{state}:{count}" for state, count in sorted(states.items()))
+
+
+class NodeStore:
+    """Nodes of every cluster, indexed by partition, state and feature.
+
+    A node appears in the index of each of its partitions, state flags and
+    features, so filters are set intersections and never scan every node.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.by_cluster = {}
+        self.by_partition = {}
+        self.by_state = {}
+        self.by_feature = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get(self, name, cluster=''):
+        return self.nodes.get((cluster, name))
+
+    def update(self, records, cluster=''):
+        """Replace the nodes of cluster with records"""
+        for key in list(self.by_cluster.get(cluster, ())):
+            self._unindex(self.nodes.pop(key))
+        for record in records:
+            self.nodes[record.key] = record
+            for index, value in self._indexes(record):
+                index.setdefault(value, {})[record.key] = None
+
+    def values(self, attribute, cluster=None):
+        """Return the sorted partitions, states or features seen on cluster"""
+        index = {'partition': self.by_partition, 'state': self.by_state,
+                 'feature': self.by_feature}[attribute]
+        return sorted(value for (c, value) in index if cluster is None or c == cluster)
+
+    def select(self, partition=None, state=None, feature=None, cluster=None, hostlist=None):
+        """Return the nodes matching every given filter.
+
+        state matches any flag (DRAIN matches IDLE+DRAIN); hostlist is a
+        Slurm hostlist expression.
+        """
+        clusters = [cluster] if cluster is not None else list(self.by_cluster)
+        matches = hostlist_matcher(hostlist) if hostlist else None
+        selected = []
+        for name in clusters:
+            indexes = [self.by_cluster.get(name, {})]
+            for index, value in ((self.by_partition, partition), (self.by_state, state),
+                                 (self.by_feature, feature)):
+                if value is not None:
+                    indexes.append(index.get((name, value), {}))
+
+            indexes.sort(key=len)
+            smallest, others = indexes[0], indexes[1:]
+            selected.extend(self.nodes[key] for key in smallest
+                            if key in self.nodes and all(key in index for index in others)
+                            and (matches is None or matches(key[1])))
+        return selected
+
+    def group(self, nodes, attribute):
+        """Summarize nodes by partition, state or feature into NodeGroups.
+
+        A node with several partitions or features counts in each group.
+        """
+        groups = {}
+        for node in nodes:
+            if attribute == 'partition':
+                values = node.partition_list()
+            elif attribute == 'state':
+                values = node.state_flags()[:1]
+            else:
+                values = node.feature_list()
+            for value in values or ['(none)']:
+                groups.setdefault((node.cluster, value), []).append(node)
+        return [NodeGroup(cluster, value, members)
+                for (cluster, value), members in sorted(groups.items())]
+
+    def _indexes(self, record):
+        cluster = record.cluster
+        yield self.by_cluster, cluster
+        for partition in record.partition_list():
+            yield self.by_partition, (cluster, partition)
+        for flag in record.state_flags():
+            yield self.by_state, (cluster, flag)
+        for feature in record.feature_list():
+            yield self.by_feature, (cluster, feature)
+
+    def _unindex(self, record):
+        for index, value in self._indexes(record):
+            keys = index.get(value)
+            if keys is not None:
+                keys.pop(record.key, None)
+                if not keys:
+                    del index[value]
@@ -0,0 +1,420 @@
+import fnmatch
+import re
+import shlex
+
+# Field separator requested from squeue and sinfo
+DELIMITER = '|'
+
+# squeue fields: attribute -> (header, format specifier)
+SQUEUE_FIELDS = {
+    'job_id': ('JOBID', '%i'),
+    'partition': ('PARTITION', '%P'),
+    'name': ('NAME', '%j'),
+    'user': ('USER', '%u'),
+    'account': ('ACCOUNT', '%a'),
+    'qos': ('QOS', '%q'),
+    'state': ('ST', '%t'),
+    'time': ('TIME', '%M'),
+    'time_limit': ('TIME_LIMIT', '%l'),
+    'time_left': ('TIME_LEFT', '%L'),
+    'nodes': ('NODES', '%D'),
+    'cpus': ('CPUS', '%C'),
+    'reason': ('NODELIST(REASON)', '%R'),
+    'priority': ('PRIORITY', '%Q'),
+    'submit_time': ('SUBMIT_TIME', '%V'),
+    'array_job_id': ('ARRAY_JOB_ID', '%F'),
+    'array_task_id': ('ARRAY_TASK_ID', '%K'),
+}
+
+# Columns shown by default, in the same order as plain squeue
+SQUEUE_COLUMNS = ('job_id', 'partition', 'name', 'user', 'state', 'time', 'nodes', 'reason')
+
+# Columns always fetched whatever is shown: the job key, the fields the
+# job store indexes and those used to select jobs to cancel
+SQUEUE_REQUIRED_COLUMNS = ('job_id', 'user', 'state', 'partition', 'array_job_id')
+
+# Built-in column presets: name -> shown columns
+COLUMN_PRESETS = {
+    'Default': SQUEUE_COLUMNS,
+    'Compact': ('job_id', 'name', 'state', 'time'),
+    'Accounting': ('job_id', 'user', 'account', 'qos', 'partition', 'cpus', 'nodes', 'time',
+                   'time_limit'),
+    'Scheduling': ('job_id', 'user', 'partition', 'state', 'priority', 'submit_time',
+                   'time_limit', 'reason'),
+    'Arrays': ('job_id', 'array_job_id', 'array_task_id', 'name', 'state', 'time', 'reason'),
+}
+
+# Filters applied by squeue on the controller: filter -> option. Values
+# are comma separated lists, e.g. state "PD,R"
+SQUEUE_FILTERS = {
+    'user': '--user',
+    'account': '--account',
+    'partition': '--partition',
+    'state': '--states',
+    'name': '--name',
+    'qos': '--qos',
+}
+
+# Free text fields that may contain the delimiter; they are fetched last
+FREE_TEXT_FIELDS = ('name',)
+
+# Job ids per scancel call, well below the remote ARG_MAX
+SCANCEL_BATCH_SIZE = 1000
+
+# squeue compact states accepted by scancel --state
+SCANCEL_STATES = {'PD': 'PENDING', 'R': 'RUNNING', 'S': 'SUSPENDED'}
+
+# sinfo fields: attribute -> (header, format specifier)
+SINFO_FIELDS = {
+    'partition': ('PARTITION', '%P'),
+    'avail': ('AVAIL', '%a'),
+    'time_limit': ('TIMELIMIT', '%l'),
+    'nodes': ('NODES', '%D'),
+    'state': ('STATE', '%t'),
+    'node_list': ('NODELIST', '%N'),
+}
+
+SINFO_COLUMNS = tuple(SINFO_FIELDS)
+
+# Separates the parts of a job_detail_command output
+DETAIL_SEPARATOR = '@@slurmlab@@'
+
+# sstat fields of the running steps of a job
+SSTAT_FIELDS = ('JobID', 'NTasks', 'AveCPU', 'AveRSS', 'MaxRSS', 'MaxVMSize', 'AveDiskRead', 'AveDiskWrite')
+
+# Bytes and lines of the job output files shown in the details
+TAIL_BYTES = 16384
+TAIL_LINES = 40
+
+# A key starts a value only after whitespace, so "TRES=cpu=8,mem=1G" is one value
+_KEY = re.compile(r'(?:^|\s)([A-Za-z][\w:/.]*)=')
+
+
+class JobRecord:
+    """A single squeue row of one cluster"""
+    __slots__ = ('cluster',) + tuple(SQUEUE_FIELDS)
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values.get(field, ''))
+
+    def __repr__(self):
+        return (f"JobRecord({self.job_id!r}, cluster={self.cluster!r}, "
+                f"user={self.user!r}, state={self.state!r})")
+
+    @property
+    def key(self):
+        """Job ids are only unique within a cluster"""
+        return (self.cluster, self.job_id)
+
+    def values(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+
+class PartitionRecord:
+    """A single sinfo row of one cluster"""
+    __slots__ = ('cluster',) + tuple(SINFO_FIELDS)
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values.get(field, ''))
+
+
+def fetch_columns(columns):
+    """Return the columns to fetch to show columns"""
+    return tuple(columns) + tuple(c for c in SQUEUE_REQUIRED_COLUMNS if c not in columns)
+
+
+# Columns fetched by the default job view
+SQUEUE_FETCH_COLUMNS = fetch_columns(SQUEUE_COLUMNS)
+
+
+def fetch_order(columns):
+    """Return the fields to request: the job id first and free text fields last"""
+    fields = ['job_id'] + [c for c in columns if c != 'job_id']
+    return ([f for f in fields if f not in FREE_TEXT_FIELDS]
+            + [f for f in fields if f in FREE_TEXT_FIELDS])
+
+
+def squeue_command(columns=SQUEUE_FETCH_COLUMNS, user=None, filters=None, job_ids=None):
+    """Build a delimited squeue command for the given columns.
+
+    filters maps SQUEUE_FILTERS names to values, so the controller only
+    returns the matching jobs; user overrides the user filter. job_ids
+    restricts the query to those jobs.
+    """
+    fields = fetch_order(columns)
+    fmt = DELIMITER.join(SQUEUE_FIELDS[f][1] for f in fields)
+    command = f"squeue --noheader --format={shlex.quote(fmt)}"
+    filters = dict(filters or {})
+    if user:
+        filters['user'] = user
+    for name, value in filters.items():
+        if value:
+            command += f" {SQUEUE_FILTERS[name]}={shlex.quote(value)}"
+    if job_ids:
+        command += f" --jobs={shlex.quote(','.join(job_ids))}"
+    return command
+
+
+def parse_squeue(output, columns=SQUEUE_FETCH_COLUMNS, cluster=''):
+    """Parse the output of squeue_command into JobRecords"""
+    fields = fetch_order(columns)
+    return [JobRecord(cluster=cluster, **values) for values in _parse_delimited(output, fields)]
+
+
+def match_jobs(records, state=None, name_pattern=None, partition=None, array_job_id=None):
+    """Return the records matching every given filter; name_pattern is a glob"""
+    matched = []
+    for record in records:
+        if state is not None and record.state != state:
+            continue
+        if partition is not None and record.partition != partition:
+            continue
+        if array_job_id is not None and record.array_job_id != array_job_id:
+            continue
+        if name_pattern and not fnmatch.fnmatchcase(record.name, name_pattern):
+            continue
+        matched.append(record)
+    return matched
+
+
+def scancel_command(job_ids, batch_size=SCANCEL_BATCH_SIZE):
+    """Build one shell command cancelling job_ids in as few scancel calls as possible"""
+    job_ids = list(job_ids)
+    batches = [job_ids[i:i + batch_size] for i in range(0, len(job_ids), batch_size)]
+    return '; '.join('scancel ' + ' '.join(shlex.quote(j) for j in batch) for batch in batches)
+
+
+def scancel_filter_command(user, state=None, name=None, partition=None):
+    """Build a scancel command selecting the jobs of user on the server.
+
+    Returns None if state cannot be expressed as a scancel --state.
+    """
+    command = f"scancel --user={shlex.quote(user)}"
+    if state is not None:
+        if state not in SCANCEL_STATES:
+            return None
+        command += f" --state={SCANCEL_STATES[state]}"
+    if name is not None:
+        command += f" --name={shlex.quote(name)}"
+    if partition is not None:
+        command += f" --partition={shlex.quote(partition)}"
+    return command
+
+
+def sinfo_command(columns=SINFO_COLUMNS):
+    """Build a delimited sinfo command for the given columns"""
+    fmt = DELIMITER.join(SINFO_FIELDS[f][1] for f in columns)
+    return f"sinfo --noheader --format={shlex.quote(fmt)}"
+
+
+def parse_sinfo(output, columns=SINFO_COLUMNS, cluster=''):
+    """Parse the output of sinfo_command into PartitionRecords"""
+    return [PartitionRecord(cluster=cluster, **values)
+            for values in _parse_delimited(output, columns)]
+
+
+def parse_key_values(line):
+    """Parse a scontrol --oneliner line into a dict; values may contain spaces"""
+    matches = list(_KEY.finditer(line))
+    values = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following is not None else len(line)
+        values[match.group(1)] = line[match.end():end].strip()
+    return values
+
+
+def job_detail_command(job_id):
+    """Build one command printing scontrol show job, sstat of the running
+    steps and the tails of the job stdout and stderr files"""
+    job = shlex.quote(job_id)
+    tail = f"tail -c {TAIL_BYTES} \"$f\" 2>&1 | tail -n {TAIL_LINES}"
+    # Like parse_key_values: the value of the first record runs up to the
+    # next " Key=", so paths may contain spaces. Array jobs print a record
+    # per task, and parse_job_detail also keeps the first one
+    path = "echo \"$info\" | sed -n '1s/.* {}=//p' | sed 's| [A-Za-z][A-Za-z0-9_:/.]*=.*||'"
+    return (
+        f"info=$(scontrol show job --oneliner {job}); echo \"$info\"; echo {DETAIL_SEPARATOR}; "
+        f"sstat --noheader --parsable2 --allsteps --jobs={job} --format={','.join(SSTAT_FIELDS)} 2>/dev/null; "
+        f"echo {DETAIL_SEPARATOR}; "
+        f"out=$({path.format('StdOut')}); "
+        f"err=$({path.format('StdErr')}); "
+        f"f=$out; [ -n \"$f\" ] && {tail}; echo {DETAIL_SEPARATOR}; "
+        f"f=$err; [ -n \"$f\" ] && [ \"$err\" != \"$out\" ] && {tail}"
+    )
+
+
+class JobDetail:
+    """Everything known about one job beyond its squeue row"""
+    __slots__ = ('cluster', 'job_id', 'fields', 'steps', 'stdout_tail', 'stderr_tail', 'error')
+
+    def __init__(self, cluster='', job_id='', fields=None, steps=None,
+                 stdout_tail='', stderr_tail='', error=''):
+        self.cluster = cluster
+        self.job_id = job_id
+        # scontrol show job key -> value, in scontrol order
+        self.fields = fields or {}
+        # One dict per running step, keyed by SSTAT_FIELDS
+        self.steps = steps or []
+        self.stdout_tail = stdout_tail
+        self.stderr_tail = stderr_tail
+        self.error = error
+
+    @property
+    def key(self):
+        return (self.cluster, self.job_id)
+
+    @property
+    def state(self):
+        return self.fields.get('JobState', '')
+
+
+def parse_job_detail(output, error='', job_id='', cluster=''):
+    """Parse the output of job_detail_command into a JobDetail"""
+    parts = output.split(DETAIL_SEPARATOR + '\n')
+    parts += [''] * (4 - len(parts))
+    info, sstat, stdout_tail, stderr_tail = parts[:4]
+
+    lines = [line for line in info.splitlines() if line.startswith('JobId=')]
+    fields = parse_key_values(lines[0]) if lines else {}
+    steps = list(_parse_delimited(sstat, SSTAT_FIELDS))
+    if not fields:
+        # scontrol prints its errors, such as an invalid job id, to stderr
+        error = error.strip() or info.strip() or "Job not found"
+    else:
+        error = ''
+    return JobDetail(cluster, job_id, fields, steps, stdout_tail, stderr_tail, error)
+
+
+def _parse_delimited(output, fields):
+    """Yield a dict per delimited line; the last field keeps any extra delimiters"""
+    count = len(fields)
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        values = line.split(DELIMITER, count - 1)
+        if len(values) < count:
+            values += [''] * (count - len(values))
+        yield dict(zip(fields, (v.strip() for v in values)))
+
+
+class JobDiff:
+    """Differences between two squeue snapshots"""
+    __slots__ = ('added', 'removed', 'changed')
+
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        # (old, new) record pairs
+        self.changed = []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def extend(self, other):
+        """Merge the differences of another diff into this one"""
+        self.added.extend(other.added)
+        self.removed.extend(other.removed)
+        self.changed.extend(other.changed)
+
+    def transitions(self):
+        """Return (job_id, old_state, new_state) for jobs whose state changed"""
+        return [(new.job_id, old.state, new.state)
+                for old, new in self.changed if old.state != new.state]
+
+
+class JobStore:
+    """Jobs from the last squeue of every cluster.
+
+    Jobs are keyed by (cluster, job id) and indexed by cluster, user and
+    state.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.by_cluster = {}
+        self.by_user = {}
+        self.by_state = {}
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __iter__(self):
+        return iter(self.jobs.values())
+
+    def get(self, job_id, cluster=''):
+        return self.jobs.get((cluster, job_id))
+
+    def update(self, records, cluster='', user=None):
+        """Replace the jobs of cluster, or only those of user, with records.
+
+        Unchanged jobs keep their existing record. Returns a JobDiff against
+        the previous snapshot.
+        """
+        old_keys = [record.key for record in self.select(user=user, cluster=cluster)]
+        new = {record.key: record for record in records}
+
+        diff = JobDiff()
+        for key in old_keys:
+            if key not in new:
+                diff.removed.append(self._remove(key))
+
+        for key, record in new.items():
+            old = self.jobs.get(key)
+            if old is None:
+                self._add(record)
+                diff.added.append(record)
+            elif old.values() != record.values():
+                self._replace(old, record)
+                diff.changed.append((old, record))
+        return diff
+
+    def select(self, user=None, state=None, cluster=None):
+        """Return the jobs matching user, state and cluster using the indexes"""
+        indexes = []
+        if user is not None:
+            indexes.append(self.by_user.get(user, {}))
+        if state is not None:
+            indexes.append(self.by_state.get(state, {}))
+        if cluster is not None:
+            indexes.append(self.by_cluster.get(cluster, {}))
+        if not indexes:
+            return list(self.jobs.values())
+
+        indexes.sort(key=len)
+        smallest, others = indexes[0], indexes[1:]
+        return [self.jobs[key] for key in smallest
+                if all(key in index for index in others)]
+
+    def _indexes(self, record):
+        return ((self.by_cluster, record.cluster), (self.by_user, record.user),
+                (self.by_state, record.state))
+
+    def _add(self, record):
+        key = record.key
+        self.jobs[key] = record
+        # Dicts keep insertion order, so selections follow the squeue order
+        for index, value in self._indexes(record):
+            index.setdefault(value, {})[key] = None
+
+    def _replace(self, old, new):
+        # Assigning an existing key keeps the job in place
+        self.jobs[new.key] = new
+        if old.user != new.user or old.state != new.state:
+            self._unindex(old)
+            for index, value in self._indexes(new):
+                index.setdefault(value, {})[new.key] = None
+
+    def _remove(self, key):
+        record = self.jobs.pop(key)
+        self._unindex(record)
+        return record
+
+    def _unindex(self, record):
+        for index, value in self._indexes(record):
+            keys = index.get(value)
+            if keys is not None:
+                keys.pop(record.key, None)
+                if not keys:
+                    del index[value]
@@ -0,0 +1,223 @@
+from parsers import DELIMITER, fetch_order, squeue_command
+
+# Separates the sprio, sshare and squeue outputs of priority_command
+PRIORITY_SEPARATOR = '@@slurmlab-priority@@'
+
+# sprio fields: attribute -> (header, format specifier). Factors are the
+# weighted ones, whose sum is the job priority
+SPRIO_FIELDS = {
+    'job_id': ('JOBID', '%i'),
+    'partition': ('PARTITION', '%r'),
+    'user': ('USER', '%u'),
+    'account': ('ACCOUNT', '%o'),
+    'priority': ('PRIORITY', '%Y'),
+    'site': ('SITE', '%S'),
+    'age': ('AGE', '%A'),
+    'fairshare': ('FAIRSHARE', '%F'),
+    'job_size': ('JOBSIZE', '%J'),
+    'partition_factor': ('PART_PRIO', '%P'),
+    'qos': ('QOS', '%Q'),
+    'nice': ('NICE', '%N'),
+    'tres': ('TRES', '%T'),
+}
+
+# sshare fields, in --format order: attribute -> field name
+SSHARE_FIELDS = {
+    'account': 'Account',
+    'user': 'User',
+    'raw_shares': 'RawShares',
+    'norm_shares': 'NormShares',
+    'raw_usage': 'RawUsage',
+    'effective_usage': 'EffectvUsage',
+    'fairshare_factor': 'FairShare',
+}
+
+# squeue fields of the pending jobs, for what sprio does not print
+PENDING_COLUMNS = ('job_id', 'name', 'submit_time', 'reason')
+
+# Displayed attribute -> header, in display order
+PRIORITY_HEADERS = {
+    'job_id': 'JOBID',
+    'partition': 'PARTITION',
+    'rank': 'RANK',
+    'pending': 'PENDING',
+    'user': 'USER',
+    'account': 'ACCOUNT',
+    'priority': 'PRIORITY',
+    'behind': 'BEHIND',
+    'site': 'SITE',
+    'age': 'AGE',
+    'fairshare': 'FAIRSHARE',
+    'job_size': 'JOBSIZE',
+    'partition_factor': 'PART_PRIO',
+    'qos': 'QOS',
+    'nice': 'NICE',
+    'tres': 'TRES',
+    'fairshare_factor': 'FS_FACTOR',
+    'effective_usage': 'EFF_USAGE',
+    'norm_shares': 'NORM_SHARES',
+    'submit_time': 'SUBMIT_TIME',
+    'reason': 'REASON',
+    'name': 'NAME',
+}
+
+
+def priority_command():
+    """Build one command printing sprio, sshare and the pending jobs, in that order"""
+    sprio_format = DELIMITER.join(spec for _, spec in SPRIO_FIELDS.values())
+    return (
+        f"sprio --noheader --format='{sprio_format}'; echo {PRIORITY_SEPARATOR}; "
+        f"sshare --all --noheader --parsable2 --format={','.join(SSHARE_FIELDS.values())}; "
+        f"echo {PRIORITY_SEPARATOR}; "
+        f"{squeue_command(PENDING_COLUMNS, filters={'state': 'PD'})}"
+    )
+
+
+class PriorityRecord:
+    """A pending job in one partition: its priority factors, fair share and queue position"""
+    __slots__ = ('cluster', 'rank', 'pending', 'behind', 'name', 'submit_time', 'reason',
+                 'raw_shares', 'norm_shares', 'raw_usage', 'effective_usage', 'fairshare_factor'
+                 ) + tuple(SPRIO_FIELDS)
+
+    def __init__(self, cluster='', job_id='', partition='', user='', account='', priority='',
+                 site='', age='', fairshare='', job_size='', partition_factor='', qos='', nice='',
+                 tres=''):
+        # Assigned one by one: tens of thousands are built per refresh
+        self.cluster = cluster
+        self.job_id = job_id
+        self.partition = partition
+        self.user = user
+        self.account = account
+        self.priority = _number(priority)
+        self.site = _number(site)
+        self.age = _number(age)
+        self.fairshare = _number(fairshare)
+        self.job_size = _number(job_size)
+        self.partition_factor = _number(partition_factor)
+        self.qos = _number(qos)
+        self.nice = _number(nice)
+        self.tres = tres
+        self.rank = self.pending = self.behind = ''
+        self.name = self.submit_time = self.reason = ''
+        self.raw_shares = self.norm_shares = self.raw_usage = ''
+        self.effective_usage = self.fairshare_factor = ''
+
+    def __repr__(self):
+        return (f"PriorityRecord({self.job_id!r}, cluster={self.cluster!r}, "
+                f"partition={self.partition!r}, rank={self.rank!r})")
+
+    @property
+    def key(self):
+        return (self.cluster, self.job_id, self.partition)
+
+
+def _number(text):
+    """Return text as an int, or a float if it has decimals; anything else is kept"""
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        value = float(text)
+    except ValueError:
+        return text
+    return int(value) if value.is_integer() else value
+
+
+def _split(line, count):
+    """Split a delimited line into count stripped values; the last keeps extra delimiters"""
+    values = line.split(DELIMITER, count - 1)
+    values += [''] * (count - len(values))
+    return [v.strip() for v in values]
+
+
+def parse_sprio(output, cluster=''):
+    """Return a PriorityRecord per sprio line, not yet joined nor ranked"""
+    count = len(SPRIO_FIELDS)
+    return [PriorityRecord(cluster, *_split(line, count))
+            for line in output.splitlines() if line.strip()]
+
+
+def parse_sshare(output):
+    """Return the sshare rows indexed by (account, user); account rows have no user.
+
+    sshare indents accounts by their depth in the tree, which is dropped.
+    """
+    shares = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        row = dict(zip(SSHARE_FIELDS, _split(line, len(SSHARE_FIELDS))))
+        shares[(row['account'], row['user'])] = row
+    return shares
+
+
+def parse_pending(output):
+    """Return the pending jobs printed by squeue as dicts indexed by job id"""
+    fields = fetch_order(PENDING_COLUMNS)
+    jobs = {}
+    for line in output.splitlines():
+        if line.strip():
+            values = _split(line, len(fields))
+            jobs[values[0]] = dict(zip(fields, values))
+    return jobs
+
+
+def _queue_order(record):
+    """Sort key of the scheduling order: highest priority, then oldest, then lowest id.
+
+    Ids of equal length compare as numbers, and array tasks such as
+    123_4 stay next to their job, without parsing them.
+    """
+    priority = record.priority if isinstance(record.priority, (int, float)) else 0
+    return (-priority, record.submit_time, len(record.job_id), record.job_id)
+
+
+def join_priorities(records, shares, pending):
+    """Join sprio records with the sshare and squeue indexes and rank them.
+
+    records are parse_sprio records, shares the parse_sshare index and
+    pending the parse_pending one. A job pending in several partitions has
+    a record per partition. rank is the position among the pending jobs of
+    the partition, 1 being the next to start; behind is the priority gap
+    with the first one. Returns the records by partition and rank.
+    """
+    by_partition = {}
+    no_share = {}
+    for record in records:
+        job = pending.get(record.job_id)
+        if job is not None:
+            record.name = job['name']
+            record.submit_time = job['submit_time']
+            record.reason = job['reason']
+        share = (shares.get((record.account, record.user))
+                 or shares.get((record.account, ''), no_share))
+        if share:
+            record.raw_shares = share['raw_shares']
+            record.norm_shares = share['norm_shares']
+            record.raw_usage = share['raw_usage']
+            record.effective_usage = share['effective_usage']
+            record.fairshare_factor = share['fairshare_factor']
+        by_partition.setdefault(record.partition, []).append(record)
+
+    ranked = []
+    for partition in sorted(by_partition):
+        queue = by_partition[partition]
+        queue.sort(key=_queue_order)
+        first = -_queue_order(queue[0])[0]
+        count = len(queue)
+        for rank, record in enumerate(queue, 1):
+            record.rank = rank
+            record.pending = count
+            if isinstance(record.priority, (int, float)):
+                record.behind = first - record.priority
+        ranked.extend(queue)
+    return ranked
+
+
+def parse_priority(output, cluster=''):
+    """Parse the output of priority_command into ranked PriorityRecords"""
+    parts = output.split(PRIORITY_SEPARATOR + '\n')
+    parts += [''] * (3 - len(parts))
+    sprio, sshare, squeue = parts[:3]
+    return join_priorities(parse_sprio(sprio, cluster), parse_sshare(sshare), parse_pending(squeue))
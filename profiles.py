@@ -0,0 +1,100 @@
+import json
+import os
+from pathlib import Path
+from parsers import SQUEUE_FIELDS
+
+# Saved connection profiles, one per cluster
+PROFILES_PATH = Path.home() / '.config' / 'slurmlab' / 'profiles.json'
+
+DEFAULT_PORT = 22
+
+
+def load_env():
+    """Load the SSH_* variables of the .env file into the environment.
+
+    Called by the entry points rather than at import time.
+    """
+    import dotenv
+    dotenv.load_dotenv()
+
+
+def env_profile():
+    """Return the connection profile defined in .env, or None"""
+    host = os.getenv('SSH_HOST', '')
+    if not host:
+        return None
+    return {
+        'name': host,
+        'host': host,
+        'port': os.getenv('SSH_PORT', '') or str(DEFAULT_PORT),
+        'username': os.getenv('SSH_USER', ''),
+        'password': os.getenv('SSH_PASSWORD', ''),
+    }
+
+
+def load_profiles(path=PROFILES_PATH):
+    """Return the saved profiles by name, plus the .env profile if any.
+
+    Saved profiles do not include passwords; the .env password is used for
+    the profile with the .env host.
+    """
+    profiles = {}
+    default = env_profile()
+    if default is not None:
+        profiles[default['name']] = default
+
+    for name, info in _load(path).get('profiles', {}).items():
+        profile = {'name': name, 'host': '', 'port': str(DEFAULT_PORT), 'username': '', 'password': ''}
+        profile.update({k: str(v) for k, v in info.items() if k in ('host', 'port', 'username')})
+        if default is not None and profile['host'] == default['host']:
+            profile['password'] = default['password']
+        profiles[name] = profile
+    return profiles
+
+
+def save_profile(profile, path=PROFILES_PATH):
+    """Add or replace a profile in the profiles file, without its password"""
+    data = _load(path)
+    data.setdefault('profiles', {})[profile['name']] = {
+        'host': profile['host'],
+        'port': profile['port'],
+        'username': profile['username'],
+    }
+    _save(data, path)
+
+
+def load_column_presets(path=PROFILES_PATH):
+    """Return the saved squeue column presets: name -> columns.
+
+    Unknown columns, from an older version or a hand edit, are dropped, and
+    presets left without columns are skipped.
+    """
+    presets = {}
+    for name, columns in _load(path).get('column_presets', {}).items():
+        if not isinstance(columns, list):
+            continue
+        columns = tuple(c for c in columns if c in SQUEUE_FIELDS)
+        if columns:
+            presets[name] = columns
+    return presets
+
+
+def save_column_preset(name, columns, path=PROFILES_PATH):
+    """Add or replace a squeue column preset in the profiles file"""
+    data = _load(path)
+    data.setdefault('column_presets', {})[name] = list(columns)
+    _save(data, path)
+
+
+def _load(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(data, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
@@ -0,0 +1,106 @@
+from contextlib import ExitStack
+
+# Bytes read per page when paging through a log
+PAGE_SIZE = 256 * 1024
+
+# Most bytes read per follow poll; when more was appended only the end is read
+MAX_FOLLOW = 1024 * 1024
+
+# Size of each pipelined SFTP read request
+REQUEST_SIZE = 32768
+
+
+class RemoteLog:
+    """A remote file read over SFTP on a shared SSHConnection.
+
+    Only byte ranges are ever transferred: pages for browsing, and the bytes
+    appended since the last read for following, so multi-GB logs are never
+    loaded whole. Calls block; run them off the GUI thread.
+    """
+
+    def __init__(self, connection, path):
+        self.connection = connection
+        self.path = path
+        # Size at the last read
+        self.file_size = 0
+        self._stack = ExitStack()
+        self._file = None
+
+    def open(self):
+        # A viewer holds its SFTP client until closed: fail at once rather
+        # than keep a pool thread waiting for another viewer to close
+        sftp = self._stack.enter_context(self.connection.sftp(timeout=0))
+        try:
+            self._file = self._stack.enter_context(sftp.open(self.path, 'rb'))
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        self._file = None
+        self._stack.close()
+
+    def is_open(self):
+        return self._file is not None
+
+    def size(self):
+        self.file_size = self._file.stat().st_size
+        return self.file_size
+
+    def read(self, offset, length):
+        """Read length bytes at offset, with the SFTP requests pipelined"""
+        if length <= 0:
+            return b''
+        ranges = [(start, min(REQUEST_SIZE, offset + length - start))
+                  for start in range(offset, offset + length, REQUEST_SIZE)]
+        return b''.join(self._file.readv(ranges))
+
+    def _read_lines_from(self, offset, length):
+        """Read [offset, offset + length) without the partial line it may start with.
+
+        Returns the offset of the first whole line and the data from there.
+        """
+        if offset == 0:
+            return 0, self.read(0, length)
+        # The byte before offset tells whether offset starts a line
+        data = self.read(offset - 1, length + 1)
+        cut = data.find(b'\n') + 1
+        if cut == 0:
+            return offset + length, b''
+        return offset - 1 + cut, data[cut:]
+
+    def read_page(self, offset, length=PAGE_SIZE):
+        """Return (start, end, text) of the whole lines around [offset, offset + length).
+
+        The partial first and last lines are cut, except at the start and
+        the end of the file.
+        """
+        size = self.size()
+        offset = max(0, min(offset, size - length))
+        start, data = self._read_lines_from(offset, min(length, size - offset))
+        end = offset + min(length, size - offset)
+        if end < size:
+            cut = data.rfind(b'\n') + 1
+            data, end = data[:cut], start + cut
+        return start, end, data.decode(errors='replace')
+
+    def read_end(self, length=PAGE_SIZE):
+        """Return the last page of the file"""
+        return self.read_page(self.size() - length, length)
+
+    def read_appended(self, offset):
+        """Return (start, end, text) of the whole lines appended after offset.
+
+        start differs from offset when the file was truncated (start is then
+        0) or when more than MAX_FOLLOW bytes were appended. A trailing
+        partial line is left for the next call.
+        """
+        size = self.size()
+        if size < offset:
+            offset = 0
+        if size - offset > MAX_FOLLOW:
+            start, data = self._read_lines_from(size - MAX_FOLLOW, MAX_FOLLOW)
+        else:
+            start, data = offset, self.read(offset, size - offset)
+        data = data[:data.rfind(b'\n') + 1]
+        return start, start + len(data), data.decode(errors='replace')
@@ -0,0 +1,166 @@
+import json
+import os
+import struct
+import time
+import zlib
+from collections import namedtuple
+from pathlib import Path
+from nodes import NodeRecord, NodeStore
+from parsers import JobRecord, JobStore
+
+# Session snapshot, rewritten on exit and shown stale on the next launch
+SESSION_PATH = Path.home() / '.cache' / 'slurmlab' / 'session.bin'
+
+# Files start with the magic and the format version; other versions are
+# ignored, so a format change only costs one cold start
+MAGIC = b'SLURMLAB'
+VERSION = 1
+
+# magic, version, compressed length of the session block; the data block
+# fills the rest of the file
+_HEADER = struct.Struct('>8sHI')
+
+COMPRESSION_LEVEL = 6
+
+
+class Snapshot:
+    """What the window showed on exit.
+
+    session is small and read before the window is shown: the profiles
+    of the connected clusters (without passwords), the window layout and
+    the view. data holds the jobs, nodes and the shown table, and is
+    decoded off the GUI thread.
+    """
+    __slots__ = ('saved_at', 'session', 'data')
+
+    def __init__(self, saved_at=None, session=None, data=b''):
+        self.saved_at = saved_at if saved_at is not None else time.time()
+        self.session = session or {}
+        # Compressed data block, as written
+        self.data = data
+
+    def age(self, now=None):
+        """Return the seconds since the snapshot was saved"""
+        return (now if now is not None else time.time()) - self.saved_at
+
+
+def encode_records(records, fields):
+    """Return records as {'fields': [...], 'rows': [[...]]}, one list of values per record"""
+    return {'fields': list(fields),
+            'rows': [[getattr(record, field) for field in fields] for record in records]}
+
+
+def decode_records(encoded, record_type):
+    """Build record_type(**values) for every row of encode_records output"""
+    fields = encoded['fields']
+    return [record_type(**dict(zip(fields, row))) for row in encoded['rows']]
+
+
+def encode_data(jobs=None, nodes=None, table=None):
+    """Return the compressed data block.
+
+    jobs is a JobStore, nodes a NodeStore and table the shown view when it
+    is not rebuilt from those: (view kind, (header, attribute) columns,
+    records).
+    """
+    data = {}
+    if jobs is not None and len(jobs):
+        data['jobs'] = encode_records(jobs, JobRecord.__slots__)
+    if nodes is not None and len(nodes):
+        data['nodes'] = encode_records(nodes.nodes.values(), NodeRecord.__slots__)
+    if table is not None:
+        kind, columns, records = table
+        attributes = [attribute for _, attribute in columns]
+        if records and hasattr(records[0], 'cluster') and 'cluster' not in attributes:
+            attributes.append('cluster')
+        data['table'] = {'kind': kind, 'columns': [list(column) for column in columns],
+                         'records': encode_records(records, attributes)}
+    return _compress(data)
+
+
+def decode_data(block):
+    """Decode a data block into a JobStore, a NodeStore and the table, if any.
+
+    The table is (view kind, columns, records), its records namedtuples.
+    """
+    data = _decompress(block) if block else {}
+    jobs = JobStore()
+    if 'jobs' in data:
+        for cluster, records in _by_cluster(decode_records(data['jobs'], JobRecord)).items():
+            jobs.update(records, cluster)
+    nodes = NodeStore()
+    if 'nodes' in data:
+        for cluster, records in _by_cluster(decode_records(data['nodes'], NodeRecord)).items():
+            nodes.update(records, cluster)
+    table = None
+    if 'table' in data:
+        encoded = data['table']['records']
+        Row = namedtuple('Row', encoded['fields'], rename=True)
+        table = (data['table']['kind'], [tuple(column) for column in data['table']['columns']],
+                 [Row(*row) for row in encoded['rows']])
+    return jobs, nodes, table
+
+
+def write_snapshot(snapshot, path=SESSION_PATH):
+    """Write a Snapshot atomically: a crash mid-write keeps the previous file"""
+    session = _compress(dict(snapshot.session, saved_at=snapshot.saved_at))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + '.tmp')
+    with open(temporary, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, len(session)))
+        file.write(session)
+        file.write(snapshot.data)
+    os.replace(temporary, path)
+
+
+def remove_snapshot(path=SESSION_PATH):
+    """Delete the snapshot at path, if there is one"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_snapshot(path=SESSION_PATH):
+    """Return the Snapshot at path with its session decoded, or None.
+
+    Missing, truncated or corrupt files and other versions give None.
+    The data block is returned compressed, for decode_data.
+    """
+    try:
+        with open(path, 'rb') as file:
+            content = file.read()
+    except OSError:
+        return None
+    if len(content) < _HEADER.size:
+        return None
+    magic, version, length = _HEADER.unpack_from(content)
+    if magic != MAGIC or version != VERSION:
+        return None
+    start = _HEADER.size
+    try:
+        session = _decompress(content[start:start + length])
+    except ValueError:
+        return None
+    saved_at = session.pop('saved_at', None)
+    return Snapshot(saved_at, session, content[start + length:])
+
+
+def _by_cluster(records):
+    clusters = {}
+    for record in records:
+        clusters.setdefault(record.cluster, []).append(record)
+    return clusters
+
+
+def _compress(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'),
+                         COMPRESSION_LEVEL)
+
+
+def _decompress(block):
+    """Decode a compressed JSON block; raises ValueError if it is corrupt"""
+    try:
+        return json.loads(zlib.decompress(block).decode('utf-8'))
+    except zlib.error as e:
+        raise ValueError(f"Corrupt snapshot: {e}")
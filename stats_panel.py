@@ -0,0 +1,147 @@
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import (
+    QAbstractItemView, QCheckBox, QDockWidget, QFileDialog, QHBoxLayout, QHeaderView, QPushButton,
+    QSpinBox, QTableView, QVBoxLayout, QWidget
+    )
+from instrument import METRICS
+from models import TableModel
+
+STAT_COLUMNS = [('OPERATION', 'operation'), ('METRIC', 'metric'), ('COUNT', 'count'),
+                ('P50', 'p50'), ('P90', 'p90'), ('P99', 'p99'), ('MAX', 'max')]
+
+
+class StatRow:
+    """A Stat formatted for display: times in ms, sizes in bytes"""
+    __slots__ = ('operation', 'metric', 'count', 'p50', 'p90', 'p99', 'max')
+
+    def __init__(self, stat):
+        self.operation = stat.operation
+        self.metric = METRICS.get(stat.metric, (stat.metric,))[0]
+        self.count = stat.count
+        unit = METRICS.get(stat.metric, ('', 's'))[1]
+        for field in ('p50', 'p90', 'p99', 'max'):
+            value = getattr(stat, field)
+            if value is None:
+                text = ''
+            elif unit == 's':
+                text = f"{value * 1000:.1f} ms"
+            else:
+                text = f"{value:.0f}"
+            setattr(self, field, text)
+
+
+class StatsPanel(QDockWidget):
+    """Dock showing percentiles of the timings recorded by an Instrument"""
+
+    # Milliseconds between two refreshes while the panel is shown
+    REFRESH_INTERVAL = 1000
+
+    def __init__(self, instrument, parent=None):
+        super().__init__("Performance", parent)
+        self.setObjectName("performance")
+        self.setAllowedAreas(Qt.BottomDockWidgetArea | Qt.RightDockWidgetArea)
+        self.instrument = instrument
+
+        self.model = TableModel(self)
+        self.table_view = QTableView()
+        self.table_view.setModel(self.model)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_view.setShowGrid(False)
+        self.table_view.verticalHeader().setVisible(False)
+        self.table_view.horizontalHeader().setStretchLastSection(True)
+        self.table_view.horizontalHeader().setDefaultAlignment(Qt.AlignLeft)
+        self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+
+        self.debug_check = QCheckBox("Flag slow operations over")
+        self.debug_check.setToolTip("Report parse, render and network stages slower than the threshold "
+                                    "in the status bar and the log")
+        self.debug_check.toggled.connect(self.set_debug)
+        self.threshold_spin = QSpinBox()
+        self.threshold_spin.setRange(10, 60000)
+        self.threshold_spin.setSuffix(" ms")
+        self.threshold_spin.setValue(int(instrument.slow_threshold * 1000))
+        self.threshold_spin.valueChanged.connect(self.set_threshold)
+        self.trace_button = QPushButton("Trace to File...")
+        self.trace_button.setCheckable(True)
+        self.trace_button.toggled.connect(self.toggle_trace)
+        self.reset_button = QPushButton("Reset")
+        self.reset_button.clicked.connect(self.reset)
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.debug_check)
+        controls.addWidget(self.threshold_spin)
+        controls.addStretch()
+        controls.addWidget(self.trace_button)
+        controls.addWidget(self.reset_button)
+
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(controls)
+        layout.addWidget(self.table_view)
+        self.setWidget(widget)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.visibilityChanged.connect(self.follow_visibility)
+
+    def set_font_size(self, size):
+        self.table_view.setStyleSheet(f"""
+            QTableView {{
+            background-color: #2E2E2E;
+            color: white;
+            font-family: "Monaco";
+            font-size: {size}pt;
+            }}
+            QHeaderView::section {{
+            background-color: #2E2E2E;
+            color: #66FF66;
+            font-weight: bold;
+            border: none;
+            padding: 4px 6px;
+            }}
+        """)
+
+    def follow_visibility(self, visible):
+        if visible:
+            self.refresh()
+            self.timer.start(self.REFRESH_INTERVAL)
+        else:
+            self.timer.stop()
+
+    def refresh(self):
+        rows = [StatRow(stat) for stat in self.instrument.stats()]
+        # Keep the scroll position across refreshes
+        position = self.table_view.verticalScrollBar().value()
+        self.model.set_records(STAT_COLUMNS, rows)
+        self.table_view.verticalScrollBar().setValue(position)
+
+    def set_debug(self, enabled):
+        self.instrument.debug = enabled
+
+    def set_threshold(self, value):
+        self.instrument.slow_threshold = value / 1000
+
+    def toggle_trace(self, enabled):
+        """Write every recorded operation to a JSON lines file while checked"""
+        if not enabled:
+            self.instrument.stop_trace()
+            self.trace_button.setText("Trace to File...")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Trace File", "slurmlab-trace.jsonl",
+                                              "JSON Lines (*.jsonl)")
+        if not path:
+            self.trace_button.setChecked(False)
+            return
+        try:
+            self.instrument.start_trace(path)
+        except OSError as e:
+            self.trace_button.setChecked(False)
+            self.trace_button.setToolTip(str(e))
+            return
+        self.trace_button.setText("Stop Trace")
+        self.trace_button.setToolTip(path)
+
+    def reset(self):
+        self.instrument.reset()
+        self.refresh()
@@ -0,0 +1,170 @@
+import io
+import itertools
+import re
+import secrets
+import tarfile
+import time
+
+# Remote directory, under the home directory, holding the scripts of each sweep
+SWEEP_DIR = 'slurmlab/sweeps'
+
+# Template placeholders: {{name}}, so shell $VARIABLES are left alone
+_PLACEHOLDER = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+_RANGE = re.compile(r'^(-?\d+)\.\.(-?\d+)(?:\.\.(\d+))?$')
+
+
+def parse_values(text):
+    """Parse "a, b, c" or integer ranges such as "1..10" or "0..100..10" (step)"""
+    values = []
+    for item in text.split(','):
+        item = item.strip()
+        match = _RANGE.match(item)
+        if match is None:
+            if item:
+                values.append(item)
+            continue
+        first, last, step = int(match.group(1)), int(match.group(2)), int(match.group(3) or 1)
+        values.extend(str(i) for i in range(first, last + 1, step))
+    return values
+
+
+def parse_params(text):
+    """Parse one "name = values" parameter per line into {name: [values]}"""
+    params = {}
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        name, separator, values = line.partition('=')
+        name = name.strip()
+        if not separator or not name.isidentifier():
+            raise ValueError(f"Line {number}: expected name = value, value, ...")
+        params[name] = parse_values(values)
+        if not params[name]:
+            raise ValueError(f"Line {number}: no value for {name}")
+    return params
+
+
+def expand_grid(params):
+    """Return every combination of the parameter values, as dicts, in a stable order"""
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*params.values())]
+
+
+def placeholders(template):
+    return set(_PLACEHOLDER.findall(template))
+
+
+def render(template, values):
+    """Replace the {{name}} placeholders of template with values"""
+    def replace(match):
+        try:
+            return values[match.group(1)]
+        except KeyError:
+            raise ValueError(f"No value for {{{{{match.group(1)}}}}}") from None
+    return _PLACEHOLDER.sub(replace, template)
+
+
+def directives(template):
+    """Return the #SBATCH lines of a batch script"""
+    return [line for line in template.splitlines() if line.startswith('#SBATCH')]
+
+
+class Sweep:
+    """A batch script template expanded over a parameter grid.
+
+    When no #SBATCH directive depends on a parameter, the whole grid is
+    submitted as one job array: a wrapper with the shared directives runs
+    the rendered script of its SLURM_ARRAY_TASK_ID. Otherwise each
+    combination is its own job.
+    """
+
+    def __init__(self, template, params, name='sweep', use_array=True, max_running=0):
+        missing = placeholders(template) - set(params)
+        if missing:
+            raise ValueError(f"No values for {', '.join(sorted(missing))}")
+        self.template = template
+        self.params = params
+        self.grid = expand_grid(params)
+        self.max_running = max_running
+        self.array = (use_array and len(self.grid) > 1
+                      and not any(placeholders(line) for line in directives(template)))
+        name = re.sub(r'[^\w.-]', '_', name) or 'sweep'
+        # The random suffix keeps sweeps submitted in the same second apart
+        self.name = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(2)}"
+        self.directory = f"{SWEEP_DIR}/{self.name}"
+
+    def __len__(self):
+        return len(self.grid)
+
+    def files(self):
+        """Return the scripts to upload by file name"""
+        files = {f"task_{i}.sh": render(self.template, values)
+                 for i, values in enumerate(self.grid)}
+        files['params.tsv'] = '\n'.join(
+            ['index\t' + '\t'.join(self.params)]
+            + [f"{i}\t" + '\t'.join(values.values()) for i, values in enumerate(self.grid)]) + '\n'
+        if self.array:
+            lines = self.template.splitlines()
+            shebang = lines[0] if lines and lines[0].startswith('#!') else '#!/bin/bash'
+            files['array.sh'] = '\n'.join(
+                [shebang] + directives(self.template)
+                + [f'exec "$HOME/{self.directory}/task_${{SLURM_ARRAY_TASK_ID}}.sh"']) + '\n'
+        return files
+
+    def archive(self):
+        """Pack the scripts into one gzipped tar, uploaded in a single transfer"""
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+            for name, text in self.files().items():
+                data = text.encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mode = 0o755 if name.endswith('.sh') else 0o644
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def archive_path(self):
+        """Upload path of the archive, relative to the home directory"""
+        return f".slurmlab-{self.name}.tar.gz"
+
+    def script(self):
+        """Return the shell script unpacking the archive and submitting every job.
+
+        It runs in a single remote shell and prints one "ok JOBID" or
+        "error MESSAGE" line per sbatch call, in order.
+        """
+        directory = f'"$HOME/{self.directory}"'
+        archive = f'"$HOME/{self.archive_path()}"'
+        lines = [
+            f"mkdir -p {directory} && tar -xzf {archive} -C {directory} || exit 1",
+            f"rm -f {archive}",
+            'submit() { if out=$(sbatch --parsable "$@" 2>&1); then echo "ok ${out%%;*}"; '
+            'else echo "error ${out//$\'\\n\'/ }"; fi; }',
+        ]
+        if self.array:
+            array = f"0-{len(self.grid) - 1}"
+            if self.max_running:
+                array += f"%{self.max_running}"
+            lines.append(f"submit --array={array} {directory}/array.sh")
+        else:
+            lines.extend(f"submit {directory}/task_{i}.sh" for i in range(len(self.grid)))
+        return '\n'.join(lines) + '\n'
+
+    def parse_output(self, output):
+        """Return the job ids submitted, one per grid point, and the error messages.
+
+        The tasks of an array are named JOBID_INDEX, as squeue shows them.
+        """
+        job_ids, errors = [], []
+        for line in output.splitlines():
+            status, _, value = line.partition(' ')
+            if status == 'ok' and self.array:
+                job_ids.extend(f"{value}_{i}" for i in range(len(self.grid)))
+            elif status == 'ok':
+                job_ids.append(value)
+            elif status == 'error':
+                errors.append(value)
+        return job_ids, errors
+
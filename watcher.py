@@ -0,0 +1,333 @@
+import shlex
+from history import parse_duration, parse_state
+from parsers import DELIMITER, parse_squeue, squeue_command
+
+# Fields fetched for watched jobs, so each poll stays small
+WATCH_COLUMNS = ('job_id', 'array_job_id', 'name', 'user', 'state', 'time_left')
+
+# sacct fields of the jobs that left the queue; JobName may contain the
+# delimiter, so it comes last
+WATCH_SACCT_FIELDS = ('JobID', 'State', 'ExitCode', 'JobName')
+
+# squeue compact states -> sacct states
+STATE_NAMES = {
+    'PD': 'PENDING', 'R': 'RUNNING', 'CG': 'COMPLETING', 'CD': 'COMPLETED', 'F': 'FAILED',
+    'TO': 'TIMEOUT', 'CA': 'CANCELLED', 'OOM': 'OUT_OF_MEMORY', 'NF': 'NODE_FAIL',
+    'S': 'SUSPENDED', 'PR': 'PREEMPTED', 'DL': 'DEADLINE', 'BF': 'BOOT_FAIL',
+    'CF': 'CONFIGURING', 'RQ': 'REQUEUED', 'RS': 'RESIZING', 'ST': 'STOPPED',
+}
+
+# States notified when a job enters them -> event kind
+EVENT_KINDS = {
+    'RUNNING': 'started',
+    'COMPLETED': 'completed',
+    'FAILED': 'failed',
+    'OUT_OF_MEMORY': 'failed',
+    'NODE_FAIL': 'failed',
+    'BOOT_FAIL': 'failed',
+    'DEADLINE': 'failed',
+    'PREEMPTED': 'failed',
+    'TIMEOUT': 'timeout',
+    'CANCELLED': 'cancelled',
+}
+
+# States a job never leaves
+FINAL_STATES = frozenset(kind for kind in EVENT_KINDS if kind != 'RUNNING')
+
+# Seconds between two polls: the interval doubles while nothing changes
+MIN_INTERVAL = 15
+MAX_INTERVAL = 300
+BACKOFF = 2
+
+# A running job with less time left than this is reported once
+TIME_LEFT_WARNING = 600
+
+# Polls a job that left the queue is looked up in sacct before giving up,
+# since the accounting database may lag behind the controller
+SACCT_ATTEMPTS = 3
+
+# Printed by squeue --jobs when none of the jobs is still known
+_INVALID_JOB = 'Invalid job id'
+
+
+class WatchedJob:
+    """What is known of a watched job, kept between polls"""
+    __slots__ = ('name', 'user', 'state', 'time_left', 'warned', 'lookups')
+
+    def __init__(self, name='', user='', state='', time_left=None):
+        self.name = name
+        self.user = user
+        self.state = state
+        # Seconds until the time limit, None when unknown or unlimited
+        self.time_left = time_left
+        self.warned = False
+        # sacct lookups done since the job left the queue
+        self.lookups = 0
+
+
+class JobEvent:
+    """A notified transition of a watched job"""
+    __slots__ = ('cluster', 'job_id', 'name', 'kind', 'state', 'detail')
+
+    TITLES = {
+        'started': "Job started",
+        'completed': "Job completed",
+        'failed': "Job failed",
+        'timeout': "Job hit its time limit",
+        'cancelled': "Job cancelled",
+        'ending': "Job near its time limit",
+        'gone': "Job left the queue",
+    }
+
+    def __init__(self, cluster, job_id, name, kind, state='', detail=''):
+        self.cluster = cluster
+        self.job_id = job_id
+        self.name = name
+        self.kind = kind
+        self.state = state
+        self.detail = detail
+
+    def __repr__(self):
+        return f"JobEvent({self.job_id!r}, {self.kind!r}, cluster={self.cluster!r})"
+
+    @property
+    def title(self):
+        return self.TITLES.get(self.kind, self.kind)
+
+    def message(self, show_cluster=False):
+        text = f"{self.job_id} {self.name}".rstrip()
+        if show_cluster:
+            text = f"{self.cluster}: {text}"
+        if self.kind == 'failed' and self.state != 'FAILED':
+            text += f" ({self.state})"
+        if self.detail:
+            text += f", {self.detail}"
+        return text
+
+
+def watch_sacct_command(job_ids):
+    """Build the sacct command returning the final state of job_ids"""
+    return (f"sacct --noheader --parsable2 --allocations --jobs={shlex.quote(','.join(job_ids))} "
+            f"--format={','.join(WATCH_SACCT_FIELDS)}")
+
+
+def parse_watch_sacct(output):
+    """Return {job id: (name, state, exit code)} of a watch_sacct_command output"""
+    jobs = {}
+    for line in output.splitlines():
+        values = line.split(DELIMITER, len(WATCH_SACCT_FIELDS) - 1)
+        if len(values) != len(WATCH_SACCT_FIELDS):
+            continue
+        job_id, state, exit_code, name = values
+        jobs[job_id] = (name, parse_state(state), exit_code)
+    return jobs
+
+
+def _time_left(value):
+    # squeue prints UNLIMITED, NOT_SET or INVALID when there is no limit
+    return parse_duration(value) if value else None
+
+
+class JobWatcher:
+    """Tracks watched jobs and users with one batched query per poll.
+
+    Each poll runs one squeue per cluster for the watched job ids and
+    users; only the jobs that left the queue are then looked up in sacct
+    for their final state. Transitions become JobEvents. The interval
+    between polls adapts: it is reset to MIN_INTERVAL on any transition,
+    doubles up to MAX_INTERVAL while nothing changes, and shortens when a
+    running job is about to reach its time limit. Nothing here imports Qt.
+    """
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        # (cluster, job id) -> WatchedJob
+        self.jobs = {}
+        # Cluster -> job ids asked for and not seen yet
+        self.job_ids = {}
+        # Cluster -> users whose jobs are all watched
+        self.users = {}
+        # Clusters whose watched users were queried once: their new jobs
+        # are notified from then on
+        self.seeded = set()
+        # (cluster, job id) of the jobs that left the queue, to look up in sacct
+        self.vanished = set()
+
+    def __len__(self):
+        return len(self.jobs) + sum(len(ids) for ids in self.job_ids.values())
+
+    def is_active(self):
+        return bool(self.jobs or any(self.job_ids.values()) or any(self.users.values()))
+
+    def watch_jobs(self, cluster, job_ids):
+        self.job_ids.setdefault(cluster, set()).update(job_ids)
+        self.interval = self.min_interval
+
+    def watch_user(self, cluster, user):
+        self.users.setdefault(cluster, set()).add(user)
+        self.seeded.discard(cluster)
+        self.interval = self.min_interval
+
+    def unwatch_user(self, cluster, user):
+        """Stop watching user and the jobs found through it"""
+        self.users.get(cluster, set()).discard(user)
+        for key in [key for key, job in self.jobs.items() if key[0] == cluster and job.user == user]:
+            del self.jobs[key]
+            self.vanished.discard(key)
+
+    def remove_cluster(self, cluster):
+        self.job_ids.pop(cluster, None)
+        self.users.pop(cluster, None)
+        self.seeded.discard(cluster)
+        self.jobs = {key: job for key, job in self.jobs.items() if key[0] != cluster}
+        self.vanished = {key for key in self.vanished if key[0] != cluster}
+
+    def clear(self):
+        self.jobs.clear()
+        self.job_ids.clear()
+        self.users.clear()
+        self.seeded.clear()
+        self.vanished.clear()
+        self.interval = self.min_interval
+
+    def commands(self):
+        """Return the squeue command of every cluster with jobs or users to watch"""
+        ids, users = {}, {}
+        for cluster, job_ids in self.job_ids.items():
+            ids.setdefault(cluster, set()).update(job_ids)
+        for cluster, names in self.users.items():
+            if names:
+                users[cluster] = sorted(names)
+        # Jobs found through a watched user are covered by its query
+        for key, job in self.jobs.items():
+            if key not in self.vanished and job.user not in self.users.get(key[0], ()):
+                ids.setdefault(key[0], set()).add(key[1])
+
+        commands = {}
+        for cluster in sorted(set(ids) | set(users)):
+            # Two squeue calls in one round trip, as squeue ANDs --jobs and --user
+            parts = []
+            if ids.get(cluster):
+                parts.append(squeue_command(WATCH_COLUMNS, job_ids=sorted(ids[cluster])))
+            if users.get(cluster):
+                parts.append(squeue_command(WATCH_COLUMNS, filters={'user': ','.join(users[cluster])}))
+            if parts:
+                commands[cluster] = '; '.join(parts)
+        return commands
+
+    def update(self, results):
+        """Apply the squeue results of commands(); return the JobEvents.
+
+        results maps clusters to (stdout, stderr). A cluster whose squeue
+        failed keeps its jobs unchanged until the next poll.
+        """
+        events = []
+        for cluster, (output, error) in results.items():
+            if error.strip() and not output.strip() and _INVALID_JOB not in error:
+                continue
+            asked = self.job_ids.pop(cluster, set())
+            seen = set()
+            for record in parse_squeue(output, WATCH_COLUMNS, cluster):
+                if record.job_id in seen:
+                    continue
+                seen.add(record.job_id)
+                # An array job id matches every task of the array
+                asked.discard(record.array_job_id)
+                explicit = record.job_id in asked
+                asked.discard(record.job_id)
+                events.extend(self._observe(cluster, record, explicit))
+            if self.users.get(cluster):
+                self.seeded.add(cluster)
+
+            for key in [key for key in self.jobs if key[0] == cluster and key[1] not in seen]:
+                if '[' in key[1]:
+                    # Pending array tasks, now listed as their own jobs
+                    del self.jobs[key]
+                else:
+                    self.vanished.add(key)
+            # Asked for but not in the queue: look up how they ended
+            for job_id in asked:
+                self.jobs[(cluster, job_id)] = WatchedJob()
+                self.vanished.add((cluster, job_id))
+        return events
+
+    def _observe(self, cluster, record, explicit):
+        key = (cluster, record.job_id)
+        state = STATE_NAMES.get(record.state, record.state)
+        time_left = _time_left(record.time_left)
+        job = self.jobs.get(key)
+        self.vanished.discard(key)
+
+        events = []
+        if job is None:
+            # New jobs of watched users are notified, once their existing
+            # jobs are known; jobs asked for only when they already ended
+            new = cluster in self.seeded and not explicit
+            if (new or explicit and state in FINAL_STATES) and state in EVENT_KINDS:
+                events.append(JobEvent(cluster, record.job_id, record.name, EVENT_KINDS[state], state))
+            if state in FINAL_STATES:
+                return events
+            job = self.jobs[key] = WatchedJob(record.name, record.user, state, time_left)
+        else:
+            old_state = job.state
+            job.name, job.user, job.state, job.time_left = record.name, record.user, state, time_left
+            if state != old_state and state in EVENT_KINDS:
+                events.append(JobEvent(cluster, record.job_id, record.name, EVENT_KINDS[state], state))
+            if state in FINAL_STATES:
+                del self.jobs[key]
+                return events
+
+        if (state == 'RUNNING' and not job.warned and time_left is not None
+                and time_left <= TIME_LEFT_WARNING):
+            job.warned = True
+            events.append(JobEvent(cluster, record.job_id, record.name, 'ending', state,
+                                   f"{int(time_left // 60)} min left"))
+        return events
+
+    def sacct_commands(self):
+        """Return the sacct command of every cluster with jobs that left the queue"""
+        job_ids = {}
+        for cluster, job_id in sorted(self.vanished):
+            job_ids.setdefault(cluster, []).append(job_id)
+        return {cluster: watch_sacct_command(ids) for cluster, ids in job_ids.items()}
+
+    def resolve(self, results):
+        """Apply the sacct results of sacct_commands(); return the JobEvents"""
+        events = []
+        for cluster, (output, _error) in results.items():
+            final = parse_watch_sacct(output)
+            for key in sorted(k for k in self.vanished if k[0] == cluster):
+                job = self.jobs.get(key)
+                if job is None:
+                    self.vanished.discard(key)
+                    continue
+                name, state, exit_code = final.get(key[1], (job.name, '', ''))
+                if state in ('PENDING', 'RUNNING', 'REQUEUED', 'SUSPENDED'):
+                    # Back in the queue after a requeue, or squeue lagged
+                    job.lookups = 0
+                    self.vanished.discard(key)
+                    continue
+                job.lookups += 1
+                if state in EVENT_KINDS or job.lookups >= SACCT_ATTEMPTS:
+                    kind = EVENT_KINDS.get(state, 'gone')
+                    detail = f"exit {exit_code}" if kind == 'failed' and exit_code else ''
+                    events.append(JobEvent(cluster, key[1], name or job.name, kind, state, detail))
+                    del self.jobs[key]
+                    self.vanished.discard(key)
+        return events
+
+    def next_interval(self, events):
+        """Return the seconds until the next poll, given the events of this one"""
+        if events or self.vanished:
+            # Final states of vanished jobs may reach sacct by the next poll
+            interval = self.min_interval
+        else:
+            interval = min(self.interval * BACKOFF, self.max_interval)
+        # Poll again right after the earliest time limit
+        for job in self.jobs.values():
+            if job.state == 'RUNNING' and job.time_left is not None:
+                interval = min(interval, max(self.min_interval, job.time_left + self.min_interval))
+        self.interval = int(interval)
+        return self.interval
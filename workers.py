@@ -0,0 +1,388 @@
+import itertools
+import time
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal, pyqtSlot
+from cache import CommandCache, command_key, command_program, is_mutating
+from core import run_command, stream_channel
+from instrument import Instrument
+
+
+class WorkerSignals(QObject):
+    """Signals emitted by a CommandWorker while it runs"""
+    result = pyqtSignal(int, str, str)
+    # Streamed text, and whether it came from stderr
+    output = pyqtSignal(int, str, bool)
+    # Exit status of a streamed command
+    exited = pyqtSignal(int, int)
+    error = pyqtSignal(int, str)
+    finished = pyqtSignal(int)
+    # Return value of a TaskWorker
+    value = pyqtSignal(int, object)
+
+
+class CommandWorker(QRunnable):
+    """Run a single remote command on a pooled thread"""
+
+    def __init__(self, request_id, connection, command, cluster='', stream=False, instrument=None):
+        super().__init__()
+        self.request_id = request_id
+        self.connection = connection
+        self.command = command
+        self.cluster = cluster
+        # Emit output as it arrives instead of one result at the end
+        self.stream = stream
+        self.instrument = instrument
+        self.signals = WorkerSignals()
+        self.cancelled = False
+        self._channel = None
+        self._created = time.perf_counter()
+        self._streamed_bytes = 0
+
+    def cancel(self):
+        """Ask the worker to stop and close its channel"""
+        self.cancelled = True
+        channel = self._channel
+        if channel is not None:
+            channel.close()
+
+    def run(self):
+        try:
+            if self.cancelled:
+                return
+
+            queue = time.perf_counter() - self._created
+            with self.connection.session() as channel:
+                self._channel = channel
+                if self.cancelled:
+                    return
+                if self.stream:
+                    start = time.perf_counter()
+                    channel.exec_command(self.command)
+                    started = time.perf_counter()
+                    stream_channel(channel, self._emit_output, self._is_cancelled)
+                    metrics = {'rtt': started - start, 'remote': time.perf_counter() - started,
+                               'bytes': self._streamed_bytes}
+                    self._record(queue=queue, **metrics)
+                    if not self.cancelled:
+                        self.signals.exited.emit(self.request_id, channel.recv_exit_status())
+                    return
+                stdout, stderr, metrics = run_command(channel, self.command, self._is_cancelled)
+
+            if not self.cancelled:
+                self._record(queue=queue, **metrics)
+                self.signals.result.emit(self.request_id, stdout, stderr)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.error.emit(self.request_id, str(e))
+        finally:
+            self.signals.finished.emit(self.request_id)
+
+    def _is_cancelled(self):
+        return self.cancelled
+
+    def _emit_output(self, text, is_stderr):
+        self._streamed_bytes += len(text.encode())
+        self.signals.output.emit(self.request_id, text, is_stderr)
+
+    def _record(self, **metrics):
+        if self.instrument is not None:
+            self.instrument.record(command_program(self.command), self.cluster, **metrics)
+
+
+class TaskWorker(QRunnable):
+    """Run a local Python function on a pooled thread"""
+
+    def __init__(self, request_id, function, description):
+        super().__init__()
+        self.request_id = request_id
+        self.function = function
+        # Shown with the commands in flight
+        self.command = description
+        self.cluster = ''
+        self.signals = WorkerSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        """Drop the result; the function itself cannot be interrupted"""
+        self.cancelled = True
+
+    def run(self):
+        try:
+            if self.cancelled:
+                return
+            value = self.function()
+            if not self.cancelled:
+                self.signals.value.emit(self.request_id, value)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.error.emit(self.request_id, str(e))
+        finally:
+            self.signals.finished.emit(self.request_id)
+
+
+class CommandRunner(QObject):
+    """Runs remote commands in a thread pool and tracks the ones in flight.
+
+    Commands run on one of several named SSHConnections, one per cluster.
+    Read-only commands go through a CommandCache: fresh results are served
+    without a round trip, and identical requests made while one is running
+    share its execution. Mutating commands invalidate the cache.
+    """
+
+    # Emitted with the list of commands currently running
+    inflight_changed = pyqtSignal(list)
+    # Emitted when a mutating command made cached outputs stale
+    invalidated = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.connections = {}
+        self.cache = CommandCache()
+        # Timings of every command, completed with parse and render times
+        self.instrument = Instrument()
+        self._ids = itertools.count(1)
+        self._workers = {}
+        # request id -> [(on_result, on_error), ...] waiting for it
+        self._callbacks = {}
+        # (cluster, cache key) -> request id of the cacheable requests in flight
+        self._pending = {}
+        # request id -> cache generation when it started
+        self._generations = {}
+        # request id -> on_output callback of streamed requests
+        self._outputs = {}
+
+    def add_connection(self, name, connection):
+        """Register the SSHConnection of cluster name"""
+        self.connections[name] = connection
+        self._resize_pool()
+
+    def remove_connection(self, name):
+        """Cancel the commands of cluster name and forget its connection"""
+        for request_id, worker in list(self._workers.items()):
+            if worker.cluster == name:
+                self.cancel(request_id)
+        connection = self.connections.pop(name, None)
+        self.invalidate()
+        self._resize_pool()
+        return connection
+
+    def clusters(self):
+        return list(self.connections)
+
+    def run(self, command, on_result, on_error=None, cache=True, cluster=None, priority=0):
+        """Run a command in the background.
+
+        on_result(stdout, stderr) or on_error(message) is called on the GUI
+        thread once the command completes. cluster defaults to the first
+        connected one. With cache=False the cache is bypassed. Queued
+        commands with a higher priority start first, so background work
+        such as prefetching uses a negative one. Returns the request id, or
+        0 for a cache hit.
+        """
+        cluster, connection = self._connection(cluster)
+
+        cacheable = cache and self.cache.ttl(command) > 0
+        pending_key = (cluster, command_key(command))
+        if cacheable:
+            result = self.cache.get(command, cluster)
+            if result is not None:
+                # Keep callbacks asynchronous, as for a real request
+                QTimer.singleShot(0, lambda: on_result(*result))
+                return 0
+            request_id = self._pending.get(pending_key)
+            if request_id in self._callbacks:
+                self._callbacks[request_id].append((on_result, on_error))
+                return request_id
+
+        request_id = next(self._ids)
+        worker = CommandWorker(request_id, connection, command, cluster, instrument=self.instrument)
+        worker.signals.result.connect(self._on_result)
+        worker.signals.error.connect(self._on_error)
+        worker.signals.finished.connect(self._on_finished)
+
+        self._workers[request_id] = worker
+        self._callbacks[request_id] = [(on_result, on_error)]
+        if cacheable:
+            self._pending[pending_key] = request_id
+            self._generations[request_id] = self.cache.generation
+        self.pool.start(worker, priority)
+        self.inflight_changed.emit(self.inflight())
+        return request_id
+
+    def stream(self, command, on_output, on_exit, on_error=None, cluster=None):
+        """Run a command and pass its output to the GUI thread as it arrives.
+
+        on_output(text, is_stderr) is called for each batch of output, then
+        on_exit(status) when the command ends, or on_error(message). Streamed
+        commands are never cached. Returns the request id.
+        """
+        cluster, connection = self._connection(cluster)
+
+        request_id = next(self._ids)
+        worker = CommandWorker(request_id, connection, command, cluster, stream=True,
+                               instrument=self.instrument)
+        worker.signals.output.connect(self._on_output)
+        worker.signals.exited.connect(self._on_exited)
+        worker.signals.error.connect(self._on_error)
+        worker.signals.finished.connect(self._on_finished)
+
+        self._workers[request_id] = worker
+        self._callbacks[request_id] = [(on_exit, on_error)]
+        self._outputs[request_id] = on_output
+        self.pool.start(worker)
+        self.inflight_changed.emit(self.inflight())
+        return request_id
+
+    def submit(self, function, on_result, on_error=None, description="Working"):
+        """Run function() off the GUI thread, for parsing or disk work.
+
+        on_result(value) or on_error(message) is called on the GUI thread.
+        Returns the request id.
+        """
+        request_id = next(self._ids)
+        worker = TaskWorker(request_id, function, description)
+        worker.signals.value.connect(self._on_value)
+        worker.signals.error.connect(self._on_error)
+        worker.signals.finished.connect(self._on_finished)
+
+        self._workers[request_id] = worker
+        self._callbacks[request_id] = [(on_result, on_error)]
+        self.pool.start(worker)
+        self.inflight_changed.emit(self.inflight())
+        return request_id
+
+    def run_each(self, commands, on_done, cache=True):
+        """Run one command per cluster in parallel.
+
+        commands maps cluster names to commands. on_done(results, errors) is
+        called once every cluster has answered, with results mapping
+        clusters to (stdout, stderr) and errors mapping clusters to
+        messages, so the total latency is that of the slowest cluster.
+        """
+        results, errors = {}, {}
+        remaining = set(commands)
+
+        def done(cluster):
+            remaining.discard(cluster)
+            if not remaining:
+                on_done(results, errors)
+
+        def on_result(cluster, stdout, stderr):
+            results[cluster] = (stdout, stderr)
+            done(cluster)
+
+        def on_error(cluster, message):
+            errors[cluster] = message
+            done(cluster)
+
+        if not commands:
+            QTimer.singleShot(0, lambda: on_done(results, errors))
+        for cluster, command in commands.items():
+            try:
+                self.run(command,
+                         lambda out, err, c=cluster: on_result(c, out, err),
+                         lambda message, c=cluster: on_error(c, message),
+                         cache, cluster)
+            except ConnectionError as e:
+                on_error(cluster, str(e))
+
+    def invalidate(self):
+        """Drop cached outputs; requests made afterwards start afresh"""
+        self.cache.invalidate()
+        self._pending.clear()
+        self.invalidated.emit()
+
+    def cancel(self, request_id=None):
+        """Cancel one request, or every request in flight when no id is given.
+
+        The error callbacks of a cancelled request are called right away.
+        """
+        if request_id is None:
+            ids = list(self._workers)
+        else:
+            ids = [request_id]
+        for rid in ids:
+            worker = self._workers.get(rid)
+            if worker is not None:
+                worker.cancel()
+                self._outputs.pop(rid, None)
+                # The worker may only finish much later: let identical
+                # commands start afresh instead of joining a cancelled one
+                for key in [k for k, pending in self._pending.items() if pending == rid]:
+                    del self._pending[key]
+                for _, on_error in self._callbacks.pop(rid, ()):
+                    if on_error is not None:
+                        on_error("Command cancelled")
+
+    def inflight(self):
+        """Return the commands currently queued or running"""
+        if len(self.connections) > 1:
+            return [f"{worker.cluster}: {worker.command}" if worker.cluster else worker.command
+                    for worker in self._workers.values()]
+        return [worker.command for worker in self._workers.values()]
+
+    def _connection(self, cluster):
+        """Return the name and connection of cluster, by default the first one"""
+        if not self.connections:
+            raise ConnectionError("Not connected to an SSH server")
+        if cluster is None:
+            cluster = next(iter(self.connections))
+        connection = self.connections.get(cluster)
+        if connection is None:
+            raise ConnectionError(f"Not connected to {cluster}")
+        return cluster, connection
+
+    def _resize_pool(self):
+        # One thread per channel, so commands only wait on the channel limit
+        channels = sum(c.max_channels for c in self.connections.values())
+        self.pool.setMaxThreadCount(max(channels, 1))
+
+    @pyqtSlot(int, str, str)
+    def _on_result(self, request_id, stdout, stderr):
+        worker = self._workers[request_id]
+        if is_mutating(worker.command):
+            self.invalidate()
+        elif request_id in self._generations and not stderr:
+            self.cache.put(worker.command, (stdout, stderr),
+                           self._generations[request_id], worker.cluster)
+
+        for on_result, _ in self._callbacks.get(request_id, ()):
+            on_result(stdout, stderr)
+
+    @pyqtSlot(int, object)
+    def _on_value(self, request_id, value):
+        for on_result, _ in self._callbacks.get(request_id, ()):
+            on_result(value)
+
+    @pyqtSlot(int, str, bool)
+    def _on_output(self, request_id, text, is_stderr):
+        on_output = self._outputs.get(request_id)
+        if on_output is not None:
+            on_output(text, is_stderr)
+
+    @pyqtSlot(int, int)
+    def _on_exited(self, request_id, status):
+        if is_mutating(self._workers[request_id].command):
+            self.invalidate()
+        for on_exit, _ in self._callbacks.get(request_id, ()):
+            on_exit(status)
+
+    @pyqtSlot(int, str)
+    def _on_error(self, request_id, message):
+        if is_mutating(self._workers[request_id].command):
+            self.invalidate()
+        for _, on_error in self._callbacks.get(request_id, ()):
+            if on_error is not None:
+                on_error(message)
+
+    @pyqtSlot(int)
+    def _on_finished(self, request_id):
+        worker = self._workers.pop(request_id, None)
+        self._callbacks.pop(request_id, None)
+        self._generations.pop(request_id, None)
+        self._outputs.pop(request_id, None)
+        if worker is not None:
+            key = (worker.cluster, command_key(worker.command))
+            if self._pending.get(key) == request_id:
+                del self._pending[key]
+        self.inflight_changed.emit(self.inflight())